@@ -1,28 +1,33 @@
 from datetime import datetime
-from fastapi import Depends, FastAPI, File, HTTPException, Header, Request, UploadFile, status
+from fastapi import Depends, HTTPException, Header, Query, Request, Response, status
 from fastapi.responses import FileResponse, JSONResponse
-from grpc import Status
-import jwt
 from pydantic import BaseModel
 from typing import List, Optional
-import openai
-import os
 import json
 from fastapi import APIRouter
 from app.core.config import logger_settings
 logger = logger_settings.get_logger(__name__)
 import aiomysql
-import asyncio
-import pandas as pd
 from openpyxl import Workbook
 from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
 from io import BytesIO
 from fastapi.responses import StreamingResponse
 from app.services.auth_service import AuthDatabaseService
+from app.services.insight_service import InsightDataService, SNAPSHOT_FIELDS, decode_cursor
+from app.services.retention_service import RetentionService
+from app.services.kpi_service import KpiService
+from app.services.insight_stream_service import sse_event
+from app.services.job_service import JobService, SUCCEEDED
+from app.services.idempotency_service import IdempotencyService
+from app.services.insight_generation_service import InsightGenerationService, INSIGHT_MODEL
+from app.services.model_router_service import ModelRouter
+from app.prompts.tokens import count_message_tokens
+from app.api.deps.user_deps import get_current_user, get_read_db
+from app.schemas.client_schema import Principal
+from app.schemas.insight_schema import DaycareInput
 # Add to your FastAPI router
 import math
-from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from typing import List, Optional
 import smtplib
@@ -36,224 +41,34 @@ from utils.vapor.engine.scheduler import start_scheduler
 
 insight_router = APIRouter()
 
-# Define Pydantic models for input data
-class RevenueSource(BaseModel):
-    id: Optional[str] = None
-    sourceName: str
-    monthlyAmount: float
-    tag: str
+async def idempotent(user_email: str, endpoint: str, key: Optional[str], request: dict, call) -> tuple:
+    """Runs `call` once per Idempotency-Key when one is given; returns (result, replayed)."""
+    if key is None or not logger_settings.IDEMPOTENCY_ENABLED:
+        return await call(), False
+    return await IdempotencyService.run(user_email, endpoint, key, request, call)
 
-class EmployeeExpense(BaseModel):
-    id: Optional[str] = None
-    expenseName: str
-    monthlyAmount: float
-    type: str
-    hoursPerMonth: Optional[float] = None
-    
-class FacilityExpense(BaseModel):
-    id: Optional[str] = None
-    expenseName: str
-    monthlyAmount: float
-    type: str
-
-class Classroom(BaseModel):
-    id: Optional[str] = None
-    name: str
-    capacity: int
-    ratio: float
-    avgStudents: int
-
-class OperatingDetail(BaseModel):
-    operatingHours: float
-    operatingDays: float
-
-    
-class Administrative(BaseModel):
-    id: Optional[str] = None
-    expenseName: str
-    monthlyAmount: float
-    type: str
-
-class Supplies(BaseModel):
-    id: Optional[str] = None
-    expenseName: str
-    monthlyAmount: float
-    type: str
-    
-class Goals(BaseModel):
-    id: Optional[str] = None
-    goal: str
-    targetPercentage: float
-
-class DaycareInput(BaseModel):
-    businessName: Optional[str] = "Unamed Daycare"
-    revenueSources: List[RevenueSource] = []
-    employees: List[EmployeeExpense] = []
-    facilities: List[FacilityExpense] = []
-    administrative: List[FacilityExpense] = []
-    supplies: List[FacilityExpense] = []
-    classrooms: List[Classroom] = []
-    operatingHours: Optional[float] = 0.0  # Default operating hours
-    operatingDays: Optional[float] = 0.0  # Default operating days
-    # operatingDetails: List[OperatingDetail] = []
-    goals: List[Goals] = []
-
-    
-# Function to generate insights using OpenAI
-async def generate_daycare_insights(data: DaycareInput) -> dict:
-    # Prepare the prompt
-    prompt = f"""
-    You are a financial and operations analyst for daycare centers. Analyze the following daycare center data and provide insights in the specified JSON format:
-
-    Daycare Name: {data.businessName}
-
-    REVENUE SOURCES:
-    {json.dumps([src.dict() for src in data.revenueSources], indent=2)}
-
-    EXPENSES:
-    - Employees: {json.dumps([emp.dict() for emp in data.employees], indent=4)}
-    - Facilities: {json.dumps([fac.dict() for fac in data.facilities], indent=4)}
-    - Administrative: {json.dumps([adm.dict() for adm in data.administrative], indent=4)}
-    - Supplies: {json.dumps([sup.dict() for sup in data.supplies], indent=4)}
-
-    CLASSROOM DETAILS:
-    {json.dumps([cls.dict() for cls in data.classrooms], indent=2)}
-
-    OPERATING DETAILS:
-    {json.dumps({"operatingHours": data.operatingHours, "operatingDays": data.operatingDays}, indent=2)}
-
-    BUSINESS GOALS:
-    {json.dumps([goal.dict() for goal in data.goals], indent=2)}
-
-    Provide your analysis in the following JSON format:
-    (Return the following format as valid JSON **only**, without any extra text or explanation)
-
-    {{
-      "net_monthly_income": {{
-        "value": number,
-        "currency": "USD",
-        "calculation": "string explaining the calculation",
-        "note": "brief interpretation"
-      }},
-      "break_even_enrollment": {{
-        "value": number,
-        "unit": "students",
-        "calculation": "string explaining the calculation",
-        "note": "brief interpretation"
-      }},
-      "largest_expense": {{
-        "category": "string",
-        "percentage_of_total_expenses": number,
-        "calculation": "string explaining the calculation"
-      }},
-      "capacity_utilization": {{
-        "value": number,
-        "unit": "percent",
-        "calculation": "string explaining the calculation",
-        "note": "brief interpretation"
-      }},
-      "executive_summary": {{
-        "financial_overview": "string",
-        "profitability_status": "string",
-        "enrollment_status": "string",
-        "recommendations": ["string", "string", "string", "string"]
-      }}
-    }}
-
-    Key calculations to include:
-    1. Net Monthly Income = Total Revenue - Total Expenses
-    2. Break-Even Enrollment = Total Fixed Costs / Average Revenue per Student
-    3. Largest Expense Category = Expense category with highest percentage of total expenses
-    4. Capacity Utilization = (Total Enrolled Students / Total Capacity) * 100
-
-    Make all calculations based on monthly figures. Provide realistic, actionable insights.
-    """
-    
-    try:
-        client = openai.AsyncOpenAI(api_key=logger_settings.OPENAI_API_KEY)
-        model = "gpt-4-turbo"  # or "gpt-4-turbo" if available
-        messages=[
-                {"role": "system", "content": "You are a financial analyst specializing in daycare center operations."},
-                {"role": "user", "content": prompt}
-            ]
-        print(f"Generating insights for {data.businessName}...")
-    
-        response = await client.chat.completions.create(
-            model=model,
-            messages=messages,
-            max_tokens=1500,
-            temperature=0.8,
-            response_format={"type": "json_object"}
-        )
-        
-        # Extract the actual content from the response
-        insights_content = response.choices[0].message.content
-        
-        # Parse the JSON content
-        insights_data = json.loads(insights_content)
-        print(f"Insights content: \n\n{insights_data}")
-        return insights_data
-        
-    except json.JSONDecodeError as e:
-        print(f"JSON decode error: {str(e)}")
-        print(f"Problematic content: {insights_content}")
-        raise HTTPException(
-            status_code=500, 
-            detail=f"Failed to parse OpenAI response: {str(e)}"
-        )
-    except Exception as e:
-        raise HTTPException(
-            status_code=500, 
-            detail=f"OpenAI API error: {str(e)}"
-        )
-    
-async def verify_token(authorization: str = Header(...)):
-    """Dependency to verify and extract token"""
-    if not authorization.startswith("Bearer "):
-        raise HTTPException(
-            status_code=401,
-            detail="Invalid authorization header"
-        )
-    
-    token = authorization.split(" ")[1]
-    
-    try:
-        payload = jwt.decode(token, logger_settings.JWT_SECRET_KEY, algorithms=[logger_settings.ALGORITHM])
-        return payload
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(
-            status_code=401,
-            detail="Token expired"
-        )
-    except jwt.InvalidTokenError:
-        raise HTTPException(
-            status_code=401,
-            detail="Invalid token"
-        )
-        
-        
 # Endpoint to generate insights
 @insight_router.post("/generate-insights")
 async def get_insights(input_data: DaycareInput,
             request: Request,
-            token_payload: dict = Depends(verify_token),
-            db: aiomysql.Connection = Depends(AuthDatabaseService.get_db)):
-    
+            response: Response,
+            force_refresh: bool = Query(False, description="Skip the insight cache and regenerate"),
+            idempotency_key: Optional[str] = Header(None, description="Replay the stored response to retries with the same key"),
+            user: Principal = Depends(get_current_user)):
+    """
+    Generate insights for the input, reusing a cached result for an identical
+    input (same model and prompt version). After an edit, only the executive summary
+    sections the edit affects are regenerated. `X-Insight-Cache` reports hit, partial,
+    miss or bypass.
+    Identical requests in flight at the same time share one generation. If the
+    model misses `INSIGHT_DEADLINE` or is unavailable, a template insight marked
+    `"degraded": true` (and `X-Insight-Degraded`) is returned instead.
+    With an `Idempotency-Key` header, retries get the first response back
+    (`Idempotent-Replayed: true`) instead of generating again.
+    """
     try:
         await start_scheduler()
-        async with db.cursor(aiomysql.DictCursor) as cursor:
-            # Check if the user exists based on email
-            await cursor.execute(
-                "SELECT * FROM auth_users WHERE id = %s",
-                (token_payload.get("sub"),)
-            )
-        user = await cursor.fetchone()  # Fetch the first matching user
-        logger.info(f"User: {user['email']}")
-        if not user:
-            raise HTTPException(
-                status_code=401,
-                detail="Invalid token: user ID not found"
-            )
+        logger.info(f"User: {user.email}")
         # Example usage
         data = {
             "net_monthly_income": {
@@ -292,169 +107,222 @@ async def get_insights(input_data: DaycareInput,
                 ]
             }
         }
-        insight = await generate_daycare_insights(input_data)
-        conn = await AuthDatabaseService.connection()
-        try:
-            async with conn.cursor() as cursor:
-                # Convert Pydantic model to dict, then to JSON string
-                data_json = json.dumps(insight)
-                
-                await cursor.execute(
-                    "INSERT INTO insights_data (user_email, data) VALUES (%s, %s)",
-                    (user["email"], data_json)
-                )
-                await conn.commit()
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error saving insight: {e}")
-        finally:
-            conn.close()
+        async def generate():
+            insight, cache_status = await InsightGenerationService.produce(input_data, user.email, force_refresh)
+            return {"insight": insight, "cache_status": cache_status}
+
+        result, replayed = await idempotent(user.email, "generate-insights", idempotency_key,
+                                            {"input": input_data.dict(), "force_refresh": force_refresh}, generate)
+        insight = result["insight"]
+        response.headers["X-Insight-Cache"] = result["cache_status"]
+        if replayed:
+            response.headers["Idempotent-Replayed"] = "true"
+        if insight.get("degraded"):
+            # A template insight; the model's version replaces the saved one when it is ready
+            response.headers["X-Insight-Degraded"] = "true"
         # In a real implementation, you would save to a database
         logger.info("Insights saved successfully")
         return insight
         
+    except HTTPException:
+        # Keeps 503 (circuit open) and 504 (deadline) distinguishable for clients
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@insight_router.post("/generate-insights/stream")
+async def stream_insights(input_data: DaycareInput,
+            force_refresh: bool = Query(False, description="Skip the insight cache and regenerate"),
+            user: Principal = Depends(get_current_user)):
+    """
+    Streaming variant of `/generate-insights` over Server-Sent Events. Each section
+    is sent as a `section` event ({"name", "value"}) as soon as it is complete,
+    followed by `done` once the insight is saved, or `error`. The model's part is
+    bounded like `/generate-insights` (deadline, retries, failover until the first
+    section) and ends with `error` when the answer stalls.
+    """
+    payload = input_data.dict()
+    kpis, messages = InsightGenerationService.build_messages(input_data)
+    models = ModelRouter.cacheable(count_message_tokens(messages, INSIGHT_MODEL), user.email)
+    cached, _ = (None, None) if force_refresh else await InsightGenerationService.from_cache(payload, models)
+    cache_status = "hit" if cached is not None else ("bypass" if force_refresh else "miss")
+
+    async def events():
+        insight = {}
+        try:
+            if cached is not None:
+                insight = cached
+                for name, value in cached.items():
+                    yield sse_event("section", {"name": name, "value": value})
+            else:
+                for name, value in kpis.items():
+                    insight[name] = value
+                    yield sse_event("section", {"name": name, "value": value})
+                # The KPI sections go out before waiting for a turn at the model
+                model = None
+                async for model, name, value in InsightGenerationService.stream_summary(messages, user.email):
+                    insight[name] = value
+                    yield sse_event("section", {"name": name, "value": value})
+                await InsightGenerationService.to_cache(payload, models, model, insight)
+
+            # The connection is only borrowed for the save, not for the whole stream
+            async with AuthDatabaseService.acquire() as db:
+                await InsightDataService.save_insight(db, user.email, insight)
+            yield sse_event("done", {"cache": cache_status})
+        except Exception as e:
+            logger.error(f"Streaming insights for {user.email} failed: {e}")
+            yield sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Proxies must pass events through as they are written
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Insight-Cache": cache_status},
+    )
+
+def job_view(job: dict) -> dict:
+    view = {key: job[key] for key in ("id", "kind", "status", "attempts", "error", "created_at", "updated_at")}
+    if job["status"] == SUCCEEDED:
+        view["result"] = job["result"]
+    return view
+
+@insight_router.post("/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def submit_insight_job(input_data: DaycareInput,
+            response: Response,
+            force_refresh: bool = Query(False, description="Skip the insight cache and regenerate"),
+            user: Principal = Depends(get_current_user)):
+    """
+    Queue insight generation and return the job id at once. Poll `GET /insight/jobs/{job_id}`
+    until the status is `succeeded` (the insight is in `result`) or `dead`.
+    """
+    job = await JobService.submit("insight", user.email, {"input": input_data.dict(), "force_refresh": force_refresh})
+    response.headers["Location"] = f"{logger_settings.API_V1_STR}/insight/jobs/{job['id']}"
+    return job_view(job)
+
+@insight_router.get("/jobs/{job_id}")
+async def get_insight_job(job_id: str, user: Principal = Depends(get_current_user)):
+    job = await JobService.get(job_id)
+    # Other users' jobs are indistinguishable from missing ones
+    if job is None or job["user_email"] != user.email:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_view(job)
+
 # Endpoint to save inputs (optional)
 @insight_router.post("/save-inputs")
 async def save_inputs(input_data: DaycareInput,
                       request: Request,
-                      token_payload: dict = Depends(verify_token),
+                      response: Response,
+                      idempotency_key: Optional[str] = Header(None, description="Save once for retries with the same key"),
+                      user: Principal = Depends(get_current_user),
                       db: aiomysql.Connection = Depends(AuthDatabaseService.get_db)
                     ):
     """
-    Save the entire DaycareInput payload as JSON into the input_data table
+    Save the entire DaycareInput payload as JSON into the input_data table.
+    Retries carrying the same `Idempotency-Key` do not insert another row.
     """
-    # Token payload contains decoded JWT claims
-    async with db.cursor(aiomysql.DictCursor) as cursor:
-        # Check if the user exists based on email
-        await cursor.execute(
-            "SELECT * FROM auth_users WHERE id = %s",
-            (token_payload.get("sub"),)
-        )
-    user = await cursor.fetchone()  # Fetch the first matching user
-    logger.info(f"User: {user['email']}")
-    if not user:
-        raise HTTPException(
-            status_code=401,
-            detail="Invalid token: user ID not found"
-        )
-    conn = await AuthDatabaseService.connection()
-    try:
-        async with conn.cursor() as cursor:
-            # Convert Pydantic model to dict, then to JSON string
-            data_json = json.dumps(input_data.dict())
-            
-            # Insert user email and input JSON into the table
-            await cursor.execute(
-                "INSERT INTO input_data (user_email, data) VALUES (%s, %s)",
-                (user["email"], data_json)
-            )
-            await conn.commit()
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error saving input: {e}")
-    finally:
-        conn.close()
-    # In a real implementation, you would save to a database
-    return {"status": "success", "message": "Inputs saved successfully"}
+    logger.info(f"User: {user.email}")
+
+    async def save():
+        try:
+            # Store the inputs and point the user's current snapshot at them
+            await InsightDataService.save_input(db, user.email, input_data.dict())
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error saving input: {e}")
+        # In a real implementation, you would save to a database
+        return {"status": "success", "message": "Inputs saved successfully"}
+
+    result, replayed = await idempotent(user.email, "save-inputs", idempotency_key, input_data.dict(), save)
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
 
 
 @insight_router.get("/fetch-inputs")
-async def fetch_inputs(token_payload: dict = Depends(verify_token),
-                       db: aiomysql.Connection = Depends(AuthDatabaseService.get_db)):
-    pass
+async def fetch_inputs(kind: str = Query("input", pattern="^(input|insight)$"),
+                       limit: int = Query(50, ge=1, le=500),
+                       cursor: Optional[str] = None,
+                       fields: str = Query(",".join(SNAPSHOT_FIELDS)),
+                       user: Principal = Depends(get_current_user)):
+    """
+    Page through the user's saved inputs (or insights with `kind=insight`), newest first.
+    `fields` is a comma-separated subset of id, created_at and data; leave out `data`
+    for list views. Pass the returned `next_cursor` as `cursor` for the next page.
+    The body is streamed as `{"items": [...], "next_cursor": ...}`.
+    """
+    selected = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = set(selected) - set(SNAPSHOT_FIELDS)
+    if unknown or not selected:
+        raise HTTPException(status_code=400, detail=f"fields must be a subset of {', '.join(SNAPSHOT_FIELDS)}")
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    table = "input_data" if kind == "input" else "insights_data"
+
+    async def body():
+        yield '{"items":['
+        separator = ""
+        async for item in InsightDataService.iter_snapshots(table, user.email, limit, cursor, selected):
+            if "next_cursor" in item:
+                yield f'],"next_cursor":{json.dumps(item["next_cursor"])}}}'
+                return
+            yield separator + json.dumps(item)
+            separator = ","
+
+    return StreamingResponse(body(), media_type="application/json")
+
+
+@insight_router.get("/history")
+async def snapshot_history(kind: str = Query("input", pattern="^(input|insight)$"),
+                           limit: int = Query(20, ge=1, le=100),
+                           before_id: Optional[int] = None,
+                           user: Principal = Depends(get_current_user)):
+    """
+    The user's saved inputs or insights, newest first, including archived ones.
+    Pass the returned `next_before_id` as `before_id` for the next page.
+    """
+    table = "input_data" if kind == "input" else "insights_data"
+    items = await RetentionService.history(table, user.email, limit, before_id)
+    return {
+        "items": items,
+        "next_before_id": items[-1]["id"] if len(items) == limit else None,
+    }
 
 
 @insight_router.get("/recommendations")
-async def recommendation(token_payload: dict = Depends(verify_token),
-                       db: aiomysql.Connection = Depends(AuthDatabaseService.get_db)):
-    # Token payload contains decoded JWT claims
-    async with db.cursor(aiomysql.DictCursor) as cursor:
-        # Check if the user exists based on email
-        await cursor.execute(
-            "SELECT * FROM auth_users WHERE id = %s",
-            (token_payload.get("sub"),)
-        )
-    user = await cursor.fetchone()  # Fetch the first matching user
-    logger.info(f"User: {user['email']}")
-    if not user:
-        raise HTTPException(
-            status_code=401,
-            detail="Invalid token: user ID not found"
-        )
+async def recommendation(user: Principal = Depends(get_current_user),
+                       db: aiomysql.Connection = Depends(get_read_db)):
+    logger.info(f"User: {user.email}")
     
-    async with db.cursor(aiomysql.DictCursor) as cursor:
-        # Fetch the latest input_data row for the user
-        await cursor.execute(
-            """
-            SELECT id, user_email, data, created_at 
-            FROM insights_data 
-            WHERE user_email = %s 
-            ORDER BY created_at DESC
-            LIMIT 1
-            """,
-            (user['email'],)
-        )
-        row = await cursor.fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail="No insights found for this user.")
-        try:
-            insights = json.loads(row['data'])
-            recommendations = insights.get('executive_summary', {}).get('recommendations', [])
-        except Exception:
-            recommendations = []
+    # Fetch the latest insights_data row for the user
+    insights = await InsightDataService.latest_insight_data(db, user.email)
+    if insights is None:
+        raise HTTPException(status_code=404, detail="No insights found for this user.")
+    try:
+        recommendations = insights.get('executive_summary', {}).get('recommendations', [])
+    except Exception:
+        recommendations = []
 
-        return {"recommendations": recommendations}
+    return {"recommendations": recommendations}
                 
         
 @insight_router.get("/generate-excel-report")
 async def generate_excel_report(
-                            token_payload: dict = Depends(verify_token),
-                            db: aiomysql.Connection = Depends(AuthDatabaseService.get_db)
+                            user: Principal = Depends(get_current_user),
+                            db: aiomysql.Connection = Depends(get_read_db)
                         ):
     try:
-        # Token payload contains decoded JWT claims
-        async with db.cursor(aiomysql.DictCursor) as cursor:
-            # Check if the user exists based on email
-            await cursor.execute(
-                """
-                SELECT * 
-                FROM auth_users WHERE id = %s
-                """,
-                (token_payload.get("sub"),)
-            )
-        user = await cursor.fetchone()  # Fetch the first matching user
-        logger.info(f"User: {user['email']}")
-        if not user:
-            raise HTTPException(
-                status_code=401,
-                detail="Invalid token: user ID not found"
-            )
-        conn = await AuthDatabaseService.connection()
+        logger.info(f"User: {user.email}")
         try:
-            async with conn.cursor(aiomysql.DictCursor) as cursor:
-                # Convert Pydantic model to dict, then to JSON string
-                # Insert user email and input JSON into the table
-                await cursor.execute(
-                    """
-                    SELECT id, user_email, data, created_at
-                    FROM input_data 
-                    WHERE user_email = %s
-                    ORDER BY created_at DESC
-                    LIMIT 1
-                    """,
-                    (user["email"],)
-                )
-            row = await cursor.fetchone()  # Fetch the first matching user
-            if not row:
+            # Fetch the latest input_data row for the user
+            form_data = await InsightDataService.latest_input_data(db, user.email)
+            if form_data is None:
                 raise HTTPException(status_code=404, detail="No inputs found for this user.")
-            
-            form_data = json.loads(row['data'])
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error on input data: {e}")
-        finally:
-            conn.close()
 
         # Create a new workbook
         wb = Workbook()
@@ -701,50 +569,17 @@ async def generate_excel_report(
 @insight_router.post("/pro-forma-dashboard-data")
 async def get_pro_forma_dashboard_data(
                                 input_data: dict,
-                                token_payload: dict = Depends(verify_token),
-                                db: aiomysql.Connection = Depends(AuthDatabaseService.get_db)
+                                user: Principal = Depends(get_current_user),
+                                db: aiomysql.Connection = Depends(get_read_db)
                             ):
     try:
-        # Token payload contains decoded JWT claims
-        async with db.cursor(aiomysql.DictCursor) as cursor:
-            # Check if the user exists based on email
-            await cursor.execute(
-                """
-                SELECT * 
-                FROM auth_users WHERE id = %s
-                """,
-                (token_payload.get("sub"),)
-            )
-        user = await cursor.fetchone()  # Fetch the first matching user
-        if not user:
-            raise HTTPException(
-                status_code=401,
-                detail="Invalid token: user ID not found"
-            )
-        conn = await AuthDatabaseService.connection()
         try:
-            async with conn.cursor(aiomysql.DictCursor) as cursor:
-                # Convert Pydantic model to dict, then to JSON string
-                # Insert user email and input JSON into the table
-                await cursor.execute(
-                    """
-                    SELECT id, user_email, data, created_at
-                    FROM input_data 
-                    WHERE user_email = %s
-                    ORDER BY created_at DESC
-                    LIMIT 1
-                    """,
-                    (user["email"],)
-                )
-            row = await cursor.fetchone()  # Fetch the first matching user
-            if not row:
+            # Fetch the latest input_data row for the user
+            input_data = await InsightDataService.latest_input_data(db, user.email)
+            if input_data is None:
                 raise HTTPException(status_code=404, detail="No inputs found for this user.")
-            
-            input_data = json.loads(row['data'])
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error on input data: {e}")
-        finally:
-            conn.close()
 
         # input_data = {"businessName": "Demo Daycare Center", 
         #               "revenueSources": [{"id": "1", "sourceName": "Tution", "monthlyAmount": 50000.0, "tag": ""}, 
@@ -764,21 +599,14 @@ async def get_pro_forma_dashboard_data(
         #                         {"id": "2", "goal": "Reduce Expense", "targetPercentage": 20.0}, 
         #                         {"id": "2", "goal": "Improve Classroom Utilization", "targetPercentage": 30.0}]}
         
-        # Calculate current year totals
-        current_year_revenue = sum(item.get("monthlyAmount", 0) for item in input_data.get("revenueSources", [])) * 12
-        current_year_expenses = 0
-        
-        # Calculate expenses from all categories
-        expense_categories = ["employees", "facilities", "administrative", "supplies"]
-        for category in expense_categories:
-            current_year_expenses += sum(item.get("monthlyAmount", 0) for item in input_data.get(category, [])) * 12
-        
+        # Calculate current year totals from the same figures the insights use
+        totals = KpiService.totals(input_data)
+        current_year_revenue = totals["revenue"] * 12
+        current_year_expenses = totals["expenses"] * 12
         current_year_profit = current_year_revenue - current_year_expenses
         
         # Calculate classroom utilization
-        total_capacity = sum(classroom.get("capacity", 0) for classroom in input_data.get("classrooms", []))
-        total_students = sum(classroom.get("avgStudents", 0) for classroom in input_data.get("classrooms", []))
-        current_utilization = (total_students / total_capacity * 100) if total_capacity > 0 else 0
+        current_utilization = (totals["students"] / totals["capacity"] * 100) if totals["capacity"] > 0 else 0
         
         # Get goal percentages
         goals = input_data.get("goals", [])
@@ -936,49 +764,21 @@ def dict_to_obj(d):
 
 @insight_router.post("/send-email-report")
 async def generate_email_report(
-                            token_payload: dict = Depends(verify_token),
+                            user: Principal = Depends(get_current_user),
                             db: aiomysql.Connection = Depends(AuthDatabaseService.get_db)
                         ):
     try:
-        # Token payload contains decoded JWT claims
-        async with db.cursor(aiomysql.DictCursor) as cursor:
-            # Check if the user exists based on email
-            await cursor.execute(
-                "SELECT * FROM auth_users WHERE id = %s",
-                (token_payload.get("sub"),)
-            )
-        user = await cursor.fetchone()  # Fetch the first matching user
-        logger.info(f"User: {user['email']}")
-        if not user:
-            raise HTTPException(
-                status_code=401,
-                detail="Invalid token: user ID not found"
-            )
+        logger.info(f"User: {user.email}")
         
-        async with db.cursor(aiomysql.DictCursor) as cursor:
-            # Fetch the latest input_data row for the user
-            await cursor.execute(
-                """
-                SELECT id, user_email, data, created_at 
-                FROM insights_data 
-                WHERE user_email = %s 
-                ORDER BY created_at DESC
-                LIMIT 1
-                """,
-                (user['email'],)
-            )
-            row = await cursor.fetchone()
-            if not row:
-                raise HTTPException(status_code=404, detail="No insights found for this user.")
-            try:
-                insight_data = json.loads(row['data'])
-            except Exception:
-                insight_data = {}
+        # Fetch the latest insights_data row for the user
+        insight_data = await InsightDataService.latest_insight_data(db, user.email)
+        if insight_data is None:
+            raise HTTPException(status_code=404, detail="No insights found for this user.")
                 
         report = dict_to_obj(insight_data)
         
         sender_email = logger_settings.MY_EMAIL
-        receiver_email = user['email']
+        receiver_email = user.email
         subject = "Daycare Center Financial Report"
 
         # Create HTML body
@@ -1144,43 +944,16 @@ async def create_pdf(data: ReportData, filename: str):
 # -------------------------
 @insight_router.get("/generate-pdf-report")
 async def generate_pdf_report(
-                token_payload: dict = Depends(verify_token),
-                db: aiomysql.Connection = Depends(AuthDatabaseService.get_db)
+                user: Principal = Depends(get_current_user),
+                db: aiomysql.Connection = Depends(get_read_db)
             ):
     try:
-        async with db.cursor(aiomysql.DictCursor) as cursor:
-            # Check if the user exists based on email
-            await cursor.execute(
-                "SELECT * FROM auth_users WHERE id = %s",
-                (token_payload.get("sub"),)
-            )
-        user = await cursor.fetchone()  # Fetch the first matching user
-        logger.debug(f"User: {user['email']}")
-        if not user:
-            raise HTTPException(
-                status_code=401,
-                detail="Invalid token: user ID not found"
-            )
+        logger.debug(f"User: {user.email}")
         
-        async with db.cursor(aiomysql.DictCursor) as cursor:
-            # Fetch the latest input_data row for the user
-            await cursor.execute(
-                """
-                SELECT id, user_email, data, created_at 
-                FROM insights_data 
-                WHERE user_email = %s 
-                ORDER BY created_at DESC
-                LIMIT 1
-                """,
-                (user['email'],)
-            )
-            row = await cursor.fetchone()
-            if not row:
-                raise HTTPException(status_code=404, detail="No insights found for this user.")
-            try:
-                insights = json.loads(row['data'])
-            except Exception:
-                insights = {}
+        # Fetch the latest insights_data row for the user
+        insights = await InsightDataService.latest_insight_data(db, user.email)
+        if insights is None:
+            raise HTTPException(status_code=404, detail="No insights found for this user.")
                 
         report_data = dict_to_obj(insights)
         filename = f"report_{uuid.uuid4().hex}.pdf"
@@ -1199,26 +972,13 @@ async def generate_pdf_report(
 
 @insight_router.get("/user")
 async def get_insights(
-                    token_payload: dict = Depends(verify_token),
-                    db: aiomysql.Connection = Depends(AuthDatabaseService.get_db)
+                    user: Principal = Depends(get_current_user)
                     ):
     try:
-        async with db.cursor(aiomysql.DictCursor) as cursor:
-            # Check if the user exists based on email
-            await cursor.execute(
-                "SELECT * FROM auth_users WHERE id = %s",
-                (token_payload.get("sub"),)
-            )
-        user = await cursor.fetchone()  # Fetch the first matching user
-        logger.debug(f"User: {user['email']}")
-        if not user:
-            raise HTTPException(
-                status_code=401,
-                detail="Invalid token: user ID not found"
-            )
+        logger.debug(f"User: {user.email}")
         return {
-                "email": user['email'], 
-                "username": user['username']
+                "email": user.email, 
+                "username": user.username
                 }
     except Exception as e:
         return JSONResponse(
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+import aiomysql
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from app.core.config import logger_settings
+logger = logger_settings.get_logger(__name__)
+from app.core.metrics import Metrics
+from app.api.deps.user_deps import get_current_user, get_read_db
+from app.schemas.client_schema import Principal
+from app.schemas.insight_schema import BatchInsightRequest, DaycareInput
+from app.services.auth_service import AuthDatabaseService
+from app.services.insight_cache_service import input_hash
+from app.services.insight_generation_service import InsightGenerationService, INSIGHT_MODEL, INSIGHT_PROMPT_VERSION
+from app.services.insight_service import InsightDataService
+from app.services.kpi_service import KpiService
+
+batch_router = APIRouter()
+
+def ndjson(line: Dict[str, Any]) -> str:
+    return json.dumps(line, default=str) + "\n"
+
+async def generate_center(center: DaycareInput, force_refresh: bool, user_email: str,
+                          semaphore: asyncio.Semaphore) -> Tuple[Optional[Dict[str, Any]], Optional[str], Optional[str]]:
+    """
+    Returns:
+        Tuple: (insight, cache status, None) on success or (None, None, error detail).
+    """
+    async with semaphore:
+        try:
+            insight, cache_status = await InsightGenerationService.cached(center, force_refresh, user_email)
+            return insight, cache_status, None
+        except HTTPException as e:
+            return None, None, e.detail
+        except Exception as e:
+            # Internal errors are logged, not returned to the client
+            logger.exception(f"Batch insight for {center.businessName} of {user_email} failed: {e}")
+            return None, None, "Insight generation failed"
+
+@batch_router.post("/batch")
+async def batch_insights(batch: BatchInsightRequest,
+            force_refresh: bool = Query(False, description="Skip the insight cache and regenerate"),
+            user: Principal = Depends(get_current_user)):
+    """
+    Generate insights for many centers at once, at most `BATCH_INSIGHT_CONCURRENCY`
+    at a time. Identical inputs are generated once. The response is NDJSON: one
+    `center` line per input as soon as it completes (`index` is its position in
+    the request), then a `summary` line with portfolio KPIs once the input and
+    insight of every successful center are saved under the summary's `batch_id`
+    (see `GET /insight/batch/{batch_id}`). A batch never becomes the caller's
+    latest input or insight.
+    """
+    centers = batch.centers
+    if not centers:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="No centers given")
+    if len(centers) > logger_settings.BATCH_INSIGHT_MAX_CENTERS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"At most {logger_settings.BATCH_INSIGHT_MAX_CENTERS} centers per batch"
+        )
+
+    # Input hash -> positions of the centers with that input
+    groups: Dict[str, List[int]] = {}
+    for index, center in enumerate(centers):
+        groups.setdefault(input_hash(center.dict(), INSIGHT_MODEL, INSIGHT_PROMPT_VERSION), []).append(index)
+    Metrics.incr("batch.centers", len(centers))
+    Metrics.incr("batch.deduplicated", len(centers) - len(groups))
+
+    async def lines():
+        semaphore = asyncio.Semaphore(logger_settings.BATCH_INSIGHT_CONCURRENCY)
+
+        async def run(indexes: List[int]):
+            return indexes, await generate_center(centers[indexes[0]], force_refresh, user.email, semaphore)
+
+        tasks = [asyncio.create_task(run(indexes)) for indexes in groups.values()]
+        insights: Dict[int, Dict[str, Any]] = {}
+        try:
+            for finished in asyncio.as_completed(tasks):
+                indexes, (insight, cache_status, error) = await finished
+                for index in indexes:
+                    line = {"type": "center", "index": index, "businessName": centers[index].businessName}
+                    if error is None:
+                        insights[index] = insight
+                        line.update(status="ok", cache=cache_status, insight=insight)
+                    else:
+                        line.update(status="error", detail=error)
+                    yield ndjson(line)
+        finally:
+            # The client went away: stop generating the rest
+            for task in tasks:
+                task.cancel()
+
+        firsts = sorted(indexes[0] for indexes in groups.values())
+        batch_id, saved = uuid.uuid4().hex, 0
+        try:
+            async with AuthDatabaseService.acquire() as db:
+                saved = await InsightDataService.save_batch_results(db, batch_id, user.email, [
+                    (index, centers[index].dict(), insights[index]) for index in firsts if index in insights
+                ])
+        except Exception as e:
+            logger.error(f"Saving batch {batch_id} of {len(firsts)} center(s) for {user.email} failed: {e}")
+            yield ndjson({"type": "error", "detail": "Error saving batch results"})
+
+        summary = KpiService.portfolio([(centers[index].businessName, centers[index].dict()) for index in firsts])
+        yield ndjson({
+            "type": "summary",
+            "batch_id": batch_id,
+            **summary,
+            "submitted": len(centers),
+            "duplicates": len(centers) - len(groups),
+            "failed": len(firsts) - sum(1 for index in firsts if index in insights),
+            "saved": saved,
+        })
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@batch_router.get("/batch/{batch_id}")
+async def get_batch(batch_id: str,
+            user: Principal = Depends(get_current_user),
+            db: aiomysql.Connection = Depends(get_read_db)):
+    """
+    The saved centers of one of the caller's batches: `index`, `input` and `insight` each.
+    """
+    results = await InsightDataService.batch_results(db, batch_id, user.email)
+    if not results:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return {"batch_id": batch_id, "centers": results}
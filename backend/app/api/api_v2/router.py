@@ -0,0 +1,6 @@
+from fastapi import APIRouter
+from app.api.api_v2.handlers import batch
+
+router = APIRouter()
+
+router.include_router(batch.batch_router, prefix='/insight', tags=["insight"])
@@ -57,14 +57,15 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: aiomysql.C
 
         # Return tokens if credentials are correct
         return {
-            "access_token": await create_access_token(subject=user['id']),
+            "access_token": await create_access_token(
+                subject=user['id'],
+                claims={"email": user['email'], "username": user['username']}
+            ),
             "refresh_token": await create_refresh_token(subject=user['id'])
         }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {e}")
-    finally:
-        db.close()  # Close the connection after the operation
     
 ########################################
 ##.         register endpoint
@@ -98,8 +99,6 @@ async def register(user: RegisterSchema, db: aiomysql.Connection = Depends(AuthD
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {e}")
 
-    finally:
-        db.close()
         
 ########################################
 ##.          refresh endpoint
@@ -109,7 +108,7 @@ async def register(user: RegisterSchema, db: aiomysql.Connection = Depends(AuthD
 async def refresh_token(refresh_token: str = Body(...), db: aiomysql.Connection = Depends(AuthDatabaseService.get_db)):
     try:
         # Decode the JWT to get the token data
-        token_data = await decode_jwt_token(refresh_token)
+        token_data = await decode_jwt_token(refresh_token, logger_settings.JWT_REFRESH_SECRET_KEY)
         
         # Use aiomysql to fetch the user based on the ID in the token
         async with db.cursor(aiomysql.DictCursor) as cursor:
@@ -123,7 +122,10 @@ async def refresh_token(refresh_token: str = Body(...), db: aiomysql.Connection
                 raise HTTPException(status_code=404, detail="User not found")
             
         return {
-            "access_token": await create_access_token(subject=user["id"]),
+            "access_token": await create_access_token(
+                subject=user["id"],
+                claims={"email": user["email"], "username": user["username"]}
+            ),
             "refresh_token": await create_refresh_token(subject=user["id"])
         }
 
@@ -134,8 +136,6 @@ async def refresh_token(refresh_token: str = Body(...), db: aiomysql.Connection
             detail="An unexpected error occurred during token refresh"
         )
     
-    finally:
-        db.close()
 
 ########################################
 ##.        reset-email endpoint
@@ -178,8 +178,6 @@ async def reset_password_email(request: PasswordResetRequest, db: aiomysql.Conne
             detail="An error occurred while processing your request"
         )
     
-    finally:
-        db.close()
 
 ########################################
 ##.      reset password endpoint
@@ -220,5 +218,3 @@ async def reset_password_confirm(request: PasswordResetConfirm, db: aiomysql.Con
     except Exception as e:
         logger.error(f"Error resetting password: {str(e)}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error: {str(e)}")
-    finally:
-        db.close()
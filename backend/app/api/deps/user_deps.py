@@ -1,43 +1,61 @@
-from datetime import datetime
+from typing import AsyncGenerator
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+import aiomysql
 from app.core.config import logger_settings
-from app.models.user_model import User
-from jose import jwt
-from pydantic import ValidationError
-from app.schemas.auth_schema import TokenPayload
+logger = logger_settings.get_logger(__name__)
+from app.core.security import _verify_jwt_token
+from app.schemas.client_schema import Principal
+from app.services.auth_service import AuthDatabaseService
 
 reuseable_oauth = OAuth2PasswordBearer(
     tokenUrl=f"{logger_settings.API_V1_STR}/auth/login",
     scheme_name="JWT"
 )
 
-async def get_current_user(token: str = Depends(reuseable_oauth)) -> User:
-    try:
-        payload = jwt.decode(
-            token, logger_settings.JWT_SECRET_KEY, algorithms=[logger_settings.ALGORITHM]
-        )
-        token_data = TokenPayload(**payload)
-        
-        if datetime.fromtimestamp(token_data.exp) < datetime.now():
-            raise HTTPException(
-                status_code = status.HTTP_401_UNAUTHORIZED,
-                detail="Token expired",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-    except(jwt.JWTError, ValidationError):
+async def get_current_user(token: str = Depends(reuseable_oauth)) -> Principal:
+    """
+    Shared auth dependency: verifies the bearer access token and returns the
+    caller's identity from its claims, without touching the database.
+    """
+    claims = _verify_jwt_token(token)
+
+    user_id = claims.get("sub")
+    if not user_id:
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Could not validate credentials",
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
-    user = payload.get("sub")
-    
+
+    if claims.get("email") and claims.get("username"):
+        return Principal(id=user_id, email=claims["email"], username=claims["username"])
+
+    # Tokens minted before identity claims were added still need one lookup
+    async with AuthDatabaseService.acquire() as connection:
+        async with connection.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute(
+                "SELECT id, email, username FROM auth_users WHERE id = %s",
+                (user_id,)
+            )
+            user = await cursor.fetchone()
     if not user:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Could not find user",
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token: user ID not found",
+            headers={"WWW-Authenticate": "Bearer"},
         )
-    
-    return user
\ No newline at end of file
+    return Principal(id=str(user["id"]), email=user["email"], username=user["username"])
+
+async def get_read_db(user: Principal = Depends(get_current_user)) -> AsyncGenerator[aiomysql.Connection, None]:
+    """
+    Connection for read-only endpoints: a replica when one is healthy and the
+    caller has not just written, otherwise the primary.
+    """
+    async with AuthDatabaseService.acquire_read(user.email) as connection:
+        try:
+            yield connection
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise RuntimeError(f"Session error: {e}")
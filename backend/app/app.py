@@ -9,11 +9,23 @@ logger = logger_settings.get_logger(__name__)
 import asyncio
 from app.models.user_model import User
 from app.api.api_v1.router import router
+from app.api.api_v2.router import router as router_v2
 from fastapi.responses import HTMLResponse, JSONResponse, FileResponse
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy import inspect
 from app.services.auth_service import AuthDatabaseService
+from app.services.migration_service import MigrationService
+from app.services.storage_service import StorageService
+from utils.vapor.engine.scheduler import start_maintenance_scheduler, start_retention_scheduler
+from app.services.redis_service import RedisService
+from app.services.cache_service import CacheService
+from app.services.write_behind_service import WriteBehindQueue
+from app.services.job_service import JobService
+from app.services.llm_service import LlmService
+from app.services.llm_usage_service import LlmUsageService
+from app.services.model_router_service import ModelRouter
+from app.core.metrics import Metrics, watch_event_loop_lag
 import uvicorn
 import time
 import redis.asyncio as redis
@@ -142,8 +154,11 @@ async def restrict_methods_middleware(request: Request, call_next):
 
 async def auth_db_startup():
     """
-    Initialize and verify the authentication database with required tables.
+    Initialize and verify the authentication database and bring its schema up to date.
     """
+    await AuthDatabaseService.ensure_database_exists()
+    await AuthDatabaseService.init_pool()
+    await AuthDatabaseService.init_replicas()
     is_connected = await AuthDatabaseService.ping_database()
     if not is_connected:
         logger.error("Failed to connect to the database!")
@@ -151,17 +166,29 @@ async def auth_db_startup():
     
     # await AuthDatabaseService.ensure_env_table_exists()
     # await AuthDatabaseService.ensure_cache_schema_exists()
-    await AuthDatabaseService.ensure_auth_table_exists()
+    await MigrationService.run_migrations()
+    await StorageService.load_dictionaries()
 
     logger.info("Successfully connected to the authentication database.")
         
 async def auth_db_shutdown():
     try:
         await AuthDatabaseService.auth_shutdown()
-        logger.info(f"Successfully closed authentication database connection.")
+        logger.info(f"Successfully closed authentication database connection pool.")
     except Exception as e:
         logger.error(f"Error closing authentication database connection: {e}")
     
+async def cache_startup():
+    """
+    Connect the shared Redis client and start the read-through cache.
+    """
+    await RedisService.startup()
+    await CacheService.startup()
+
+async def cache_shutdown():
+    await CacheService.shutdown()
+    await RedisService.shutdown()
+
 async def redis_startup(redis_clt):
     try:
         await redis_clt.ping()
@@ -210,8 +237,16 @@ def run_app():
     async def get_favicon_route():
         return await get_favicon(vite_dist_dir)
 
+    @app.get("/metrics")
+    async def get_metrics_route():
+        return JSONResponse(content={
+            **Metrics.snapshot(), "cache": CacheService.stats(), "db_pool": AuthDatabaseService.pool_stats(),
+            "models": ModelRouter.stats()
+        })
+
     # Register the router for API routes
     app.include_router(router, prefix=logger_settings.API_V1_STR)
+    app.include_router(router_v2, prefix=logger_settings.API_V2_STR)
 
     async def redis_client_support() -> redis.Redis:
         redis_clt = await redis_client()
@@ -225,16 +260,36 @@ def run_app():
         await asyncio.gather(
             # redis_startup(redis_clt),
             auth_db_startup(),
-            AuthDatabaseService.ensure_user_input_insight_tables_exists()
+            cache_startup(),
         )
+        LlmService.startup()
+        await LlmUsageService.startup()
+        app.state.loop_lag_watcher = asyncio.create_task(watch_event_loop_lag())
+        app.state.maintenance_scheduler = start_maintenance_scheduler()
+        await WriteBehindQueue.startup()
+        await JobService.startup()
+        if logger_settings.SNAPSHOT_RETENTION_ENABLED:
+            app.state.retention_scheduler = start_retention_scheduler()
         
     @app.on_event("shutdown")
     async def on_shutdown():
         logger.info("Shutting down...")
         # redis_clt = await redis_client_support()
+        if getattr(app.state, "loop_lag_watcher", None) is not None:
+            app.state.loop_lag_watcher.cancel()
+        if getattr(app.state, "maintenance_scheduler", None) is not None:
+            app.state.maintenance_scheduler.shutdown(wait=False)
+        # Requeue running jobs and drain queued saves while the pool and cache are still up
+        await JobService.shutdown()
+        await WriteBehindQueue.shutdown()
+        await LlmUsageService.shutdown()
+        if getattr(app.state, "retention_scheduler", None) is not None:
+            app.state.retention_scheduler.shutdown(wait=False)
         await asyncio.gather(
             # redis_shutdown(redis_clt),
-            auth_db_shutdown()
+            auth_db_shutdown(),
+            cache_shutdown(),
+            LlmService.shutdown()
         )
     return app
 
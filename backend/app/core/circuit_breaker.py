@@ -0,0 +1,113 @@
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Deque, Optional, Tuple
+from app.core.metrics import Metrics
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open."""
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is unavailable, retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """
+    Fails fast once at least `failure_rate` of the calls in the last `window`
+    seconds failed (over at least `min_calls` calls). After `cooldown` seconds a
+    single probe call is let through: success closes the circuit, failure
+    opens it for another cooldown.
+    """
+    def __init__(self, name: str, failure_rate: float, min_calls: int, window: float, cooldown: float):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.cooldown = cooldown
+        self.results: Deque[Tuple[float, bool]] = deque()
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "open" if time.monotonic() - self.opened_at < self.cooldown else "half_open"
+
+    def check(self) -> None:
+        """
+        Raises CircuitOpenError while the circuit is open, without taking the probe.
+        """
+        if self.state == "open":
+            self._reject()
+
+    def before(self) -> None:
+        """
+        Admits a call or raises CircuitOpenError.
+        """
+        state = self.state
+        if state == "closed":
+            return
+        if state == "half_open" and not self.probing:
+            self.probing = True
+            return
+        self._reject()
+
+    def _reject(self) -> None:
+        Metrics.incr("circuit.rejected", breaker=self.name)
+        retry_after = max(self.cooldown - (time.monotonic() - self.opened_at), 1.0)
+        raise CircuitOpenError(self.name, retry_after)
+
+    def success(self) -> None:
+        if self.probing:
+            self._close()
+        self._add(True)
+
+    def failure(self) -> None:
+        now = time.monotonic()
+        if self.probing:
+            self._open(now)
+            return
+        self._add(False)
+        failures = sum(1 for _, ok in self.results if not ok)
+        if self.opened_at is None and len(self.results) >= self.min_calls and failures >= self.failure_rate * len(self.results):
+            self._open(now)
+
+    def release(self) -> None:
+        """A call ended without telling anything about the dependency's health."""
+        self.probing = False
+
+    @asynccontextmanager
+    async def guard(self, is_failure: Callable[[BaseException], bool]) -> AsyncIterator[None]:
+        """
+        Runs the block as one call; exceptions for which `is_failure` is true count as failures.
+        """
+        self.before()
+        try:
+            yield
+        except BaseException as e:
+            if is_failure(e):
+                self.failure()
+            else:
+                self.release()
+            raise
+        self.success()
+
+    def _add(self, ok: bool) -> None:
+        now = time.monotonic()
+        self.results.append((now, ok))
+        while self.results and self.results[0][0] < now - self.window:
+            self.results.popleft()
+
+    def _open(self, now: float) -> None:
+        self.opened_at = now
+        self.probing = False
+        self.results.clear()
+        Metrics.incr("circuit.opened", breaker=self.name)
+        Metrics.set_gauge("circuit.open", 1, breaker=self.name)
+
+    def _close(self) -> None:
+        self.opened_at = None
+        self.probing = False
+        self.results.clear()
+        Metrics.set_gauge("circuit.open", 0, breaker=self.name)
@@ -0,0 +1,162 @@
+import json
+import struct
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import logger_settings
+logger = logger_settings.get_logger(__name__)
+
+try:
+    import zstandard
+except ImportError:  # optional: `pip install zstandard` to enable STORAGE_CODEC=zstd
+    zstandard = None
+
+# Blob layout: format version (1 byte) | algorithm (1 byte) | dictionary id (uint32, 0 = none) | payload
+FORMAT_VERSION = 1
+HEADER = struct.Struct(">BBI")
+
+ALGORITHM_IDS = {"none": 0, "zlib": 1, "zstd": 2}
+ALGORITHM_NAMES = {value: key for key, value in ALGORITHM_IDS.items()}
+
+# zlib only looks back 32 KiB, so a longer preset dictionary is wasted
+ZLIB_DICTIONARY_SIZE = 32 * 1024
+
+class CodecError(ValueError):
+    pass
+
+class StorageCodec:
+    """
+    Encodes snapshot payloads (`input_data` / `insights_data`) as versioned,
+    compressed blobs. Rows written before the codec existed keep their plain
+    JSON in `data` and are decoded through `decode_row`.
+    """
+    # dictionary id -> (algorithm, raw dictionary bytes)
+    _dictionaries: Dict[int, Tuple[str, bytes]] = {}
+    _zstd_dictionaries: Dict[int, Any] = {}
+
+    @staticmethod
+    def algorithm() -> str:
+        """
+        Algorithm new rows are written with; `json` keeps writing legacy plain-JSON rows.
+        """
+        name = logger_settings.STORAGE_CODEC
+        if name == "zstd" and zstandard is None:
+            raise CodecError("STORAGE_CODEC=zstd requires the `zstandard` package")
+        if name not in ("json", "none", "zlib", "zstd"):
+            raise CodecError(f"Unknown STORAGE_CODEC '{name}'")
+        return name
+
+    @staticmethod
+    def register_dictionary(dictionary_id: int, algorithm: str, dictionary: bytes) -> None:
+        StorageCodec._dictionaries[dictionary_id] = (algorithm, dictionary)
+        if algorithm == "zstd" and zstandard is not None:
+            StorageCodec._zstd_dictionaries[dictionary_id] = zstandard.ZstdCompressionDict(dictionary)
+
+    @staticmethod
+    def has_dictionary(dictionary_id: int) -> bool:
+        return dictionary_id in StorageCodec._dictionaries
+
+    @staticmethod
+    def active_dictionary(algorithm: str) -> int:
+        """
+        Newest registered dictionary for `algorithm`, or 0 when dictionaries are off.
+        """
+        if not logger_settings.STORAGE_CODEC_USE_DICTIONARY:
+            return 0
+        ids = [key for key, (name, _) in StorageCodec._dictionaries.items() if name == algorithm]
+        return max(ids, default=0)
+
+    @staticmethod
+    def train_dictionary(samples: List[bytes], algorithm: str, size: int = 64 * 1024) -> bytes:
+        """
+        Builds a shared dictionary from sample payloads.
+        """
+        if algorithm == "zstd":
+            if zstandard is None:
+                raise CodecError("zstd dictionaries require the `zstandard` package")
+            return zstandard.train_dictionary(size, samples).as_bytes()
+        # zlib has no trainer; its preset dictionary works best as recent, representative
+        # content with the most common strings placed last
+        return b"".join(samples)[-min(size, ZLIB_DICTIONARY_SIZE):]
+
+    @staticmethod
+    def encode(value: Any, algorithm: Optional[str] = None, dictionary_id: Optional[int] = None) -> bytes:
+        algorithm = algorithm or StorageCodec.algorithm()
+        if algorithm == "json":
+            raise CodecError("The json codec writes plain `data`, not blobs")
+        if dictionary_id is None:
+            dictionary_id = StorageCodec.active_dictionary(algorithm)
+        raw = json.dumps(value, separators=(",", ":")).encode("utf-8")
+        level = logger_settings.STORAGE_CODEC_LEVEL
+
+        if algorithm == "none":
+            payload = raw
+        elif algorithm == "zlib":
+            if dictionary_id:
+                compressor = zlib.compressobj(level, zdict=StorageCodec._dictionaries[dictionary_id][1])
+            else:
+                compressor = zlib.compressobj(level)
+            payload = compressor.compress(raw) + compressor.flush()
+        elif algorithm == "zstd":
+            if zstandard is None:
+                raise CodecError("zstd requires the `zstandard` package")
+            dictionary = StorageCodec._zstd_dictionaries.get(dictionary_id) if dictionary_id else None
+            payload = zstandard.ZstdCompressor(level=level, dict_data=dictionary).compress(raw)
+        else:
+            raise CodecError(f"Unknown algorithm '{algorithm}'")
+        return HEADER.pack(FORMAT_VERSION, ALGORITHM_IDS[algorithm], dictionary_id) + payload
+
+    @staticmethod
+    def header(blob: bytes) -> Tuple[int, str, int]:
+        """
+        Returns (format version, algorithm, dictionary id) of an encoded blob.
+        """
+        if len(blob) < HEADER.size:
+            raise CodecError("Blob is shorter than the codec header")
+        version, algorithm_id, dictionary_id = HEADER.unpack_from(blob)
+        if version != FORMAT_VERSION:
+            raise CodecError(f"Unsupported storage format version {version}")
+        if algorithm_id not in ALGORITHM_NAMES:
+            raise CodecError(f"Unknown algorithm id {algorithm_id}")
+        return version, ALGORITHM_NAMES[algorithm_id], dictionary_id
+
+    @staticmethod
+    def decode(blob: bytes) -> Any:
+        _, algorithm, dictionary_id = StorageCodec.header(blob)
+        if dictionary_id and dictionary_id not in StorageCodec._dictionaries:
+            raise KeyError(dictionary_id)
+        payload = memoryview(blob)[HEADER.size:]
+
+        if algorithm == "none":
+            raw = bytes(payload)
+        elif algorithm == "zlib":
+            if dictionary_id:
+                decompressor = zlib.decompressobj(zdict=StorageCodec._dictionaries[dictionary_id][1])
+            else:
+                decompressor = zlib.decompressobj()
+            raw = decompressor.decompress(payload) + decompressor.flush()
+        else:
+            if zstandard is None:
+                raise CodecError("Reading zstd rows requires the `zstandard` package")
+            dictionary = StorageCodec._zstd_dictionaries.get(dictionary_id) if dictionary_id else None
+            raw = zstandard.ZstdDecompressor(dict_data=dictionary).decompress(payload)
+        return json.loads(raw)
+
+    @staticmethod
+    def decode_row(data: Optional[Any], data_blob: Optional[bytes]) -> Any:
+        """
+        Decodes a snapshot row: the codec blob when present, else legacy plain JSON.
+        """
+        if data_blob is not None:
+            return StorageCodec.decode(data_blob)
+        if data is None:
+            return None
+        return json.loads(data) if isinstance(data, (str, bytes)) else data
+
+    @staticmethod
+    def to_columns(value: Any) -> Tuple[Optional[str], Optional[bytes]]:
+        """
+        (`data`, `data_blob`) column values for a new row under the configured codec.
+        """
+        if StorageCodec.algorithm() == "json":
+            return json.dumps(value), None
+        return None, StorageCodec.encode(value)
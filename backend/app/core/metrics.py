@@ -0,0 +1,118 @@
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict, deque
+from typing import Dict, List, Any
+
+# Upper bounds (milliseconds) of the latency histogram buckets
+DEFAULT_BUCKETS: List[float] = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+
+def metric_key(name: str, **labels) -> str:
+    """Build a flat metric key such as `cache.hit{tier=local}`."""
+    if not labels:
+        return name
+    rendered = ",".join(f"{key}={value}" for key, value in sorted(labels.items()))
+    return f"{name}{{{rendered}}}"
+
+class Histogram:
+    """
+    Bucketed histogram with a bounded sample window for percentiles.
+    """
+    def __init__(self, buckets: List[float] = None, window: int = 1024):
+        self.buckets = buckets or DEFAULT_BUCKETS
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def percentile(self, q: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+        return ordered[index]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "buckets": {
+                **{f"le_{bound:g}": count for bound, count in zip(self.buckets, self.counts)},
+                "le_inf": self.counts[-1],
+            },
+        }
+
+class Metrics:
+    """
+    Process-wide counters, gauges and histograms, exported as JSON on `/metrics`.
+    """
+    _lock = threading.Lock()
+    _counters: Dict[str, float] = defaultdict(float)
+    _gauges: Dict[str, float] = {}
+    _histograms: Dict[str, Histogram] = {}
+    _started_at: float = time.time()
+
+    @staticmethod
+    def incr(name: str, value: float = 1, **labels) -> None:
+        with Metrics._lock:
+            Metrics._counters[metric_key(name, **labels)] += value
+
+    @staticmethod
+    def set_gauge(name: str, value: float, **labels) -> None:
+        with Metrics._lock:
+            Metrics._gauges[metric_key(name, **labels)] = value
+
+    @staticmethod
+    def observe(name: str, value: float, **labels) -> None:
+        key = metric_key(name, **labels)
+        with Metrics._lock:
+            histogram = Metrics._histograms.get(key)
+            if histogram is None:
+                histogram = Metrics._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @staticmethod
+    def counter(name: str, **labels) -> float:
+        return Metrics._counters.get(metric_key(name, **labels), 0)
+
+    @staticmethod
+    def histogram(name: str, **labels) -> Histogram:
+        return Metrics._histograms.get(metric_key(name, **labels))
+
+    @staticmethod
+    def snapshot() -> Dict[str, Any]:
+        with Metrics._lock:
+            return {
+                "uptime_seconds": time.time() - Metrics._started_at,
+                "counters": dict(Metrics._counters),
+                "gauges": dict(Metrics._gauges),
+                "histograms": {key: histogram.snapshot() for key, histogram in Metrics._histograms.items()},
+            }
+
+    @staticmethod
+    def reset() -> None:
+        with Metrics._lock:
+            Metrics._counters.clear()
+            Metrics._gauges.clear()
+            Metrics._histograms.clear()
+
+async def watch_event_loop_lag(interval: float = 0.5) -> None:
+    """
+    Records how late the event loop wakes a sleeping task (`event_loop.lag_ms`),
+    i.e. how long callbacks wait behind blocking work.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        Metrics.observe("event_loop.lag_ms", max(loop.time() - started - interval, 0) * 1000)
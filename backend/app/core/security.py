@@ -3,16 +3,18 @@ from typing import Union, Any
 from jose import jwt
 import os, hashlib
 import asyncio
+import threading
 from app.core.config import Settings, logger_settings
 logger = logger_settings.get_logger(__name__)
 from fastapi import APIRouter, Depends, HTTPException, status, Body
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
-from jose import jwt, JWTError
+from jose import jwt, JWTError, ExpiredSignatureError
 from passlib.context import CryptContext
 from pydantic import BaseModel, EmailStr, ValidationError
-from typing import Optional, Union, Any
+from typing import Optional, Union, Any, Tuple
+from collections import OrderedDict
 from app.schemas.client_schema import UserOut
 from app.schemas.client_schema import TokenPayload
 from datetime import datetime, timedelta, timezone
@@ -21,12 +23,18 @@ import json
 
 password_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-def _create_access_token(subject: Union[str, Any], expires_delta: int = None) -> str:
+# Verified-token LRU: (secret, token) -> (exp, claims). Repeat tokens skip signature verification.
+_verified_tokens: "OrderedDict[Tuple[str, str], Tuple[int, dict]]" = OrderedDict()
+# Tokens are verified on the event loop and in worker threads (decode_jwt_token)
+_verified_tokens_lock = threading.Lock()
+
+def _create_access_token(subject: Union[str, Any], expires_delta: int = None, claims: Optional[dict] = None) -> str:
     if expires_delta is not None:
         expires_delta = datetime.now(timezone.utc) + expires_delta
     else:
         expires_delta = datetime.now(timezone.utc) + timedelta(minutes=logger_settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode = {"exp": expires_delta, "sub": str(subject)}
+    # Identity claims (email, username, ...) let requests skip the auth_users lookup
+    to_encode = {**(claims or {}), "exp": expires_delta, "sub": str(subject)}
     encoded_jwt = jwt.encode(to_encode, logger_settings.JWT_SECRET_KEY, logger_settings.ALGORITHM)
     return encoded_jwt
 
@@ -52,19 +60,56 @@ def _random_hash_generator(context: str = '', is_context: bool = False) -> str:
     else:
         return hashlib.md5(os.urandom(32)).hexdigest()
 
-def _decode_jwt_token(token: str) -> TokenPayload:
+def _verify_jwt_token(token: str, secret_key: str = None) -> dict:
+    """
+    Verify a JWT and return its claims. Verified tokens are remembered until
+    they expire, so repeat requests with the same token skip signature checks.
+    Raises:
+        HTTPException: 401 when the token is expired or invalid.
+    """
+    secret_key = secret_key or logger_settings.JWT_SECRET_KEY
+    cache_key = (secret_key, token)
+    now = datetime.now(timezone.utc).timestamp()
+
+    with _verified_tokens_lock:
+        cached = _verified_tokens.get(cache_key)
+        if cached is not None:
+            if cached[0] > now:
+                _verified_tokens.move_to_end(cache_key)
+            else:
+                _verified_tokens.pop(cache_key, None)
+    if cached is not None:
+        exp, claims = cached
+        if exp > now:
+            return claims
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token expired")
+
+    try:
+        claims = jwt.decode(token, secret_key, algorithms=[logger_settings.ALGORITHM])
+    except ExpiredSignatureError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token expired")
+    except JWTError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+
+    with _verified_tokens_lock:
+        _verified_tokens[cache_key] = (claims.get("exp", 0), claims)
+        while len(_verified_tokens) > logger_settings.TOKEN_CACHE_MAX_ENTRIES:
+            _verified_tokens.popitem(last=False)
+    return claims
+
+def _decode_jwt_token(token: str, secret_key: str = None) -> TokenPayload:
+    claims = _verify_jwt_token(token, secret_key)
     try:
-        payload = jwt.decode(token, logger_settings.JWT_SECRET_KEY, algorithms=[logger_settings.ALGORITHM])
-        return TokenPayload(**payload)
-    except (JWTError, ValidationError):
+        return TokenPayload(**claims)
+    except ValidationError:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Invalid token"
         )
 
 # Async function for creating access token
-async def create_access_token(subject: Union[str, Any], expires_delta: int = None) -> str:
-    return await asyncio.to_thread(_create_access_token, subject, expires_delta)
+async def create_access_token(subject: Union[str, Any], expires_delta: int = None, claims: Optional[dict] = None) -> str:
+    return await asyncio.to_thread(_create_access_token, subject, expires_delta, claims)
 
 # Async function for creating refresh token
 async def create_refresh_token(subject: Union[str, Any], expires_delta: int = None) -> str:
@@ -83,8 +128,8 @@ async def random_hash_generator(context: str = '', is_context: bool = False) ->
     return await asyncio.to_thread(_random_hash_generator, context, is_context)
 
 # Async function for decoding a JWT token
-async def decode_jwt_token(token: str) -> TokenPayload:
-    return await asyncio.to_thread(_decode_jwt_token, token)
+async def decode_jwt_token(token: str, secret_key: str = None) -> TokenPayload:
+    return await asyncio.to_thread(_decode_jwt_token, token, secret_key)
 
 async def get_user_id(token: str) -> str:
     # Decode without verification
@@ -3,6 +3,7 @@ from app.core.config import logger_settings, Settings
 from typing import Optional
 logger = logger_settings.get_logger(__name__)
 import aiofiles
+from app.prompts.registry import PromptRegistry
 
 class Prompt:
     @staticmethod
@@ -20,17 +21,18 @@ class Prompt:
     
     @staticmethod
     async def read_prompt_full(prompt_name: str, **kwargs) -> str:
-        prompt_text = await Prompt.read_prompt(prompt_name)
-        if prompt_text:  # Proceed only if the prompt was successfully read
-            try:
-                return prompt_text.format(**kwargs)
-            except KeyError as e:
-                logger.error(f"Error: Missing key {e} in formatting arguments.")
-                return ""
-            except Exception as e:
-                logger.error(f"An error occurred during formatting: {e}")
-                return ""
-        return ""
+        # Compiled once and reloaded only when the file changes
+        try:
+            return PromptRegistry.render(prompt_name, **kwargs)
+        except FileNotFoundError:
+            logger.error(f"Prompt {prompt_name} not found.")
+            return ""
+        except KeyError as e:
+            logger.error(f"Error: Missing key {e} in formatting arguments.")
+            return ""
+        except Exception as e:
+            logger.error(f"An error occurred during formatting: {e}")
+            return ""
     
     @staticmethod
     async def update_prompt(prompt_name, prompt_text) -> None:
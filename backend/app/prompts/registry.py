@@ -0,0 +1,51 @@
+import os
+import threading
+from string import Formatter
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import logger_settings
+logger = logger_settings.get_logger(__name__)
+
+class PromptTemplate:
+    """
+    A prompt file compiled once into literal text and `{field}` slots
+    (`{{` / `}}` for literal braces, as with `str.format`).
+    """
+    def __init__(self, name: str, text: str):
+        self.name = name
+        self._segments: List[Tuple[str, Optional[str]]] = []
+        for literal, field, spec, conversion in Formatter().parse(text):
+            if field is not None and (not field.isidentifier() or spec or conversion):
+                raise ValueError(f"Prompt '{name}' has unsupported placeholder '{{{field}}}'")
+            self._segments.append((literal, field))
+        self.fields = {field for _, field in self._segments if field}
+
+    def render(self, **values: Any) -> str:
+        missing = self.fields - values.keys()
+        if missing:
+            raise KeyError(f"Prompt '{self.name}' is missing {sorted(missing)}")
+        return "".join(literal + (str(values[field]) if field else "") for literal, field in self._segments)
+
+class PromptRegistry:
+    """
+    Compiled prompt templates from `PROMPT_DIR`, reloaded when the file's mtime changes.
+    """
+    _templates: Dict[str, Tuple[int, PromptTemplate]] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get(name: str) -> PromptTemplate:
+        path = os.path.join(logger_settings.PROMPT_DIR, f"{name}.txt")
+        mtime = os.stat(path).st_mtime_ns
+        cached = PromptRegistry._templates.get(name)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with PromptRegistry._lock:
+            with open(path, "r", encoding="utf-8") as file:
+                template = PromptTemplate(name, file.read())
+            PromptRegistry._templates[name] = (mtime, template)
+        logger.info(f"Compiled prompt '{name}' ({len(template.fields)} field(s)).")
+        return template
+
+    @staticmethod
+    def render(prompt_name: str, /, **values: Any) -> str:
+        return PromptRegistry.get(prompt_name).render(**values)
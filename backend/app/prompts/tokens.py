@@ -0,0 +1,42 @@
+import json
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+from app.core.config import logger_settings
+logger = logger_settings.get_logger(__name__)
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - optional dependency
+    tiktoken = None
+
+@lru_cache(maxsize=8)
+def encoding_for(model: str) -> Optional[Any]:
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # The encoding files are downloaded on first use; estimate when offline
+        logger.warning(f"No tokenizer for {model}, estimating token counts: {e}")
+        return None
+
+def count_tokens(text: str, model: str = "gpt-4-turbo") -> int:
+    """
+    Tokens in `text` with the model's tokenizer, or ~4 characters per token without tiktoken.
+    """
+    encoding = encoding_for(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text))
+
+def count_message_tokens(messages: List[Dict[str, str]], model: str = "gpt-4-turbo") -> int:
+    # Each chat message carries a few tokens of framing
+    return sum(count_tokens(message.get("content") or "", model) + 4 for message in messages) + 3
+
+def compact_json(value: Any) -> str:
+    """
+    JSON without insignificant whitespace, which costs tokens and tells the model nothing.
+    """
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
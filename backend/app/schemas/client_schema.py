@@ -36,4 +36,10 @@ class UserOut(BaseModel):
     id: int
     username: str
     # email: EmailStr
-    email: str
\ No newline at end of file
+    email: str
+
+class Principal(BaseModel):
+    """Authenticated user, built from verified access token claims."""
+    id: str
+    email: str
+    username: str
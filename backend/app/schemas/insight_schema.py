@@ -0,0 +1,67 @@
+from typing import List, Optional
+from pydantic import BaseModel
+
+# Define Pydantic models for input data
+class RevenueSource(BaseModel):
+    id: Optional[str] = None
+    sourceName: str
+    monthlyAmount: float
+    tag: str
+
+class EmployeeExpense(BaseModel):
+    id: Optional[str] = None
+    expenseName: str
+    monthlyAmount: float
+    type: str
+    hoursPerMonth: Optional[float] = None
+    
+class FacilityExpense(BaseModel):
+    id: Optional[str] = None
+    expenseName: str
+    monthlyAmount: float
+    type: str
+
+class Classroom(BaseModel):
+    id: Optional[str] = None
+    name: str
+    capacity: int
+    ratio: float
+    avgStudents: int
+
+class OperatingDetail(BaseModel):
+    operatingHours: float
+    operatingDays: float
+
+    
+class Administrative(BaseModel):
+    id: Optional[str] = None
+    expenseName: str
+    monthlyAmount: float
+    type: str
+
+class Supplies(BaseModel):
+    id: Optional[str] = None
+    expenseName: str
+    monthlyAmount: float
+    type: str
+    
+class Goals(BaseModel):
+    id: Optional[str] = None
+    goal: str
+    targetPercentage: float
+
+class DaycareInput(BaseModel):
+    businessName: Optional[str] = "Unamed Daycare"
+    revenueSources: List[RevenueSource] = []
+    employees: List[EmployeeExpense] = []
+    facilities: List[FacilityExpense] = []
+    administrative: List[FacilityExpense] = []
+    supplies: List[FacilityExpense] = []
+    classrooms: List[Classroom] = []
+    operatingHours: Optional[float] = 0.0  # Default operating hours
+    operatingDays: Optional[float] = 0.0  # Default operating days
+    # operatingDetails: List[OperatingDetail] = []
+    goals: List[Goals] = []
+
+class BatchInsightRequest(BaseModel):
+    centers: List[DaycareInput]
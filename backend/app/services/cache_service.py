@@ -0,0 +1,203 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from app.core.config import logger_settings
+logger = logger_settings.get_logger(__name__)
+from app.core.metrics import Metrics
+from app.services.redis_service import RedisService
+
+INVALIDATION_CHANNEL = "caresim:cache:invalidate"
+
+class LocalTTLCache:
+    """
+    Bounded in-process LRU whose entries also expire after `ttl` seconds.
+    """
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def set(self, key: str, value: Any) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class CacheService:
+    """
+    Read-through cache for per-user snapshots: in-process LRU -> Redis -> loader (MySQL).
+    Cached values are shared between requests and must be treated as read-only.
+    """
+    _local = LocalTTLCache(logger_settings.CACHE_LOCAL_MAX_ENTRIES, logger_settings.CACHE_LOCAL_TTL)
+    _inflight: Dict[str, asyncio.Future] = {}
+    _listener: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def key(kind: str, user_email: str) -> str:
+        return f"caresim:{kind}:{user_email}"
+
+    @staticmethod
+    async def startup() -> None:
+        """
+        Subscribes to cross-process invalidations when Redis is shared.
+        """
+        if RedisService.is_shared() and CacheService._listener is None:
+            CacheService._listener = asyncio.create_task(CacheService._listen_for_invalidations())
+
+    @staticmethod
+    async def shutdown() -> None:
+        listener = CacheService._listener
+        CacheService._listener = None
+        if listener is not None:
+            listener.cancel()
+        CacheService._local.clear()
+
+    @staticmethod
+    async def _listen_for_invalidations() -> None:
+        pubsub = RedisService.client().pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            async for message in pubsub.listen():
+                if message.get("type") == "message":
+                    CacheService._local.delete(message["data"])
+                    CacheService._inflight.pop(message["data"], None)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Cache invalidation listener stopped: {e}")
+        finally:
+            await pubsub.aclose()
+
+    @staticmethod
+    async def _redis_get(key: str) -> Tuple[bool, Any]:
+        client = RedisService.client()
+        if client is None:
+            return False, None
+        try:
+            raw = await client.get(key)
+        except Exception as e:
+            Metrics.incr("cache.redis_error")
+            logger.warning(f"Redis read failed for {key}: {e}")
+            return False, None
+        if raw is None:
+            return False, None
+        return True, json.loads(raw)
+
+    @staticmethod
+    async def _redis_set(key: str, value: Any) -> None:
+        client = RedisService.client()
+        if client is None:
+            return
+        try:
+            await client.set(key, json.dumps(value), ex=logger_settings.CACHE_REDIS_TTL)
+        except Exception as e:
+            Metrics.incr("cache.redis_error")
+            logger.warning(f"Redis write failed for {key}: {e}")
+
+    @staticmethod
+    async def get_or_load(kind: str, user_email: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Returns the cached value for (kind, user), loading it on a miss.
+        Concurrent misses on the same key share a single `loader` call.
+        `None` results are not cached.
+        """
+        key = CacheService.key(kind, user_email)
+
+        hit, value = CacheService._local.get(key)
+        if hit:
+            Metrics.incr("cache.hit", tier="local", kind=kind)
+            return value
+
+        inflight = CacheService._inflight.get(key)
+        if inflight is not None:
+            Metrics.incr("cache.coalesced", kind=kind)
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        CacheService._inflight[key] = future
+        try:
+            hit, value = await CacheService._redis_get(key)
+            if hit:
+                Metrics.incr("cache.hit", tier="redis", kind=kind)
+            else:
+                Metrics.incr("cache.miss", kind=kind)
+                value = await loader()
+            # An invalidation during the load detaches our future; don't store a stale value then
+            if value is not None and CacheService._inflight.get(key) is future:
+                if not hit:
+                    await CacheService._redis_set(key, value)
+                CacheService._local.set(key, value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            if CacheService._inflight.get(key) is future:
+                del CacheService._inflight[key]
+
+    @staticmethod
+    async def invalidate(user_email: str, *kinds: str) -> None:
+        """
+        Drops the user's entries from every tier and tells other processes to do the same.
+        """
+        keys = [CacheService.key(kind, user_email) for kind in kinds]
+        for key in keys:
+            CacheService._local.delete(key)
+            CacheService._inflight.pop(key, None)
+        Metrics.incr("cache.invalidate", len(keys))
+
+        client = RedisService.client()
+        if client is None:
+            return
+        try:
+            await client.delete(*keys)
+            for key in keys:
+                await client.publish(INVALIDATION_CHANNEL, key)
+        except Exception as e:
+            Metrics.incr("cache.redis_error")
+            logger.warning(f"Redis invalidation failed for {user_email}: {e}")
+
+    @staticmethod
+    async def put(kind: str, user_email: str, value: Any) -> None:
+        """
+        Writes a fresh value through both tiers (other processes drop their local copy).
+        """
+        await CacheService.invalidate(user_email, kind)
+        key = CacheService.key(kind, user_email)
+        await CacheService._redis_set(key, value)
+        CacheService._local.set(key, value)
+
+    @staticmethod
+    def stats() -> Dict[str, Any]:
+        return {
+            "local_entries": len(CacheService._local),
+            "inflight": len(CacheService._inflight),
+        }
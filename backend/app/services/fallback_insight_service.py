@@ -0,0 +1,84 @@
+from typing import Any, Dict, List
+from app.core.config import logger_settings
+logger = logger_settings.get_logger(__name__)
+from app.services.kpi_service import KpiService, money
+
+# Always applicable, used to fill the list up to RECOMMENDATION_COUNT
+GENERAL_RECOMMENDATIONS = [
+    "Review this report monthly and compare each line item with the previous month.",
+    "Track staff hours against classroom ratios weekly to avoid paying for idle coverage.",
+    "Re-check supplier and service contracts before they renew.",
+    "Set a tuition review date for next quarter based on local market rates.",
+]
+RECOMMENDATION_COUNT = 4
+
+class FallbackInsightService:
+    """
+    Insight documents built without the model: the computed KPI sections plus an
+    executive summary from fixed templates and rule-based recommendations.
+    Used when the model is too slow or unavailable; the result carries
+    `"degraded": true`.
+    """
+    @staticmethod
+    def recommendations(data: Dict[str, Any], totals: Dict[str, Any], kpis: Dict[str, Any]) -> List[str]:
+        net = kpis["net_monthly_income"]["value"]
+        needed = kpis["break_even_enrollment"]["value"]
+        utilization = kpis["capacity_utilization"]["value"]
+        largest = kpis["largest_expense"]
+        students, capacity = totals["students"], totals["capacity"]
+
+        rules: List[str] = []
+        if net < 0 and largest["category"] != "None":
+            rules.append(
+                f"{largest['category']} is {largest['percentage_of_total_expenses']}% of expenses; "
+                f"find savings there first to close the {money(-net)} monthly gap."
+            )
+        if students and needed > capacity:
+            rules.append(f"Break-even needs {needed} students but capacity is {capacity}; raise tuition or cut fixed costs.")
+        elif students and needed > students:
+            rules.append(f"Enroll {needed - students} more student(s) to reach break-even.")
+        if capacity and utilization < 60:
+            rules.append(f"Only {utilization}% of seats are filled; run an enrollment campaign for the {capacity - students} open seat(s).")
+        elif capacity and utilization >= 95:
+            rules.append("Classrooms are nearly full; open a waitlist and consider adding a classroom.")
+        if net > 0:
+            rules.append(f"Set aside part of the {money(net)} monthly surplus as an operating reserve.")
+        revenue_sources = data.get("revenueSources") or []
+        if len(revenue_sources) == 1 and totals["revenue"] > 0:
+            rules.append("All revenue comes from one source; add programs such as after-care or summer camp.")
+        for goal in (data.get("goals") or [])[:1]:
+            rules.append(f"Break the goal \"{goal['goal']}\" ({goal['targetPercentage']}%) into monthly targets and track them here.")
+
+        for general in GENERAL_RECOMMENDATIONS:
+            if len(rules) >= RECOMMENDATION_COUNT:
+                break
+            rules.append(general)
+        return rules[:RECOMMENDATION_COUNT]
+
+    @staticmethod
+    def build(data: Dict[str, Any]) -> Dict[str, Any]:
+        totals = KpiService.totals(data)
+        kpis = KpiService.compute(data)
+        net = kpis["net_monthly_income"]["value"]
+        if net > 0:
+            profitability = f"Profitable, with {money(net)} left each month."
+        elif net < 0:
+            profitability = f"Not profitable, losing {money(-net)} each month."
+        else:
+            profitability = "Breaking even."
+        return {
+            **kpis,
+            "executive_summary": {
+                "financial_overview": (
+                    f"Monthly revenue is {money(totals['revenue'])} against {money(totals['expenses'])} of expenses. "
+                    f"{kpis['net_monthly_income']['note']}"
+                ),
+                "profitability_status": profitability,
+                "enrollment_status": (
+                    f"{totals['students']} of {totals['capacity']} seats are filled "
+                    f"({kpis['capacity_utilization']['value']}%). {kpis['capacity_utilization']['note']}"
+                ),
+                "recommendations": FallbackInsightService.recommendations(data, totals, kpis),
+            },
+            "degraded": True,
+        }
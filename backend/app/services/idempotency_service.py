@@ -0,0 +1,130 @@
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, Tuple
+from fastapi import HTTPException
+from app.core.config import logger_settings
+logger = logger_settings.get_logger(__name__)
+from app.core.metrics import Metrics
+from app.services.redis_service import InMemoryRedis, RedisService
+
+IDEMPOTENCY_PREFIX = "caresim:idempotency"
+MAX_KEY_LENGTH = 255
+
+def fingerprint(document: Any) -> str:
+    """SHA-256 of the canonical JSON of a request, to tell a retry from a reused key."""
+    return hashlib.sha256(
+        json.dumps(document, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+    ).hexdigest()
+
+class IdempotencyService:
+    """
+    Runs a POST once per `Idempotency-Key` and replays its result to retries
+    for `IDEMPOTENCY_TTL_HOURS`. Concurrent requests with the same key wait for
+    the first one: in-process on its task, across processes by polling the
+    record in Redis. Without Redis the records live in this process only, at
+    most `IDEMPOTENCY_LOCAL_MAX_ENTRIES` of them.
+    Failed requests leave no record, so their retries run again.
+    """
+    # Used when Redis is not connected
+    _local = InMemoryRedis(max_entries=logger_settings.IDEMPOTENCY_LOCAL_MAX_ENTRIES)
+    # record key -> (fingerprint, task running the request)
+    _inflight: Dict[str, Tuple[str, asyncio.Future]] = {}
+
+    @staticmethod
+    def store() -> Any:
+        return RedisService.client() or IdempotencyService._local
+
+    @staticmethod
+    def check(stored: str, current: str, endpoint: str) -> None:
+        if stored != current:
+            Metrics.incr("idempotency.requests", endpoint=endpoint, outcome="conflict")
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+
+    @staticmethod
+    async def run(user_email: str, endpoint: str, key: str, request: Any,
+                  call: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Args:
+            request: what makes two requests the same (body and options); reusing the
+                key with a different one is rejected with 422.
+        Returns:
+            Tuple[Any, bool]: the result, and whether it was replayed from an earlier request.
+                The result must be JSON-serializable.
+        """
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters")
+        # Scoped per user, so one user's key never replays another's response
+        record_key = f"{IDEMPOTENCY_PREFIX}:{endpoint}:{user_email}:{key}"
+        digest = fingerprint(request)
+
+        inflight = IdempotencyService._inflight.get(record_key)
+        if inflight is not None:
+            IdempotencyService.check(inflight[0], digest, endpoint)
+            Metrics.incr("idempotency.requests", endpoint=endpoint, outcome="waited")
+            result, _ = await asyncio.shield(inflight[1])
+            return result, True
+
+        # A separate task, so the request completes and is recorded even if its client disconnects
+        task = asyncio.ensure_future(IdempotencyService._claim(record_key, digest, endpoint, call))
+        IdempotencyService._inflight[record_key] = (digest, task)
+        task.add_done_callback(lambda done: IdempotencyService._finished(record_key, done))
+        return await asyncio.shield(task)
+
+    @staticmethod
+    def _finished(record_key: str, task: asyncio.Future) -> None:
+        inflight = IdempotencyService._inflight.get(record_key)
+        if inflight is not None and inflight[1] is task:
+            del IdempotencyService._inflight[record_key]
+        # Mark a failure as retrieved even if every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    @staticmethod
+    async def _claim(record_key: str, digest: str, endpoint: str,
+                     call: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        store = IdempotencyService.store()
+        lock_ttl = logger_settings.IDEMPOTENCY_LOCK_TTL
+        pending = json.dumps({"fingerprint": digest, "state": "pending"})
+        deadline = time.monotonic() + lock_ttl
+        while time.monotonic() < deadline:
+            try:
+                claimed = await store.set(record_key, pending, nx=True, px=int(lock_ttl * 1000))
+                raw = None if claimed else await store.get(record_key)
+            except Exception as e:
+                logger.warning(f"Idempotency store unavailable, running the request without it: {e}")
+                return await call(), False
+            if claimed:
+                Metrics.incr("idempotency.requests", endpoint=endpoint, outcome="executed")
+                return await IdempotencyService._execute(store, record_key, digest, call), False
+            if raw is None:
+                # Released between our SET and GET; try to take it
+                continue
+            record = json.loads(raw)
+            IdempotencyService.check(record["fingerprint"], digest, endpoint)
+            if record["state"] == "done":
+                Metrics.incr("idempotency.requests", endpoint=endpoint, outcome="replayed")
+                return record["result"], True
+            # Another process is running it
+            await asyncio.sleep(logger_settings.IDEMPOTENCY_POLL_INTERVAL)
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+
+    @staticmethod
+    async def _execute(store: Any, record_key: str, digest: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            result = await call()
+        except BaseException:
+            try:
+                await store.delete(record_key)
+            except Exception as e:
+                logger.warning(f"Could not release Idempotency-Key claim: {e}")
+            raise
+        try:
+            await store.set(
+                record_key, json.dumps({"fingerprint": digest, "state": "done", "result": result}, default=str),
+                ex=int(logger_settings.IDEMPOTENCY_TTL_HOURS * 3600)
+            )
+        except Exception as e:
+            logger.warning(f"Could not store idempotent response: {e}")
+        return result
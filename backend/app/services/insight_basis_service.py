@@ -0,0 +1,44 @@
+from typing import Any, Dict, Optional
+from app.core.config import logger_settings
+logger = logger_settings.get_logger(__name__)
+from app.core.codec import StorageCodec
+from app.services.auth_service import AuthDatabaseService
+
+class InsightBasisService:
+    """
+    The input and executive summary behind each user's latest model-written
+    insight, and the model that wrote it (None for a mix), kept in `insight_basis`. Best effort: without a basis the next
+    insight is simply generated in full.
+    """
+    @staticmethod
+    async def get(user_email: str) -> Optional[Dict[str, Any]]:
+        try:
+            async with AuthDatabaseService.acquire() as connection:
+                async with connection.cursor() as cursor:
+                    await cursor.execute("SELECT basis FROM insight_basis WHERE user_email = %s", (user_email,))
+                    row = await cursor.fetchone()
+        except Exception as e:
+            logger.warning(f"Insight basis lookup for {user_email} failed: {e}")
+            return None
+        return StorageCodec.decode(row[0]) if row else None
+
+    @staticmethod
+    async def put(user_email: str, input_data: Dict[str, Any], summary: Dict[str, Any],
+                  model: Optional[str] = None) -> None:
+        codec = StorageCodec.algorithm()
+        blob = StorageCodec.encode(
+            {"input": input_data, "executive_summary": summary, "model": model}, "none" if codec == "json" else codec
+        )
+        try:
+            async with AuthDatabaseService.acquire() as connection:
+                async with connection.cursor() as cursor:
+                    await cursor.execute(
+                        """
+                        INSERT INTO insight_basis (user_email, basis) VALUES (%s, %s)
+                        ON DUPLICATE KEY UPDATE basis = VALUES(basis)
+                        """,
+                        (user_email, blob)
+                    )
+                await connection.commit()
+        except Exception as e:
+            logger.warning(f"Insight basis store for {user_email} failed: {e}")
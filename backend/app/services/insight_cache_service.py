@@ -0,0 +1,124 @@
+import asyncio
+import hashlib
+import json
+from typing import Any, Dict, Optional
+from app.core.config import logger_settings
+logger = logger_settings.get_logger(__name__)
+from app.core.codec import StorageCodec
+from app.core.metrics import Metrics
+from app.services.auth_service import AuthDatabaseService
+
+# Client-generated row ids carry no meaning for the analysis
+IGNORED_KEYS = {"id"}
+
+def canonicalize(value: Any) -> Any:
+    """
+    Normalized form of a DaycareInput payload: `id` fields dropped, strings
+    trimmed, and lists (line items, classrooms, goals) sorted, since their
+    order does not change the analysis.
+    """
+    if isinstance(value, dict):
+        return {key: canonicalize(item) for key, item in value.items() if key not in IGNORED_KEYS}
+    if isinstance(value, list):
+        items = [canonicalize(item) for item in value]
+        return sorted(items, key=lambda item: json.dumps(item, sort_keys=True))
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def input_hash(data: Dict[str, Any], model: str, prompt_version: str) -> str:
+    """
+    SHA-256 of the canonical input plus the model and prompt version, so
+    upgrading either one misses the old entries.
+    """
+    document = {"model": model, "prompt_version": prompt_version, "input": canonicalize(data)}
+    return hashlib.sha256(
+        json.dumps(document, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    ).hexdigest()
+
+class InsightCacheService:
+    """
+    Persisted exact-match cache of generated insights in `insight_cache`.
+    """
+    @staticmethod
+    async def get(key: str) -> Optional[Dict[str, Any]]:
+        if not logger_settings.INSIGHT_CACHE_ENABLED:
+            return None
+        try:
+            async with AuthDatabaseService.acquire() as connection:
+                async with connection.cursor() as cursor:
+                    await cursor.execute(
+                        "SELECT insight FROM insight_cache WHERE input_hash = %s AND expires_at > NOW()",
+                        (key,)
+                    )
+                    row = await cursor.fetchone()
+                    if row is not None:
+                        await cursor.execute(
+                            "UPDATE insight_cache SET hits = hits + 1 WHERE input_hash = %s", (key,)
+                        )
+                await connection.commit()
+        except Exception as e:
+            # A cache outage must not block generation
+            logger.warning(f"Insight cache lookup failed: {e}")
+            return None
+        Metrics.incr("insight_cache.hit" if row else "insight_cache.miss")
+        return StorageCodec.decode(row[0]) if row else None
+
+    @staticmethod
+    async def put(key: str, model: str, prompt_version: str, insight: Dict[str, Any]) -> None:
+        if not logger_settings.INSIGHT_CACHE_ENABLED:
+            return
+        codec = StorageCodec.algorithm()
+        blob = StorageCodec.encode(insight, "none" if codec == "json" else codec)
+        try:
+            async with AuthDatabaseService.acquire() as connection:
+                async with connection.cursor() as cursor:
+                    await cursor.execute(
+                        """
+                        INSERT INTO insight_cache (input_hash, model, prompt_version, insight, expires_at)
+                        VALUES (%s, %s, %s, %s, NOW() + INTERVAL %s SECOND)
+                        ON DUPLICATE KEY UPDATE
+                            insight = VALUES(insight), hits = 0,
+                            created_at = CURRENT_TIMESTAMP, expires_at = VALUES(expires_at)
+                        """,
+                        (key, model, prompt_version, blob, int(logger_settings.INSIGHT_CACHE_TTL_HOURS * 3600))
+                    )
+                await connection.commit()
+        except Exception as e:
+            logger.warning(f"Insight cache store failed: {e}")
+
+    @staticmethod
+    async def purge() -> None:
+        """
+        Scheduled purge of expired entries, independent of snapshot retention.
+        """
+        try:
+            purged = await InsightCacheService.purge_expired()
+        except Exception as e:
+            logger.error(f"Insight cache purge failed: {e}")
+            return
+        Metrics.incr("insight_cache.purged", purged)
+        if purged:
+            logger.info(f"Purged {purged} expired insight cache entr{'y' if purged == 1 else 'ies'}.")
+
+    @staticmethod
+    async def purge_expired(batch_size: int = 1000) -> int:
+        """
+        Deletes expired entries in small batches.
+        """
+        purged = 0
+        while True:
+            async with AuthDatabaseService.acquire() as connection:
+                async with connection.cursor() as cursor:
+                    await cursor.execute(
+                        "DELETE FROM insight_cache WHERE expires_at <= NOW() LIMIT %s", (batch_size,)
+                    )
+                    deleted = cursor.rowcount
+                await connection.commit()
+            purged += deleted
+            if deleted < batch_size:
+                return purged
+            # Let foreground traffic in between batches
+            await asyncio.sleep(0.05)
@@ -0,0 +1,435 @@
+import asyncio
+import hashlib
+import json
+from contextlib import AsyncExitStack
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+from fastapi import HTTPException
+from app.core.config import logger_settings
+logger = logger_settings.get_logger(__name__)
+from app.core.circuit_breaker import CircuitOpenError
+from app.core.metrics import Metrics
+from app.prompts.tokens import count_message_tokens
+from app.schemas.insight_schema import DaycareInput
+from app.services.auth_service import AuthDatabaseService
+from app.services.fallback_insight_service import FallbackInsightService
+from app.services.insight_basis_service import InsightBasisService
+from app.services.insight_cache_service import InsightCacheService, canonicalize, input_hash
+from app.services.insight_service import InsightDataService
+from app.services.job_service import JobService
+from app.services.kpi_service import KpiService
+from app.services.insight_stream_service import InsightStreamService
+from app.services.llm_service import LlmQueueTimeoutError, LlmService, is_transient, is_upstream_failure, retry_delay
+from app.services.llm_usage_service import LlmUsageService
+from app.services.model_router_service import ModelRouter
+from app.services.prompt_service import InsightPromptService
+from app.services.single_flight_service import SingleFlight
+
+# Prompts are sized for the configured model; cached insights are keyed on the model that answered
+INSIGHT_MODEL = logger_settings.MODEL
+# Bump whenever the insight prompt changes so cached insights from the old prompt are not reused
+INSIGHT_PROMPT_VERSION = "3"
+FULL_MAX_TOKENS = 600
+SUMMARY_SECTIONS = ["financial_overview", "profitability_status", "enrollment_status", "recommendations"]
+# Completion budget when only some summary sections are regenerated
+SECTION_MAX_TOKENS = {"financial_overview": 150, "profitability_status": 60, "enrollment_status": 100, "recommendations": 300}
+# DaycareInput field -> summary sections written from it; other fields (e.g. businessName) affect all of them
+FIELD_SECTIONS = {
+    **{field: ["financial_overview", "profitability_status", "recommendations"]
+       for field in ("revenueSources", "employees", "facilities", "administrative", "supplies")},
+    **{field: ["enrollment_status", "recommendations"] for field in ("classrooms", "operatingHours", "operatingDays")},
+    "goals": ["recommendations"],
+}
+
+def changed_sections(previous: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """
+    Summary sections, in report order, whose inputs differ between two DaycareInput payloads
+    (compared in canonical form, so reordering items or changing their ids is no change).
+    """
+    affected = set()
+    for field in previous.keys() | current.keys():
+        if canonicalize(previous.get(field)) != canonicalize(current.get(field)):
+            affected.update(FIELD_SECTIONS.get(field, SUMMARY_SECTIONS))
+    return [section for section in SUMMARY_SECTIONS if section in affected]
+
+class InsightGenerationService:
+    """
+    Insight documents for a DaycareInput: KPI sections computed locally plus
+    the model's executive summary.
+    """
+    _upgrades: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def build_messages(data: DaycareInput) -> Tuple[Dict[str, Any], List[Dict[str, str]]]:
+        """
+        The locally computed KPI sections and the chat messages asking the model
+        for the executive summary around them.
+        """
+        payload = data.dict()
+        kpis = KpiService.compute(payload)
+        messages, _ = InsightPromptService.build(payload, kpis, KpiService.totals(payload), INSIGHT_MODEL)
+        return kpis, messages
+
+    @staticmethod
+    def cache_models(data: DaycareInput, user_email: Optional[str] = None) -> List[str]:
+        """
+        Models whose cached insight for `data` may be served to the user (see `ModelRouter.cacheable`).
+        """
+        _, messages = InsightGenerationService.build_messages(data)
+        return ModelRouter.cacheable(count_message_tokens(messages, INSIGHT_MODEL), user_email)
+
+    @staticmethod
+    async def from_cache(payload: Dict[str, Any], models: List[str]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        The first insight cached for `payload` under one of `models`, and that model.
+        """
+        for model in models:
+            insight = await InsightCacheService.get(input_hash(payload, model, INSIGHT_PROMPT_VERSION))
+            if insight is not None:
+                return insight, model
+        return None, None
+
+    @staticmethod
+    async def to_cache(payload: Dict[str, Any], models: List[str], model: Optional[str], insight: Dict[str, Any]) -> None:
+        """
+        Caches the insight under the model that answered, unless that model's answers
+        may not be served for this request (a failover model, or a mix of models).
+        """
+        if model in models:
+            await InsightCacheService.put(input_hash(payload, model, INSIGHT_PROMPT_VERSION), model, INSIGHT_PROMPT_VERSION, insight)
+
+    @staticmethod
+    async def ask_model(model: str, messages: List[Dict[str, str]], max_tokens: int,
+                        user_email: Optional[str] = None, operation: str = "insight") -> Dict[str, Any]:
+        """
+        The model's parsed answer to `messages`; invalid JSON is retried `LLM_JSON_RETRIES` times.
+        """
+        attempts = logger_settings.LLM_JSON_RETRIES + 1
+        for attempt in range(1, attempts + 1):
+            insights_content = None
+            try:
+                # Parsing is inside the tracked call so a malformed answer counts as a json_error outcome
+                async with LlmUsageService.track(model, operation, user_email) as call:
+                    response = await LlmService.chat(
+                        messages,
+                        model=model,
+                        max_tokens=max_tokens,
+                        call=call,
+                        temperature=0.8,
+                        response_format={"type": "json_object"}
+                    )
+                    insights_content = response.choices[0].message.content
+                    summary = json.loads(insights_content)
+                return summary.get("executive_summary", summary)
+            except json.JSONDecodeError as e:
+                logger.error(f"JSON decode error from {model} (attempt {attempt}): {e}; problematic content: {insights_content}")
+                if attempt == attempts:
+                    raise
+
+    @staticmethod
+    async def ask(messages: List[Dict[str, str]], max_tokens: int, user_email: Optional[str] = None,
+                  operation: str = "insight") -> Tuple[Dict[str, Any], str]:
+        """
+        The executive summary (or summary sections) answering `messages` and the model
+        that wrote it, from the models ModelRouter picks, failing over to the next while
+        one is unavailable. Failures are raised as HTTPException.
+        """
+        models = ModelRouter.route(count_message_tokens(messages, INSIGHT_MODEL), user_email, operation)
+        for model in models:
+            try:
+                return await InsightGenerationService.ask_model(model, messages, max_tokens, user_email, operation), model
+            except json.JSONDecodeError as e:
+                raise HTTPException(status_code=500, detail=f"Failed to parse OpenAI response: {str(e)}")
+            except LlmQueueTimeoutError as e:
+                # Every model shares the limits, so failing over would only queue again
+                raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+            except Exception as e:
+                unavailable = isinstance(e, CircuitOpenError) or is_upstream_failure(e)
+                if unavailable and model != models[-1]:
+                    logger.warning(f"{model} is unavailable ({e!r}), failing over to the next model.")
+                    Metrics.incr("llm.failover", model=model)
+                    continue
+                if isinstance(e, CircuitOpenError):
+                    raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(round(e.retry_after))})
+                if isinstance(e, asyncio.TimeoutError):
+                    raise HTTPException(status_code=504, detail="OpenAI did not answer in time")
+                raise HTTPException(status_code=500, detail=f"OpenAI API error: {str(e)}")
+
+    @staticmethod
+    async def stream_summary(messages: List[Dict[str, str]], user_email: Optional[str] = None,
+                             operation: str = "insight_stream") -> AsyncIterator[Tuple[str, str, Any]]:
+        """
+        Yields (model, section, value) of the streamed executive summary as each section
+        completes, within `LLM_DEADLINE` and with no gap over `LLM_STREAM_IDLE_TIMEOUT`.
+        Until the first section, transient failures are retried and an unavailable model
+        fails over to the next one ModelRouter picks; after it, they end the stream.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + logger_settings.LLM_DEADLINE
+        models = ModelRouter.route(count_message_tokens(messages, INSIGHT_MODEL), user_email, operation)
+        index, attempt = 0, 0
+        while True:
+            model = models[index]
+            attempt += 1
+            emitted = False
+            try:
+                async with AsyncExitStack() as stack:
+                    call = await stack.enter_async_context(LlmUsageService.track(model, operation, user_email))
+                    LlmService.breaker(model).check()
+                    # The queue wait is bounded on its own and never counts against the model
+                    call.wait_ms = await stack.enter_async_context(
+                        LlmService.admitted(messages, FULL_MAX_TOKENS, deadline - loop.time())
+                    )
+                    await stack.enter_async_context(LlmService.breaker(model).guard(is_upstream_failure))
+                    started = loop.time()
+                    try:
+                        async for name, value in InsightStreamService.generate(
+                            LlmService.client(), model, {}, messages, call=call,
+                            idle_timeout=logger_settings.LLM_STREAM_IDLE_TIMEOUT, deadline=deadline,
+                            max_tokens=FULL_MAX_TOKENS, temperature=0.8
+                        ):
+                            emitted = True
+                            yield model, name, value
+                    finally:
+                        call.network_ms = (loop.time() - started) * 1000
+                ModelRouter.observe(model, ok=True, latency_ms=call.network_ms)
+                return
+            except Exception as e:
+                if is_upstream_failure(e):
+                    ModelRouter.observe(model, ok=False)
+                if emitted:
+                    raise
+                if (isinstance(e, CircuitOpenError) or is_upstream_failure(e)) and index < len(models) - 1:
+                    logger.warning(f"{model} is unavailable for streaming ({e!r}), failing over to the next model.")
+                    Metrics.incr("llm.failover", model=model)
+                    index, attempt = index + 1, 0
+                    continue
+                delay = retry_delay(attempt, e)
+                if not is_transient(e) or attempt >= logger_settings.LLM_MAX_ATTEMPTS or loop.time() + delay >= deadline:
+                    raise
+                logger.warning(f"Streaming from {model} failed (attempt {attempt}), retrying in {delay:.1f}s: {e!r}")
+                Metrics.incr("llm.retries", model=model)
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    async def generate(data: DaycareInput, user_email: Optional[str] = None) -> Tuple[Dict[str, Any], str]:
+        """
+        Returns:
+            Tuple[Dict[str, Any], str]: the insight and the model that wrote its summary.
+        """
+        kpis, messages = InsightGenerationService.build_messages(data)
+        logger.info(f"Generating insights for {data.businessName}...")
+        summary, model = await InsightGenerationService.ask(messages, FULL_MAX_TOKENS, user_email)
+        # Put the narrative next to the computed metrics
+        return {**kpis, "executive_summary": summary}, model
+
+    @staticmethod
+    async def regenerate(data: DaycareInput, basis: Dict[str, Any],
+                         user_email: Optional[str] = None) -> Optional[Tuple[Dict[str, Any], Optional[str]]]:
+        """
+        The insight for `data` with only the executive summary sections affected by
+        the changes since `basis` rewritten (none when only e.g. the line-item ids
+        changed), and the model that wrote its summary (None when sections of
+        different models were mixed). None when everything has to be regenerated anyway.
+        """
+        payload = data.dict()
+        previous = basis["executive_summary"]
+        sections = changed_sections(basis["input"], payload)
+        if len(sections) == len(SUMMARY_SECTIONS) or not set(SUMMARY_SECTIONS) <= previous.keys():
+            return None
+
+        kpis, totals = KpiService.compute(payload), KpiService.totals(payload)
+        _, full_tokens, _ = InsightPromptService.full(payload, kpis, totals, INSIGHT_MODEL)
+        spent = 0
+        summary = dict(previous)
+        model = basis.get("model")
+        if sections:
+            messages, prompt_tokens = InsightPromptService.build_partial(payload, kpis, totals, sections, previous, INSIGHT_MODEL)
+            max_tokens = sum(SECTION_MAX_TOKENS[section] for section in sections)
+            rewritten, answered = await InsightGenerationService.ask(messages, max_tokens, user_email, "insight_sections")
+            if not all(section in rewritten for section in sections):
+                logger.warning(f"Partial answer for {data.businessName} lacks some of {sections}, regenerating in full.")
+                return None
+            summary.update({section: rewritten[section] for section in sections})
+            spent = prompt_tokens + max_tokens
+            if answered != model:
+                model = None
+
+        # Estimated from the prompts and completion budgets of both requests
+        saved = full_tokens + FULL_MAX_TOKENS - spent
+        Metrics.incr("insight.sections_regenerated", len(sections))
+        Metrics.incr("insight.tokens_saved", saved)
+        Metrics.observe("insight.tokens_saved_per_request", saved)
+        logger.info(
+            f"Regenerated {len(sections)} of {len(SUMMARY_SECTIONS)} summary section(s) for {data.businessName} "
+            f"({', '.join(sections) or 'none'}): ~{spent} tokens instead of ~{full_tokens + FULL_MAX_TOKENS}, saving ~{saved}."
+        )
+        return {**kpis, "executive_summary": summary}, model
+
+    @staticmethod
+    async def cached(input_data: DaycareInput, force_refresh: bool = False, user_email: Optional[str] = None,
+                     incremental: bool = False) -> Tuple[Dict[str, Any], str]:
+        """
+        The insight from the cache, or freshly generated and cached. Only insights of the
+        models the router would prefer for this user are served from the cache. With
+        `incremental`, a user's edit only regenerates the summary sections it affects
+        (status `partial`).
+        Returns:
+            Tuple[Dict[str, Any], str]: the insight and the cache status (hit, partial, miss or bypass).
+        """
+        payload = input_data.dict()
+        incremental = incremental and user_email is not None and logger_settings.INSIGHT_INCREMENTAL_ENABLED
+        models = InsightGenerationService.cache_models(input_data, user_email)
+        insight, model = (None, None) if force_refresh else await InsightGenerationService.from_cache(payload, models)
+        cache_status = "hit"
+        if insight is None and incremental and not force_refresh:
+            basis = await InsightBasisService.get(user_email)
+            regenerated = None if basis is None else await InsightGenerationService.regenerate(input_data, basis, user_email)
+            if regenerated is not None:
+                (insight, model), cache_status = regenerated, "partial"
+        if insight is None:
+            insight, model = await InsightGenerationService.generate(input_data, user_email)
+            cache_status = "bypass" if force_refresh else "miss"
+        if cache_status != "hit":
+            await InsightGenerationService.to_cache(payload, models, model, insight)
+        if incremental:
+            await InsightBasisService.put(user_email, payload, insight["executive_summary"], model)
+        return insight, cache_status
+
+    @staticmethod
+    async def within_deadline(input_data: DaycareInput, force_refresh: bool = False,
+                              user_email: Optional[str] = None,
+                              saved: Optional["asyncio.Future"] = None) -> Tuple[Dict[str, Any], str]:
+        """
+        `cached`, but answers with a degraded template insight when the model misses
+        `INSIGHT_DEADLINE` or its circuit is open. The model's insight then replaces
+        the degraded one in the background, once `saved` says the degraded one was saved.
+        """
+        generation = asyncio.ensure_future(
+            InsightGenerationService.cached(input_data, force_refresh, user_email, incremental=True)
+        )
+        try:
+            # Shielded so the model call keeps going past the deadline
+            return await asyncio.wait_for(asyncio.shield(generation), logger_settings.INSIGHT_DEADLINE)
+        except asyncio.TimeoutError:
+            reason = "deadline"
+        except HTTPException as e:
+            if e.status_code not in (503, 504):
+                raise
+            reason = "circuit_open" if e.status_code == 503 else "deadline"
+        except asyncio.CancelledError:
+            generation.cancel()
+            raise
+        logger.warning(f"Insight for {user_email} degraded to the template ({reason}).")
+        Metrics.incr("insight.degraded", reason=reason)
+        degraded = FallbackInsightService.build(input_data.dict())
+        InsightGenerationService.upgrade_later(generation, input_data, user_email, force_refresh, degraded, saved)
+        return degraded, "bypass" if force_refresh else "miss"
+
+    @staticmethod
+    async def replace_degraded(user_email: str, degraded: Dict[str, Any], insight: Dict[str, Any]) -> bool:
+        """
+        Saves the model's insight if the user's current insight is still `degraded`;
+        a newer input or insight saved in the meantime wins.
+        """
+        async with AuthDatabaseService.acquire() as db:
+            replaced = await InsightDataService.replace_insight(db, user_email, degraded, insight)
+        if replaced:
+            Metrics.incr("insight.upgraded")
+            logger.info(f"Upgraded the degraded insight of {user_email}.")
+        else:
+            Metrics.incr("insight.upgrade_skipped")
+            logger.info(f"Degraded insight of {user_email} was superseded, not upgrading it.")
+        return replaced
+
+    @staticmethod
+    def upgrade_later(generation: "asyncio.Future", input_data: DaycareInput, user_email: str, force_refresh: bool,
+                      degraded: Dict[str, Any], saved: Optional["asyncio.Future"] = None) -> None:
+        """
+        Replaces the user's degraded insight with the model's once `generation`
+        finishes; when it fails, an `insight` job retries with backoff.
+        """
+        async def upgrade():
+            try:
+                insight, _ = await generation
+                failure = None
+            except Exception as e:
+                insight, failure = None, e
+            # Compare against the degraded insight only once it is stored
+            if saved is not None and not await saved:
+                return
+            if failure is None:
+                await InsightGenerationService.replace_degraded(user_email, degraded, insight)
+                return
+            # While the circuit is open, the job waits out the cooldown before its first try
+            delay = float((getattr(failure, "headers", None) or {}).get("Retry-After", 0))
+            try:
+                await JobService.submit(
+                    "insight", user_email,
+                    {"input": input_data.dict(), "force_refresh": force_refresh, "replaces": degraded}, delay
+                )
+                logger.info(f"Queued an insight job to upgrade the degraded insight of {user_email}: {failure}")
+            except Exception as submit_error:
+                logger.error(f"Degraded insight of {user_email} will not be upgraded: {submit_error}")
+
+        task = asyncio.ensure_future(upgrade())
+        # Keep a reference until it finishes, or the task can be garbage collected mid-way
+        InsightGenerationService._upgrades.add(task)
+        task.add_done_callback(InsightGenerationService._upgrades.discard)
+
+    @staticmethod
+    async def produce(input_data: DaycareInput, user_email: str, force_refresh: bool = False,
+                      degrade: bool = True) -> Tuple[Dict[str, Any], str]:
+        """
+        Generates (or reuses from the cache) and saves the user's insight for the input.
+        With `degrade`, a template insight is saved and returned if the model is late (see `within_deadline`).
+        Concurrent identical requests of one user share a single generation and a single saved row.
+        Returns:
+            Tuple[Dict[str, Any], str]: the insight and the cache status (hit, partial, miss or bypass).
+        """
+        async def generate():
+            # Tells a background upgrade whether the degraded insight it replaces was stored
+            saved = asyncio.get_running_loop().create_future()
+            try:
+                if degrade and logger_settings.INSIGHT_DEGRADE_ENABLED:
+                    insight, cache_status = await InsightGenerationService.within_deadline(
+                        input_data, force_refresh, user_email, saved
+                    )
+                else:
+                    insight, cache_status = await InsightGenerationService.cached(input_data, force_refresh, user_email, incremental=True)
+                try:
+                    # Store the insight and point the user's current snapshot at it. The connection
+                    # is borrowed for the save only, and the generation may outlive the request.
+                    async with AuthDatabaseService.acquire() as db:
+                        await InsightDataService.save_insight(db, user_email, insight)
+                except Exception as e:
+                    raise HTTPException(status_code=500, detail=f"Error saving insight: {e}")
+                saved.set_result(True)
+            finally:
+                if not saved.done():
+                    saved.set_result(False)
+            return [insight, cache_status]
+
+        cache_key = input_hash(input_data.dict(), INSIGHT_MODEL, INSIGHT_PROMPT_VERSION)
+        flight_key = hashlib.sha256(f"{user_email}\n{cache_key}\n{force_refresh}\n{degrade}".encode("utf-8")).hexdigest()
+        (insight, cache_status), _ = await SingleFlight.do(flight_key, generate)
+        return insight, cache_status
+
+    @staticmethod
+    async def run_job(payload: Dict[str, Any], user_email: str) -> Dict[str, Any]:
+        """
+        Handler of `insight` jobs (`/insight/jobs` and degraded-insight upgrades):
+        generates (or reuses) the insight and saves it. Jobs have no one waiting on
+        them, so they never degrade to the template insight. An upgrade job only saves
+        its insight while the degraded one in `replaces` is still the user's current one.
+        """
+        input_data = DaycareInput(**payload["input"])
+        force_refresh = payload.get("force_refresh", False)
+        if "replaces" in payload:
+            insight, _ = await InsightGenerationService.cached(input_data, force_refresh, user_email, incremental=True)
+            await InsightGenerationService.replace_degraded(user_email, payload["replaces"], insight)
+            return insight
+        insight, _ = await InsightGenerationService.produce(input_data, user_email, force_refresh, degrade=False)
+        return insight
+
+# Registered with the service, so workers can run insight jobs whichever module submitted them
+JobService.register("insight", InsightGenerationService.run_job)
@@ -0,0 +1,368 @@
+import base64
+import json
+from datetime import datetime
+from typing import AsyncIterator, Optional, Dict, Any, List, Sequence, Tuple
+import aiomysql
+from app.core.config import logger_settings
+logger = logger_settings.get_logger(__name__)
+from app.core.codec import StorageCodec
+from app.services.auth_service import AuthDatabaseService
+from app.services.cache_service import CacheService
+from app.services.storage_service import StorageService
+from app.services.write_behind_service import WriteBehindQueue, chunk_rows
+
+# Snapshot table -> column of `user_current` pointing at the user's newest row
+SNAPSHOT_TABLES = {
+    "input_data": "input_id",
+    "insights_data": "insight_id",
+}
+
+# Snapshot table -> cache kind holding the parsed `data` of the user's newest row
+CACHE_KINDS = {
+    "input_data": "input",
+    "insights_data": "insight",
+}
+
+# Fields a snapshot listing can project; `data` is the only one that needs the row body
+SNAPSHOT_FIELDS = ("id", "created_at", "data")
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), row_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Raises:
+        ValueError: the cursor was not produced by `encode_cursor`.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+def same_document(first: Any, second: Any) -> bool:
+    """Equality of two JSON documents as stored (key order and tuples vs lists do not matter)."""
+    return json.dumps(first, sort_keys=True, default=str) == json.dumps(second, sort_keys=True, default=str)
+
+class InsightDataService:
+    @staticmethod
+    async def save_snapshot(db: aiomysql.Connection, table: str, user_email: str, data: Dict[str, Any]) -> Optional[int]:
+        """
+        Insert a snapshot row and move the user's `user_current` pointer to it
+        in the same transaction. With write-behind enabled the row is queued
+        instead and flushed in a batch.
+
+        Args:
+            db (aiomysql.Connection): connection borrowed for the request.
+            table (str): `input_data` or `insights_data`.
+            user_email (str): owner of the snapshot.
+            data (Dict[str, Any]): JSON-serializable payload.
+
+        Returns:
+            Optional[int]: id of the inserted row, or None when queued.
+        """
+        if WriteBehindQueue.enabled():
+            await WriteBehindQueue.enqueue(table, user_email, data)
+            return None
+
+        pointer_column = SNAPSHOT_TABLES[table]
+        await db.begin()
+        try:
+            async with db.cursor() as cursor:
+                await cursor.execute(
+                    f"INSERT INTO {table} (user_email, data, data_blob) VALUES (%s, %s, %s)",
+                    (user_email, *StorageCodec.to_columns(data))
+                )
+                row_id = cursor.lastrowid
+                # GREATEST keeps the pointer monotonic when two saves commit out of order
+                await cursor.execute(
+                    f"""
+                    INSERT INTO user_current (user_email, {pointer_column}) VALUES (%s, %s)
+                    ON DUPLICATE KEY UPDATE
+                        {pointer_column} = GREATEST(COALESCE({pointer_column}, 0), VALUES({pointer_column}))
+                    """,
+                    (user_email, row_id)
+                )
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        await AuthDatabaseService.mark_written(user_email)
+        # Write through so readers never reload it from a replica that has not caught up
+        await CacheService.put(CACHE_KINDS[table], user_email, data)
+        return row_id
+
+    @staticmethod
+    async def save_snapshots(db: aiomysql.Connection, table: str, user_email: str, items: List[Dict[str, Any]]) -> int:
+        """
+        Insert several snapshots of one user with multi-row INSERTs and move the
+        `user_current` pointer to the last of them, in one transaction.
+
+        Returns:
+            int: number of snapshots saved (or queued with write-behind enabled).
+        """
+        if not items:
+            return 0
+        if WriteBehindQueue.enabled():
+            for data in items:
+                await WriteBehindQueue.enqueue(table, user_email, data)
+            return len(items)
+
+        pointer_column = SNAPSHOT_TABLES[table]
+        rows = [(user_email, *StorageCodec.to_columns(data)) for data in items]
+        await db.begin()
+        try:
+            async with db.cursor() as cursor:
+                first_id = None
+                for chunk in chunk_rows(rows):
+                    await cursor.executemany(
+                        f"INSERT INTO {table} (user_email, data, data_blob) VALUES (%s, %s, %s)", chunk
+                    )
+                    first_id = cursor.lastrowid if first_id is None else first_id
+                await cursor.execute(
+                    f"""
+                    INSERT INTO user_current (user_email, {pointer_column})
+                    SELECT user_email, MAX(id) FROM {table} WHERE id >= %s AND user_email = %s GROUP BY user_email
+                    ON DUPLICATE KEY UPDATE
+                        {pointer_column} = GREATEST(COALESCE({pointer_column}, 0), VALUES({pointer_column}))
+                    """,
+                    (first_id, user_email)
+                )
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        await AuthDatabaseService.mark_written(user_email)
+        await CacheService.put(CACHE_KINDS[table], user_email, items[-1])
+        return len(items)
+
+    @staticmethod
+    async def save_batch_results(db: aiomysql.Connection, batch_id: str, user_email: str,
+                                 results: List[Tuple[int, Dict[str, Any], Dict[str, Any]]]) -> int:
+        """
+        Store (center index, input, insight) of a batch's successful centers in
+        `batch_results`. The user's own snapshots and `user_current` are left alone.
+
+        Returns:
+            int: number of centers saved.
+        """
+        if not results:
+            return 0
+        codec = StorageCodec.algorithm()
+        rows = [
+            (batch_id, user_email, index,
+             StorageCodec.encode({"input": input_data, "insight": insight}, "none" if codec == "json" else codec))
+            for index, input_data, insight in results
+        ]
+        await db.begin()
+        try:
+            async with db.cursor() as cursor:
+                for chunk in chunk_rows(rows):
+                    await cursor.executemany(
+                        "INSERT INTO batch_results (batch_id, user_email, center_index, result) VALUES (%s, %s, %s, %s)",
+                        chunk
+                    )
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        await AuthDatabaseService.mark_written(user_email)
+        return len(results)
+
+    @staticmethod
+    async def batch_results(db: aiomysql.Connection, batch_id: str, user_email: str) -> List[Dict[str, Any]]:
+        """
+        The saved centers of one of the user's batches, by center index.
+        """
+        async with db.cursor() as cursor:
+            await cursor.execute(
+                """
+                SELECT center_index, result, created_at FROM batch_results
+                WHERE batch_id = %s AND user_email = %s ORDER BY center_index
+                """,
+                (batch_id, user_email)
+            )
+            rows = await cursor.fetchall()
+        return [
+            {"index": index, **StorageCodec.decode(result), "created_at": created_at.isoformat()}
+            for index, result, created_at in rows
+        ]
+
+    @staticmethod
+    async def latest_snapshot(db: aiomysql.Connection, table: str, user_email: str) -> Optional[Dict[str, Any]]:
+        """
+        Fetch the user's newest snapshot row through the `user_current` pointer
+        (a primary-key lookup plus a primary-key join, independent of history size).
+
+        Returns:
+            Optional[Dict[str, Any]]: row with `id`, `user_email`, `data`, `data_blob`
+            and `created_at`, or None. Decode it with `StorageService.decode_row`.
+        """
+        pointer_column = SNAPSHOT_TABLES[table]
+        async with db.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute(
+                f"""
+                SELECT d.id, d.user_email, d.data, d.data_blob, d.created_at
+                FROM user_current uc
+                JOIN {table} d ON d.id = uc.{pointer_column}
+                WHERE uc.user_email = %s
+                """,
+                (user_email,)
+            )
+            return await cursor.fetchone()
+
+    @staticmethod
+    async def save_input(db: aiomysql.Connection, user_email: str, data: Dict[str, Any]) -> Optional[int]:
+        return await InsightDataService.save_snapshot(db, "input_data", user_email, data)
+
+    @staticmethod
+    async def save_insight(db: aiomysql.Connection, user_email: str, data: Dict[str, Any]) -> Optional[int]:
+        return await InsightDataService.save_snapshot(db, "insights_data", user_email, data)
+
+    @staticmethod
+    async def replace_insight(db: aiomysql.Connection, user_email: str, expected: Dict[str, Any],
+                              data: Dict[str, Any]) -> bool:
+        """
+        Save `data` as the user's insight only while their current insight is still
+        `expected`. The check locks the user's `user_current` row in the same
+        transaction as the save, so a newer insight saved meanwhile is never replaced.
+
+        Returns:
+            bool: whether `data` was saved.
+        """
+        if WriteBehindQueue.enabled():
+            pending = WriteBehindQueue.pending("insights_data", user_email)
+            if pending is not None:
+                # Not flushed yet; the queue keeps saves in order
+                if same_document(pending, expected):
+                    await WriteBehindQueue.enqueue("insights_data", user_email, data)
+                    return True
+                return False
+
+        await db.begin()
+        try:
+            async with db.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(
+                    """
+                    SELECT d.data, d.data_blob FROM user_current uc
+                    JOIN insights_data d ON d.id = uc.insight_id
+                    WHERE uc.user_email = %s
+                    FOR UPDATE
+                    """,
+                    (user_email,)
+                )
+                row = await cursor.fetchone()
+                if row is None or not same_document(await StorageService.decode_row(row), expected):
+                    await db.rollback()
+                    return False
+                await cursor.execute(
+                    "INSERT INTO insights_data (user_email, data, data_blob) VALUES (%s, %s, %s)",
+                    (user_email, *StorageCodec.to_columns(data))
+                )
+                await cursor.execute(
+                    "UPDATE user_current SET insight_id = %s WHERE user_email = %s", (cursor.lastrowid, user_email)
+                )
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        await AuthDatabaseService.mark_written(user_email)
+        await CacheService.put(CACHE_KINDS["insights_data"], user_email, data)
+        return True
+
+    @staticmethod
+    async def latest_input(db: aiomysql.Connection, user_email: str) -> Optional[Dict[str, Any]]:
+        return await InsightDataService.latest_snapshot(db, "input_data", user_email)
+
+    @staticmethod
+    async def latest_insight(db: aiomysql.Connection, user_email: str) -> Optional[Dict[str, Any]]:
+        return await InsightDataService.latest_snapshot(db, "insights_data", user_email)
+
+    @staticmethod
+    async def latest_input_data(db: aiomysql.Connection, user_email: str) -> Optional[Dict[str, Any]]:
+        """
+        Parsed `data` of the user's newest input snapshot, served through the cache.
+        """
+        pending = WriteBehindQueue.pending("input_data", user_email)
+        if pending is not None:
+            return pending
+
+        async def load():
+            row = await InsightDataService.latest_input(db, user_email)
+            return await StorageService.decode_row(row) if row else None
+        return await CacheService.get_or_load(CACHE_KINDS["input_data"], user_email, load)
+
+    @staticmethod
+    async def latest_insight_data(db: aiomysql.Connection, user_email: str) -> Optional[Dict[str, Any]]:
+        """
+        Parsed `data` of the user's newest insight, served through the cache.
+        Unparseable rows are returned as an empty insight.
+        """
+        pending = WriteBehindQueue.pending("insights_data", user_email)
+        if pending is not None:
+            return pending
+
+        async def load():
+            row = await InsightDataService.latest_insight(db, user_email)
+            if not row:
+                return None
+            try:
+                return await StorageService.decode_row(row)
+            except Exception:
+                logger.error(f"Stored insight {row['id']} for {user_email} could not be decoded.")
+                return {}
+        return await CacheService.get_or_load(CACHE_KINDS["insights_data"], user_email, load)
+
+    @staticmethod
+    async def iter_snapshots(
+        table: str,
+        user_email: str,
+        limit: int,
+        cursor: Optional[str] = None,
+        fields: Sequence[str] = SNAPSHOT_FIELDS,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streams one page of the user's snapshots, newest first, using keyset
+        pagination on (created_at, id). The final item is `{"next_cursor": ...}`
+        (None on the last page). Without `data` in `fields` the query is served
+        from the (user_email, created_at) index alone.
+        Borrows its own connection so it can outlive the request's dependencies.
+        """
+        if table not in SNAPSHOT_TABLES:
+            raise ValueError(f"Unknown snapshot table '{table}'")
+        columns = "id, created_at" + (", data, data_blob" if "data" in fields else "")
+        query = f"SELECT {columns} FROM {table} WHERE user_email = %s"
+        params: Tuple[Any, ...] = (user_email,)
+        if cursor:
+            created_at, row_id = decode_cursor(cursor)
+            query += " AND (created_at < %s OR (created_at = %s AND id < %s))"
+            params += (created_at, created_at, row_id)
+        query += " ORDER BY created_at DESC, id DESC LIMIT %s"
+        params += (limit + 1,)
+
+        emitted, last = 0, None
+        async with AuthDatabaseService.acquire_read(user_email) as connection:
+            # Unbuffered: rows are sent on as MySQL produces them
+            async with connection.cursor(aiomysql.SSDictCursor) as db_cursor:
+                await db_cursor.execute(query, params)
+                while True:
+                    row = await db_cursor.fetchone()
+                    if row is None or emitted == limit:
+                        break
+                    item = {}
+                    if "id" in fields:
+                        item["id"] = row["id"]
+                    if "created_at" in fields:
+                        item["created_at"] = row["created_at"].isoformat()
+                    if "data" in fields:
+                        item["data"] = await StorageService.decode_row(row)
+                    yield item
+                    emitted, last = emitted + 1, row
+                # Drain the unbuffered result so the connection can be reused
+                more = row is not None
+                while row is not None:
+                    row = await db_cursor.fetchone()
+
+        yield {"next_cursor": encode_cursor(last["created_at"], last["id"]) if more and last else None}
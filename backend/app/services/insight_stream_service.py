@@ -0,0 +1,174 @@
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from app.core.config import logger_settings
+logger = logger_settings.get_logger(__name__)
+from app.services.llm_usage_service import LlmCall
+
+class IncrementalJsonParser:
+    """
+    Parses a JSON object that arrives in arbitrary chunks (e.g. streamed model
+    tokens) and reports each top-level member as soon as its value is complete.
+    Text before the opening brace is ignored.
+    """
+    def __init__(self):
+        self._text = ""
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._key_start: Optional[int] = None
+        self._key: Optional[str] = None
+        self._value_start: Optional[int] = None
+        self.finished = False
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """
+        Consumes the next chunk.
+        Returns:
+            List[Tuple[str, Any]]: (key, value) members completed by this chunk.
+        """
+        completed: List[Tuple[str, Any]] = []
+        self._text += chunk
+        text = self._text
+        for index in range(self._position, len(text)):
+            if self.finished:
+                break
+            char = text[index]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._key_start is not None:
+                        self._key = json.loads(text[self._key_start:index + 1])
+                        self._key_start = None
+                continue
+
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1 and self._key is None:
+                    self._key_start = index
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == 1:
+                    if self._value_start is not None:
+                        completed.append(self._complete(text, index))
+                    self.finished = True
+                self._depth -= 1
+            elif self._depth == 1:
+                if char == ":" and self._key is not None and self._value_start is None:
+                    self._value_start = index + 1
+                elif char == "," and self._value_start is not None:
+                    completed.append(self._complete(text, index))
+
+        # Drop what was already parsed, keeping any member still in progress
+        keep = min(start for start in (self._key_start, self._value_start, len(text)) if start is not None)
+        self._text = text[keep:]
+        self._position = len(text) - keep
+        if self._key_start is not None:
+            self._key_start -= keep
+        if self._value_start is not None:
+            self._value_start -= keep
+        return completed
+
+    def _complete(self, text: str, end: int) -> Tuple[str, Any]:
+        member = (self._key, json.loads(text[self._value_start:end]))
+        self._key, self._value_start = None, None
+        return member
+
+    def close(self) -> None:
+        """
+        Raises JSONDecodeError (a ValueError) if the stream ended before the object was closed.
+        """
+        if not self.finished:
+            raise json.JSONDecodeError("JSON stream ended before the object was complete", "", 0)
+
+def sse_event(event: str, data: Any) -> str:
+    """
+    One Server-Sent Events frame with a JSON payload.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def bounded(stream: AsyncIterator[Any], idle_timeout: float, deadline: float) -> AsyncIterator[Any]:
+    """
+    Re-yields `stream`, raising asyncio.TimeoutError when no item arrives within
+    `idle_timeout` seconds or the event loop clock passes `deadline`.
+    """
+    loop = asyncio.get_running_loop()
+    iterator = stream.__aiter__()
+    while True:
+        timeout = min(idle_timeout, deadline - loop.time())
+        if timeout <= 0:
+            raise asyncio.TimeoutError()
+        try:
+            item = await asyncio.wait_for(iterator.__anext__(), timeout)
+        except StopAsyncIteration:
+            return
+        yield item
+
+class InsightStreamService:
+    """
+    Turns a streamed chat completion into insight sections.
+    """
+    @staticmethod
+    async def sections(stream: AsyncIterator[Any], call: Optional[LlmCall] = None) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Yields (section, value) pairs from a `chat.completions.create(stream=True)`
+        response as each top-level section of the JSON answer completes.
+        Token usage from the final chunk goes to `call`.
+        """
+        parser = IncrementalJsonParser()
+        async for chunk in stream:
+            if call is not None and getattr(chunk, "usage", None) is not None:
+                call.add_usage(chunk.usage)
+            if not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content
+            if not content:
+                continue
+            for name, value in parser.feed(content):
+                yield name, value
+        parser.close()
+
+    @staticmethod
+    async def generate(client: Any, model: str, kpis: Dict[str, Any], messages: List[Dict[str, str]],
+                       call: Optional[LlmCall] = None, idle_timeout: Optional[float] = None,
+                       deadline: Optional[float] = None, **options: Any) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Yields the locally computed KPI sections right away, then the sections of
+        the streamed model answer as each one completes. With `idle_timeout` and
+        `deadline` (event loop time), a stalled or overlong answer raises asyncio.TimeoutError.
+        """
+        for name, value in kpis.items():
+            yield name, value
+
+        if call is not None:
+            # Streamed answers only report usage when asked to, in a final chunk
+            options.setdefault("stream_options", {"include_usage": True})
+        bound = deadline is not None and idle_timeout is not None
+        opening = min(idle_timeout, deadline - asyncio.get_running_loop().time()) if bound else None
+        stream = await asyncio.wait_for(client.chat.completions.create(
+            model=model,
+            messages=messages,
+            response_format={"type": "json_object"},
+            stream=True,
+            **options
+        ), opening)
+        chunks = bounded(stream, idle_timeout, deadline) if bound else stream
+        # The summary fields sometimes come back without their wrapper object
+        loose: Dict[str, Any] = {}
+        try:
+            async for name, value in InsightStreamService.sections(chunks, call):
+                if name == "executive_summary":
+                    yield name, value
+                else:
+                    loose[name] = value
+        finally:
+            # Stops billing for the rest of the answer if the client went away
+            await stream.close()
+        if loose:
+            yield "executive_summary", loose
@@ -0,0 +1,368 @@
+import asyncio
+import heapq
+import json
+import random
+import time
+import uuid
+from collections import defaultdict, deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from fastapi import HTTPException
+from app.core.config import logger_settings
+logger = logger_settings.get_logger(__name__)
+from app.core.metrics import Metrics
+from app.services.redis_service import RedisService
+
+JOB_PREFIX = "caresim:jobs"
+# Job states; `succeeded` and `dead` are final
+QUEUED, RUNNING, RETRYING, SUCCEEDED, DEAD = "queued", "running", "retrying", "succeeded", "dead"
+FINAL_STATES = (SUCCEEDED, DEAD)
+DEAD_LETTER_LIMIT = 1000
+
+class MemoryJobBackend:
+    """
+    Job state held in this process; for single-node deployments and tests.
+    """
+    def __init__(self):
+        self._jobs: Dict[str, str] = {}
+        self._ready: deque = deque()
+        self._delayed: List[Any] = []
+        self._wakeup = asyncio.Event()
+        self._counters: Dict[str, int] = defaultdict(int)
+        self.dead_letters: deque = deque(maxlen=DEAD_LETTER_LIMIT)
+
+    async def save(self, job: Dict[str, Any]) -> None:
+        self._jobs[job["id"]] = json.dumps(job, default=str)
+
+    async def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raw = self._jobs.get(job_id)
+        return json.loads(raw) if raw else None
+
+    async def push(self, job_id: str, delay: float = 0) -> None:
+        if delay > 0:
+            heapq.heappush(self._delayed, (time.time() + delay, job_id))
+        else:
+            self._ready.append(job_id)
+        self._wakeup.set()
+
+    async def pop(self, timeout: float, worker: str) -> Optional[str]:
+        deadline = time.monotonic() + timeout
+        while True:
+            now = time.time()
+            while self._delayed and self._delayed[0][0] <= now:
+                self._ready.append(heapq.heappop(self._delayed)[1])
+            if self._ready:
+                return self._ready.popleft()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            if self._delayed:
+                remaining = min(remaining, self._delayed[0][0] - now)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    async def ack(self, job_id: str, worker: str) -> None:
+        # Jobs die with the process that holds them, so there is nothing to acknowledge
+        pass
+
+    async def heartbeat(self, worker: str) -> None:
+        pass
+
+    async def recover(self, stale_after: float) -> int:
+        return 0
+
+    async def retire(self, worker: str) -> None:
+        pass
+
+    async def dead_letter(self, job_id: str) -> None:
+        self.dead_letters.append(job_id)
+
+    async def increment(self, name: str, limit: int) -> bool:
+        if self._counters[name] >= limit:
+            return False
+        self._counters[name] += 1
+        return True
+
+    async def decrement(self, name: str) -> None:
+        self._counters[name] = max(self._counters[name] - 1, 0)
+
+class RedisJobBackend:
+    """
+    Job state in the shared Redis, so any process can serve status and run jobs.
+    A popped job moves atomically to its worker's processing list and leaves it
+    only when acknowledged. Workers record heartbeats; the processing lists of
+    workers that went silent (a crashed or killed process) are put back on the queue.
+    """
+    def __init__(self, client: Any):
+        self._client = client
+
+    async def save(self, job: Dict[str, Any]) -> None:
+        await self._client.set(
+            f"{JOB_PREFIX}:job:{job['id']}", json.dumps(job, default=str),
+            ex=int(logger_settings.JOB_TTL_HOURS * 3600)
+        )
+
+    async def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raw = await self._client.get(f"{JOB_PREFIX}:job:{job_id}")
+        return json.loads(raw) if raw else None
+
+    async def push(self, job_id: str, delay: float = 0) -> None:
+        if delay > 0:
+            await self._client.zadd(f"{JOB_PREFIX}:delayed", {job_id: time.time() + delay})
+        else:
+            await self._client.lpush(f"{JOB_PREFIX}:ready", job_id)
+
+    async def pop(self, timeout: float, worker: str) -> Optional[str]:
+        due = await self._client.zrangebyscore(f"{JOB_PREFIX}:delayed", 0, time.time(), start=0, num=100)
+        for job_id in due:
+            # Only the process whose ZREM succeeds moves the job
+            if await self._client.zrem(f"{JOB_PREFIX}:delayed", job_id):
+                await self._client.lpush(f"{JOB_PREFIX}:ready", job_id)
+        return await self._client.blmove(
+            f"{JOB_PREFIX}:ready", f"{JOB_PREFIX}:processing:{worker}", max(int(timeout), 1), src="RIGHT", dest="LEFT"
+        )
+
+    async def ack(self, job_id: str, worker: str) -> None:
+        await self._client.lrem(f"{JOB_PREFIX}:processing:{worker}", 1, job_id)
+
+    async def heartbeat(self, worker: str) -> None:
+        await self._client.zadd(f"{JOB_PREFIX}:workers", {worker: time.time()})
+
+    async def recover(self, stale_after: float) -> int:
+        """
+        Requeues, at the front, the jobs held by workers silent for `stale_after` seconds.
+        Returns:
+            int: number of jobs requeued.
+        """
+        requeued = 0
+        stale = await self._client.zrangebyscore(f"{JOB_PREFIX}:workers", 0, time.time() - stale_after)
+        for worker in stale:
+            # Only the process whose ZREM succeeds recovers the worker
+            if not await self._client.zrem(f"{JOB_PREFIX}:workers", worker):
+                continue
+            while await self._client.lmove(
+                f"{JOB_PREFIX}:processing:{worker}", f"{JOB_PREFIX}:ready", src="RIGHT", dest="RIGHT"
+            ) is not None:
+                requeued += 1
+        return requeued
+
+    async def retire(self, worker: str) -> None:
+        await self._client.zrem(f"{JOB_PREFIX}:workers", worker)
+
+    async def dead_letter(self, job_id: str) -> None:
+        await self._client.lpush(f"{JOB_PREFIX}:dead", job_id)
+        await self._client.ltrim(f"{JOB_PREFIX}:dead", 0, DEAD_LETTER_LIMIT - 1)
+
+    async def increment(self, name: str, limit: int) -> bool:
+        key = f"{JOB_PREFIX}:count:{name}"
+        value = await self._client.incr(key)
+        # Counters of a crashed process expire with the jobs instead of leaking forever
+        await self._client.expire(key, int(logger_settings.JOB_TTL_HOURS * 3600))
+        if value > limit:
+            await self._client.decr(key)
+            return False
+        return True
+
+    async def decrement(self, name: str) -> None:
+        key = f"{JOB_PREFIX}:count:{name}"
+        if await self._client.decr(key) < 0:
+            await self._client.set(key, 0)
+
+class JobService:
+    """
+    Background jobs (e.g. insight generation) run by a bounded pool of async workers.
+    `submit` returns a job id at once; clients poll `get` for the status and result.
+    Failed jobs are retried with exponential backoff and dead-lettered after
+    `JOB_MAX_ATTEMPTS`. Per user, at most `JOB_MAX_ACTIVE_PER_USER` jobs run at
+    once and `JOB_MAX_QUEUED_PER_USER` may be unfinished.
+    """
+    _backend: Optional[Any] = None
+    _workers: List[asyncio.Task] = []
+    # Names this process's workers, so their processing lists are told apart from other processes'
+    _instance: str = uuid.uuid4().hex
+    _handlers: Dict[str, Callable[[Dict[str, Any], str], Awaitable[Any]]] = {}
+
+    @staticmethod
+    def register(kind: str, handler: Callable[[Dict[str, Any], str], Awaitable[Any]]) -> None:
+        """
+        Registers the coroutine `handler(payload, user_email)` that runs jobs of `kind`.
+        """
+        JobService._handlers[kind] = handler
+
+    @staticmethod
+    def backend() -> Any:
+        if JobService._backend is None:
+            client = RedisService.client()
+            if logger_settings.JOB_BACKEND == "redis" and RedisService.is_shared():
+                JobService._backend = RedisJobBackend(client)
+            else:
+                if logger_settings.JOB_BACKEND == "redis":
+                    logger.warning("Redis is not available, keeping jobs in memory.")
+                JobService._backend = MemoryJobBackend()
+        return JobService._backend
+
+    @staticmethod
+    async def startup() -> None:
+        if JobService._workers:
+            return
+        backend = JobService.backend()
+        try:
+            requeued = await backend.recover(logger_settings.JOB_WORKER_STALE_SECONDS)
+            if requeued:
+                logger.warning(f"Requeued {requeued} job(s) left running by stopped workers.")
+        except Exception as e:
+            logger.error(f"Could not requeue jobs of stopped workers: {e}")
+        JobService._workers = [
+            asyncio.create_task(JobService._work(number)) for number in range(logger_settings.JOB_WORKERS)
+        ]
+        logger.info(f"Started {len(JobService._workers)} job worker(s).")
+
+    @staticmethod
+    async def shutdown() -> None:
+        """
+        Stops the workers. Jobs they were running are put back on the queue.
+        """
+        workers, JobService._workers = JobService._workers, []
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        JobService._backend = None
+
+    @staticmethod
+    async def submit(kind: str, user_email: str, payload: Dict[str, Any], delay: float = 0) -> Dict[str, Any]:
+        if kind not in JobService._handlers:
+            raise ValueError(f"No handler registered for job kind '{kind}'")
+        backend = JobService.backend()
+        if not await backend.increment(f"queued:{user_email}", logger_settings.JOB_MAX_QUEUED_PER_USER):
+            raise HTTPException(status_code=429, detail="Too many unfinished jobs. Try again later.")
+        now = time.time()
+        job = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "user_email": user_email,
+            "status": QUEUED,
+            "attempts": 0,
+            "payload": payload,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        await backend.save(job)
+        await backend.push(job["id"], delay)
+        Metrics.incr("jobs.submitted", kind=kind)
+        return job
+
+    @staticmethod
+    async def get(job_id: str) -> Optional[Dict[str, Any]]:
+        return await JobService.backend().load(job_id)
+
+    @staticmethod
+    def retry_delay(attempts: int) -> float:
+        """
+        Exponential backoff with full jitter before attempt `attempts + 1`.
+        """
+        ceiling = min(logger_settings.JOB_RETRY_BASE_DELAY * 2 ** (attempts - 1), logger_settings.JOB_RETRY_MAX_DELAY)
+        return random.uniform(ceiling / 2, ceiling)
+
+    @staticmethod
+    async def _work(number: int) -> None:
+        backend = JobService._backend
+        worker = f"{JobService._instance}:{number}"
+        recovered_at = time.monotonic()
+        try:
+            while True:
+                try:
+                    await backend.heartbeat(worker)
+                    if number == 0 and time.monotonic() - recovered_at >= logger_settings.JOB_WORKER_STALE_SECONDS:
+                        recovered_at = time.monotonic()
+                        await backend.recover(logger_settings.JOB_WORKER_STALE_SECONDS)
+                    job_id = await backend.pop(timeout=1.0, worker=worker)
+                    if job_id is not None:
+                        await JobService._process(backend, job_id, worker)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Job worker {number} error: {e}")
+                    await asyncio.sleep(1.0)
+        finally:
+            try:
+                await backend.retire(worker)
+            except Exception as e:
+                logger.warning(f"Job worker {number} could not retire: {e}")
+
+    @staticmethod
+    async def _process(backend: Any, job_id: str, worker: str) -> None:
+        """
+        Runs a popped job and acknowledges it. When shutdown or an unexpected error
+        interrupts it, the job is put back on the queue first, so it is not lost.
+        """
+        try:
+            await JobService._run(backend, job_id)
+        except asyncio.CancelledError:
+            # Shutting down: let another worker pick the job up
+            await backend.push(job_id)
+            await backend.ack(job_id, worker)
+            raise
+        except Exception:
+            await backend.push(job_id, delay=1.0)
+            await backend.ack(job_id, worker)
+            raise
+        await backend.ack(job_id, worker)
+
+    @staticmethod
+    async def _run(backend: Any, job_id: str) -> None:
+        job = await backend.load(job_id)
+        if job is None or job["status"] in FINAL_STATES:
+            return
+        user_email = job["user_email"]
+        if not await backend.increment(f"active:{user_email}", logger_settings.JOB_MAX_ACTIVE_PER_USER):
+            # The user already has enough jobs running; leave the worker to other users
+            await backend.push(job_id, delay=1.0)
+            return
+
+        try:
+            if job["attempts"] == 0:
+                Metrics.observe("jobs.wait_ms", (time.time() - job["created_at"]) * 1000, kind=job["kind"])
+            job.update(status=RUNNING, attempts=job["attempts"] + 1, updated_at=time.time())
+            await backend.save(job)
+            try:
+                job["result"] = await JobService._handlers[job["kind"]](job["payload"], user_email)
+            except asyncio.CancelledError:
+                # Shutting down: _process puts the job back for another worker
+                job.update(status=QUEUED, attempts=job["attempts"] - 1, updated_at=time.time())
+                await backend.save(job)
+                raise
+            except Exception as e:
+                await JobService._failed(backend, job, e)
+                return
+            job.update(status=SUCCEEDED, error=None, updated_at=time.time())
+            await backend.save(job)
+            await backend.decrement(f"queued:{user_email}")
+            Metrics.incr("jobs.succeeded", kind=job["kind"])
+            Metrics.observe("jobs.total_ms", (time.time() - job["created_at"]) * 1000, kind=job["kind"])
+        finally:
+            await backend.decrement(f"active:{user_email}")
+
+    @staticmethod
+    async def _failed(backend: Any, job: Dict[str, Any], error: Exception) -> None:
+        detail = error.detail if isinstance(error, HTTPException) else str(error)
+        # Client errors fail the same way every time
+        retryable = not (isinstance(error, HTTPException) and error.status_code < 500)
+        job.update(error=detail, updated_at=time.time())
+        if retryable and job["attempts"] < logger_settings.JOB_MAX_ATTEMPTS:
+            delay = JobService.retry_delay(job["attempts"])
+            job["status"] = RETRYING
+            await backend.save(job)
+            await backend.push(job["id"], delay=delay)
+            Metrics.incr("jobs.retried", kind=job["kind"])
+            logger.warning(f"Job {job['id']} failed (attempt {job['attempts']}), retrying in {delay:.1f}s: {detail}")
+            return
+        job["status"] = DEAD
+        await backend.save(job)
+        await backend.dead_letter(job["id"])
+        await backend.decrement(f"queued:{job['user_email']}")
+        Metrics.incr("jobs.dead", kind=job["kind"])
+        logger.error(f"Job {job['id']} dead-lettered after {job['attempts']} attempt(s): {detail}")
@@ -0,0 +1,166 @@
+import math
+from typing import Any, Dict, List, Tuple
+from app.core.config import logger_settings
+logger = logger_settings.get_logger(__name__)
+
+# DaycareInput list -> label used in calculations and reports
+EXPENSE_CATEGORIES = {
+    "employees": "Employees",
+    "facilities": "Facilities",
+    "administrative": "Administrative",
+    "supplies": "Supplies",
+}
+
+def money(value: float) -> str:
+    return f"${value:,.2f}"
+
+def total(items: List[Dict[str, Any]], field: str) -> float:
+    # fsum keeps long lists of cents exact
+    return math.fsum(float(item.get(field) or 0) for item in items)
+
+class KpiService:
+    """
+    Deterministic daycare KPIs computed from a DaycareInput payload
+    (`monthlyAmount` fields are monthly). Produces the numeric sections of an insight,
+    so the model only has to write the executive summary.
+    """
+    @staticmethod
+    def totals(data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Monthly revenue and expenses (overall and per category), enrollment and capacity.
+        """
+        expenses_by_category = {
+            label: total(data.get(key) or [], "monthlyAmount") for key, label in EXPENSE_CATEGORIES.items()
+        }
+        classrooms = data.get("classrooms") or []
+        return {
+            "revenue": total(data.get("revenueSources") or [], "monthlyAmount"),
+            "expenses": math.fsum(expenses_by_category.values()),
+            "expenses_by_category": expenses_by_category,
+            "students": int(total(classrooms, "avgStudents")),
+            "capacity": int(total(classrooms, "capacity")),
+        }
+
+    @staticmethod
+    def net_monthly_income(totals: Dict[str, Any]) -> Dict[str, Any]:
+        revenue, expenses = totals["revenue"], totals["expenses"]
+        net = revenue - expenses
+        if net > 0:
+            note = f"The center operates at a profit of {money(net)} per month."
+        elif net < 0:
+            note = f"The center operates at a loss of {money(-net)} per month; revenue must rise or expenses fall to break even."
+        else:
+            note = "The center exactly breaks even each month."
+        return {
+            "value": round(net, 2),
+            "currency": "USD",
+            "calculation": f"Total Revenue ({money(revenue)}) - Total Expenses ({money(expenses)})",
+            "note": note,
+        }
+
+    @staticmethod
+    def break_even_enrollment(totals: Dict[str, Any]) -> Dict[str, Any]:
+        revenue, expenses = totals["revenue"], totals["expenses"]
+        students, capacity = totals["students"], totals["capacity"]
+        if students <= 0 or revenue <= 0:
+            return {
+                "value": 0,
+                "unit": "students",
+                "calculation": "Total Fixed Costs / Average Revenue per Student (no revenue or enrolled students to divide by)",
+                "note": "Break-even enrollment cannot be computed until revenue and enrolled students are entered.",
+            }
+
+        revenue_per_student = revenue / students
+        # Every expense in the input is a monthly fixed cost
+        needed = math.ceil(round(expenses / revenue_per_student, 6))
+        if needed <= students:
+            note = f"Current enrollment of {students} covers expenses with {students - needed} student(s) to spare."
+        elif needed <= capacity:
+            note = f"The center needs {needed - students} more student(s) to break even, within its capacity of {capacity}."
+        else:
+            note = f"Breaking even needs {needed} students, more than the total capacity of {capacity}; pricing or costs must change."
+        return {
+            "value": needed,
+            "unit": "students",
+            "calculation": (
+                f"Total Fixed Costs ({money(expenses)}) / Average Revenue per Student "
+                f"({money(revenue)} / {students} = {money(revenue_per_student)}), rounded up"
+            ),
+            "note": note,
+        }
+
+    @staticmethod
+    def largest_expense(totals: Dict[str, Any]) -> Dict[str, Any]:
+        expenses = totals["expenses"]
+        category, amount = max(totals["expenses_by_category"].items(), key=lambda item: item[1])
+        share = amount / expenses * 100 if expenses > 0 else 0.0
+        return {
+            "category": category if expenses > 0 else "None",
+            "percentage_of_total_expenses": round(share, 1),
+            "calculation": f"({category} {money(amount)} / Total Expenses {money(expenses)}) * 100",
+        }
+
+    @staticmethod
+    def capacity_utilization(totals: Dict[str, Any]) -> Dict[str, Any]:
+        students, capacity = totals["students"], totals["capacity"]
+        utilization = students / capacity * 100 if capacity > 0 else 0.0
+        if capacity <= 0:
+            note = "No classroom capacity has been entered."
+        elif utilization > 100:
+            note = "Enrollment exceeds licensed capacity; review classroom limits."
+        elif utilization >= 85:
+            note = "Classrooms are close to full, a strong position for revenue."
+        elif utilization >= 60:
+            note = "Moderate utilization; there is room to grow enrollment."
+        else:
+            note = "Low utilization; filling open seats is the largest revenue lever."
+        return {
+            "value": round(utilization, 1),
+            "unit": "percent",
+            "calculation": f"(Total Enrolled Students {students} / Total Capacity {capacity}) * 100",
+            "note": note,
+        }
+
+    @staticmethod
+    def compute(data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        The four KPI sections of an insight document, in report order.
+        """
+        totals = KpiService.totals(data)
+        return {
+            "net_monthly_income": KpiService.net_monthly_income(totals),
+            "break_even_enrollment": KpiService.break_even_enrollment(totals),
+            "largest_expense": KpiService.largest_expense(totals),
+            "capacity_utilization": KpiService.capacity_utilization(totals),
+        }
+
+    @staticmethod
+    def portfolio(centers: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        Portfolio-level KPIs over several centers, given as (name, DaycareInput payload).
+        """
+        per_center = [(name, KpiService.totals(data)) for name, data in centers]
+        combined = {
+            "revenue": math.fsum(totals["revenue"] for _, totals in per_center),
+            "expenses": math.fsum(totals["expenses"] for _, totals in per_center),
+            "expenses_by_category": {
+                label: math.fsum(totals["expenses_by_category"][label] for _, totals in per_center)
+                for label in EXPENSE_CATEGORIES.values()
+            },
+            "students": sum(totals["students"] for _, totals in per_center),
+            "capacity": sum(totals["capacity"] for _, totals in per_center),
+        }
+        ranked = sorted(
+            ({"name": name, "net_monthly_income": round(totals["revenue"] - totals["expenses"], 2)} for name, totals in per_center),
+            key=lambda center: center["net_monthly_income"], reverse=True
+        )
+        return {
+            "centers": len(per_center),
+            "profitable_centers": sum(1 for center in ranked if center["net_monthly_income"] > 0),
+            "unprofitable_centers": sum(1 for center in ranked if center["net_monthly_income"] < 0),
+            "net_monthly_income": KpiService.net_monthly_income(combined),
+            "largest_expense": KpiService.largest_expense(combined),
+            "capacity_utilization": KpiService.capacity_utilization(combined),
+            "top_centers": ranked[:3],
+            "bottom_centers": ranked[::-1][:3],
+        }
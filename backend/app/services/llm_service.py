@@ -0,0 +1,305 @@
+import asyncio
+import random
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import httpx
+import openai
+from aiolimiter import AsyncLimiter
+from app.core.config import logger_settings
+logger = logger_settings.get_logger(__name__)
+from app.core.circuit_breaker import CircuitBreaker
+from app.core.metrics import Metrics
+from app.prompts.tokens import count_message_tokens
+from app.services.llm_usage_service import LlmCall, LlmUsageService
+from app.services.model_router_service import ModelRouter
+
+class LlmQueueTimeoutError(Exception):
+    """Raised when a call waited too long for a turn under this process's own limits."""
+    def __init__(self, waited: float):
+        super().__init__(f"No LLM capacity freed up within {waited:.0f}s")
+        self.waited = waited
+
+def estimate_tokens(messages: List[Dict[str, str]], max_tokens: int) -> int:
+    """
+    Token cost of a chat call (prompt plus the completion budget), used to
+    charge the tokens-per-minute limit up front.
+    """
+    return count_message_tokens(messages) + max_tokens
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """
+    Errors that say the upstream is unhealthy (they open the circuit).
+    """
+    return isinstance(error, (asyncio.TimeoutError, openai.APITimeoutError, openai.APIConnectionError,
+                              openai.InternalServerError))
+
+def is_transient(error: BaseException) -> bool:
+    return is_upstream_failure(error) or isinstance(error, openai.RateLimitError)
+
+def retry_delay(attempt: int, error: BaseException) -> float:
+    """
+    Seconds before retrying: the server's `retry-after` when it sent one,
+    otherwise exponential backoff with full jitter.
+    """
+    response = getattr(error, "response", None)
+    if response is not None:
+        if response.headers.get("retry-after-ms"):
+            return float(response.headers["retry-after-ms"]) / 1000
+        if (response.headers.get("retry-after") or "").isdigit():
+            return float(response.headers["retry-after"])
+    cap = min(logger_settings.LLM_RETRY_MAX_DELAY, logger_settings.LLM_RETRY_BASE_DELAY * 2 ** (attempt - 1))
+    return random.uniform(0, cap)
+
+class LlmService:
+    """
+    App-wide OpenAI client on a pooled httpx connection, created at startup.
+    Calls queue in FIFO order behind requests-per-minute and tokens-per-minute
+    limits, and at most `LLM_MAX_CONCURRENCY` run at once. `chat` bounds each
+    call by a deadline, hedges slow attempts and fails fast while the upstream's
+    circuit is open. Only time spent at the upstream counts against an attempt
+    and the model's health; the queue wait is bounded on its own.
+    """
+    _client: Optional[openai.AsyncOpenAI] = None
+    _admission: Optional[asyncio.Lock] = None
+    _slots: Optional[asyncio.Semaphore] = None
+    _request_limiter: Optional[AsyncLimiter] = None
+    _token_limiter: Optional[AsyncLimiter] = None
+    _waiting: int = 0
+    _in_flight: int = 0
+    _breakers: Dict[str, CircuitBreaker] = {}
+
+    @staticmethod
+    def startup() -> openai.AsyncOpenAI:
+        if LlmService._client is not None:
+            return LlmService._client
+        base_url = logger_settings.LLM_BASE_URL or None
+        transport = None
+        if logger_settings.LLM_FAKE:
+            from utils.loadtest.fake_openai import create_fake_openai_app
+            transport = httpx.ASGITransport(app=create_fake_openai_app())
+            base_url = "http://fake-openai/v1"
+            logger.warning("LLM calls are answered by the fake OpenAI server.")
+        http_client = httpx.AsyncClient(
+            transport=transport,
+            limits=httpx.Limits(
+                max_connections=logger_settings.LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=logger_settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=logger_settings.LLM_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(logger_settings.LLM_TIMEOUT, connect=10.0),
+        )
+        LlmService._client = openai.AsyncOpenAI(
+            api_key=logger_settings.OPENAI_API_KEY,
+            base_url=base_url,
+            max_retries=logger_settings.LLM_MAX_RETRIES,
+            http_client=http_client,
+        )
+        LlmService._admission = asyncio.Lock()
+        LlmService._slots = asyncio.Semaphore(logger_settings.LLM_MAX_CONCURRENCY)
+        LlmService._request_limiter = AsyncLimiter(logger_settings.LLM_REQUESTS_PER_MINUTE, 60)
+        LlmService._token_limiter = AsyncLimiter(logger_settings.LLM_TOKENS_PER_MINUTE, 60)
+        logger.info("OpenAI client started.")
+        return LlmService._client
+
+    @staticmethod
+    async def shutdown() -> None:
+        client, LlmService._client = LlmService._client, None
+        # Locks and limiters belong to the event loop they were used on
+        LlmService._admission = LlmService._slots = None
+        LlmService._request_limiter = LlmService._token_limiter = None
+        LlmService._breakers = {}
+        if client is not None:
+            # Also closes the pooled httpx client
+            await client.close()
+            logger.info("OpenAI client closed.")
+
+    @staticmethod
+    def breaker(model: str) -> CircuitBreaker:
+        """
+        The model's circuit, so one unhealthy model does not block failing over to another.
+        """
+        breaker = LlmService._breakers.get(model)
+        if breaker is None:
+            breaker = LlmService._breakers[model] = CircuitBreaker(
+                model,
+                failure_rate=logger_settings.LLM_BREAKER_FAILURE_RATE,
+                min_calls=logger_settings.LLM_BREAKER_MIN_CALLS,
+                window=logger_settings.LLM_BREAKER_WINDOW,
+                cooldown=logger_settings.LLM_BREAKER_COOLDOWN,
+            )
+        return breaker
+
+    @staticmethod
+    def hedge_after(model: str) -> Optional[float]:
+        """
+        Seconds after which a second attempt is started: `LLM_HEDGE_AFTER_MS`, or the
+        p95 of recent successful calls once there are enough of them.
+        """
+        if not logger_settings.LLM_HEDGE_ENABLED:
+            return None
+        threshold = logger_settings.LLM_HEDGE_AFTER_MS
+        if not threshold:
+            histogram = Metrics.histogram("llm.latency_ms", model=model)
+            if histogram is None or histogram.count < logger_settings.LLM_HEDGE_MIN_SAMPLES:
+                return None
+            threshold = histogram.percentile(95)
+        return max(threshold, logger_settings.LLM_HEDGE_MIN_MS) / 1000
+
+    @staticmethod
+    def client() -> openai.AsyncOpenAI:
+        # Scripts and tests that skip the startup hook get one on first use
+        return LlmService._client or LlmService.startup()
+
+    @staticmethod
+    @asynccontextmanager
+    async def admit(messages: List[Dict[str, str]], max_tokens: int) -> AsyncIterator[float]:
+        """
+        Waits for a turn under the rate limits and a free concurrency slot,
+        which is held until the block exits. Yields the wait in milliseconds.
+        """
+        LlmService.client()
+        tokens = min(estimate_tokens(messages, max_tokens), LlmService._token_limiter.max_rate)
+        LlmService._waiting += 1
+        Metrics.set_gauge("llm.queue_depth", LlmService._waiting)
+        started = time.monotonic()
+        try:
+            # One caller at a time draws from the limiters, so large calls are not starved by small ones
+            async with LlmService._admission:
+                await LlmService._request_limiter.acquire()
+                await LlmService._token_limiter.acquire(tokens)
+            await LlmService._slots.acquire()
+        finally:
+            LlmService._waiting -= 1
+            Metrics.set_gauge("llm.queue_depth", LlmService._waiting)
+        waited_ms = (time.monotonic() - started) * 1000
+        Metrics.observe("llm.wait_ms", waited_ms)
+        LlmService._in_flight += 1
+        Metrics.set_gauge("llm.in_flight", LlmService._in_flight)
+        try:
+            yield waited_ms
+        finally:
+            LlmService._in_flight -= 1
+            Metrics.set_gauge("llm.in_flight", LlmService._in_flight)
+            LlmService._slots.release()
+
+    @staticmethod
+    @asynccontextmanager
+    async def admitted(messages: List[Dict[str, str]], max_tokens: int, timeout: float) -> AsyncIterator[float]:
+        """
+        `admit`, giving up with LlmQueueTimeoutError after `timeout` seconds
+        (at most `LLM_QUEUE_TIMEOUT`). Yields the wait in milliseconds.
+        """
+        timeout = max(min(timeout, logger_settings.LLM_QUEUE_TIMEOUT), 0)
+        async with AsyncExitStack() as stack:
+            try:
+                waited_ms = await asyncio.wait_for(stack.enter_async_context(LlmService.admit(messages, max_tokens)), timeout)
+            except asyncio.TimeoutError:
+                Metrics.incr("llm.queue_timeouts")
+                raise LlmQueueTimeoutError(timeout) from None
+            yield waited_ms
+
+    @staticmethod
+    async def _attempt(messages: List[Dict[str, str]], model: str, max_tokens: int,
+                       options: Dict[str, Any]) -> Tuple[Any, float]:
+        """
+        One `chat.completions.create`; the caller holds a turn under the limits.
+        Returns:
+            Tuple[Any, float]: the response and the network time in ms.
+        """
+        started = time.monotonic()
+        response = await LlmService.client().chat.completions.create(
+            model=model, messages=messages, max_tokens=max_tokens, **options
+        )
+        return response, (time.monotonic() - started) * 1000
+
+    @staticmethod
+    async def _hedge(messages: List[Dict[str, str]], model: str, max_tokens: int,
+                     options: Dict[str, Any]) -> Tuple[Any, float]:
+        async with LlmService.admit(messages, max_tokens):
+            return await LlmService._attempt(messages, model, max_tokens, options)
+
+    @staticmethod
+    async def _hedged(messages: List[Dict[str, str]], model: str, max_tokens: int,
+                      options: Dict[str, Any]) -> Tuple[Any, float]:
+        """
+        An attempt, plus a second one (with its own turn under the limits) if the
+        first is slower than `hedge_after`; the first to succeed wins and the other
+        is cancelled.
+        """
+        primary = asyncio.ensure_future(LlmService._attempt(messages, model, max_tokens, options))
+        tasks = {primary}
+        try:
+            threshold = LlmService.hedge_after(model)
+            if threshold is not None:
+                done, _ = await asyncio.wait(tasks, timeout=threshold)
+                # Hedging only adds load when calls are already queueing
+                if not done and LlmService._waiting == 0:
+                    Metrics.incr("llm.hedged", model=model)
+                    hedge = asyncio.ensure_future(LlmService._hedge(messages, model, max_tokens, options))
+                    tasks.add(hedge)
+            error: Optional[BaseException] = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            Metrics.incr("llm.hedge_won", model=model)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    async def chat(messages: List[Dict[str, str]], model: str, max_tokens: int, call: Optional[LlmCall] = None,
+                   user_email: Optional[str] = None, **options: Any) -> Any:
+        """
+        `chat.completions.create` through the shared client and limits, within
+        `LLM_DEADLINE`. Timeouts, connection errors, 5xx and 429 are retried up to
+        `LLM_MAX_ATTEMPTS` times. The queue wait, network time and token usage go
+        to `call`, or to a call recorded here when none is given.
+        Raises CircuitOpenError while the model's circuit is open, and
+        LlmQueueTimeoutError when no turn under the limits frees up in time.
+        """
+        if call is None:
+            async with LlmUsageService.track(model, "chat", user_email) as call:
+                return await LlmService.chat(messages, model, max_tokens, call=call, **options)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + logger_settings.LLM_DEADLINE
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = deadline - loop.time()
+            breaker = LlmService.breaker(model)
+            # Fail fast on an open circuit instead of queueing for it
+            breaker.check()
+            try:
+                # Queueing behind our own limits says nothing about the upstream, so it is
+                # outside the breaker and the attempt timeout
+                async with LlmService.admitted(messages, max_tokens, remaining) as waited_ms:
+                    call.wait_ms += waited_ms
+                    async with breaker.guard(is_upstream_failure):
+                        response, network_ms = await asyncio.wait_for(
+                            LlmService._hedged(messages, model, max_tokens, options),
+                            min(deadline - loop.time(), logger_settings.LLM_ATTEMPT_TIMEOUT)
+                        )
+            except LlmQueueTimeoutError:
+                raise
+            except Exception as e:
+                if is_upstream_failure(e):
+                    ModelRouter.observe(model, ok=False)
+                delay = retry_delay(attempt, e)
+                if not is_transient(e) or attempt >= logger_settings.LLM_MAX_ATTEMPTS or loop.time() + delay >= deadline:
+                    raise
+                logger.warning(f"LLM call to {model} failed (attempt {attempt}), retrying in {delay:.1f}s: {e!r}")
+                Metrics.incr("llm.retries", model=model)
+                await asyncio.sleep(delay)
+                continue
+            ModelRouter.observe(model, ok=True, latency_ms=network_ms)
+            call.network_ms += network_ms
+            call.add_usage(getattr(response, "usage", None))
+            return response
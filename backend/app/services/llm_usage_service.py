@@ -0,0 +1,207 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import aiomysql
+import httpx
+import openai
+from app.core.config import logger_settings
+logger = logger_settings.get_logger(__name__)
+from app.core.circuit_breaker import CircuitOpenError
+from app.core.metrics import Metrics
+from app.services.auth_service import AuthDatabaseService
+
+# USD per million tokens: (prompt, cached prompt, completion). Dated snapshots
+# such as `gpt-4o-2024-08-06` are priced by their longest matching prefix.
+MODEL_PRICES: Dict[str, Tuple[float, float, float]] = {
+    "gpt-4-turbo": (10.0, 10.0, 30.0),
+    "gpt-4o-mini": (0.15, 0.075, 0.6),
+    "gpt-4o": (2.5, 1.25, 10.0),
+    "gpt-4": (30.0, 30.0, 60.0),
+    "gpt-3.5-turbo": (0.5, 0.5, 1.5),
+}
+
+def model_price(model: str) -> Optional[Tuple[float, float, float]]:
+    matches = [prefix for prefix in MODEL_PRICES if model == prefix or model.startswith(f"{prefix}-")]
+    return MODEL_PRICES[max(matches, key=len)] if matches else None
+
+def estimate_cost(model: str, prompt_tokens: int, cached_tokens: int, completion_tokens: int) -> float:
+    """
+    Estimated USD cost of a call from its token counts; 0 for unpriced models.
+    """
+    price = model_price(model)
+    if price is None:
+        return 0.0
+    prompt, cached, completion = price
+    return ((prompt_tokens - cached_tokens) * prompt + cached_tokens * cached + completion_tokens * completion) / 1_000_000
+
+def cached_tokens(usage: Any) -> int:
+    # `prompt_tokens_details` is newer than the installed client's usage model
+    details = getattr(usage, "prompt_tokens_details", None)
+    if isinstance(details, dict):
+        return int(details.get("cached_tokens") or 0)
+    return int(getattr(details, "cached_tokens", 0) or 0)
+
+def outcome_of(error: BaseException) -> str:
+    if isinstance(error, json.JSONDecodeError):
+        return "json_error"
+    if isinstance(error, (asyncio.TimeoutError, openai.APITimeoutError, httpx.TimeoutException)):
+        return "timeout"
+    if isinstance(error, CircuitOpenError):
+        return "circuit_open"
+    if isinstance(error, openai.RateLimitError):
+        return "rate_limited"
+    if isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+        return "cancelled"
+    return "error"
+
+class LlmCall:
+    """
+    Measurements of one model call, filled in while it runs.
+    """
+    def __init__(self, model: str, operation: str, user_email: Optional[str] = None):
+        self.model = model
+        self.operation = operation
+        self.user_email = user_email
+        self.created_at = datetime.now(timezone.utc)
+        self.outcome = "success"
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.wait_ms = 0.0
+        self.network_ms = 0.0
+
+    def add_usage(self, usage: Any) -> None:
+        if usage is None:
+            return
+        self.prompt_tokens += usage.prompt_tokens or 0
+        self.completion_tokens += usage.completion_tokens or 0
+        self.cached_tokens += cached_tokens(usage)
+
+    @property
+    def cost(self) -> float:
+        return estimate_cost(self.model, self.prompt_tokens, self.cached_tokens, self.completion_tokens)
+
+class LlmUsageService:
+    """
+    Per-call LLM instrumentation: metrics right away, plus a compact row in
+    `llm_calls` written in batches by a background flusher.
+    """
+    _buffer: List[Tuple[Any, ...]] = []
+    _flusher: Optional[asyncio.Task] = None
+
+    @staticmethod
+    async def startup() -> None:
+        if not logger_settings.LLM_USAGE_ENABLED or LlmUsageService._flusher is not None:
+            return
+        LlmUsageService._flusher = asyncio.create_task(LlmUsageService._run())
+        logger.info("LLM usage recorder started.")
+
+    @staticmethod
+    async def shutdown() -> None:
+        flusher, LlmUsageService._flusher = LlmUsageService._flusher, None
+        if flusher is None:
+            return
+        flusher.cancel()
+        try:
+            await flusher
+        except asyncio.CancelledError:
+            pass
+        await LlmUsageService.flush()
+
+    @staticmethod
+    @asynccontextmanager
+    async def track(model: str, operation: str, user_email: Optional[str] = None) -> AsyncIterator[LlmCall]:
+        """
+        Records the call made inside the block; an exception escaping it sets the outcome.
+        """
+        call = LlmCall(model, operation, user_email)
+        try:
+            yield call
+        except BaseException as e:
+            call.outcome = outcome_of(e)
+            raise
+        finally:
+            LlmUsageService.record(call)
+
+    @staticmethod
+    def record(call: LlmCall) -> None:
+        cost = call.cost
+        Metrics.incr("llm.calls", model=call.model, operation=call.operation, outcome=call.outcome)
+        Metrics.incr("llm.tokens", call.prompt_tokens, model=call.model, kind="prompt")
+        Metrics.incr("llm.tokens", call.completion_tokens, model=call.model, kind="completion")
+        Metrics.incr("llm.tokens", call.cached_tokens, model=call.model, kind="cached")
+        Metrics.incr("llm.cost_usd", cost, model=call.model)
+        if call.outcome == "success":
+            # Successful calls only: this is the distribution hedging thresholds come from
+            Metrics.observe("llm.latency_ms", call.network_ms, model=call.model)
+        logger.info(
+            f"LLM call {call.operation} ({call.model}) for {call.user_email}: {call.outcome}, "
+            f"{call.prompt_tokens}+{call.completion_tokens} tokens ({call.cached_tokens} cached), "
+            f"wait {call.wait_ms:.0f} ms, network {call.network_ms:.0f} ms, ${cost:.5f}"
+        )
+        if LlmUsageService._flusher is None:
+            return
+        if len(LlmUsageService._buffer) >= logger_settings.LLM_USAGE_MAX_BUFFER:
+            Metrics.incr("llm.usage_dropped")
+            return
+        LlmUsageService._buffer.append((
+            call.created_at.replace(tzinfo=None), call.user_email, call.model[:64], call.operation, call.outcome,
+            call.prompt_tokens, call.completion_tokens, call.cached_tokens,
+            round(call.wait_ms), round(call.network_ms), round(cost, 6),
+        ))
+
+    @staticmethod
+    async def _run() -> None:
+        while True:
+            await asyncio.sleep(logger_settings.LLM_USAGE_FLUSH_INTERVAL)
+            await LlmUsageService.flush()
+
+    @staticmethod
+    async def flush() -> int:
+        rows, LlmUsageService._buffer = LlmUsageService._buffer, []
+        if not rows:
+            return 0
+        try:
+            async with AuthDatabaseService.acquire() as connection:
+                async with connection.cursor() as cursor:
+                    await cursor.executemany(
+                        """
+                        INSERT INTO llm_calls (created_at, user_email, model, operation, outcome,
+                            prompt_tokens, completion_tokens, cached_tokens, wait_ms, network_ms, cost_usd)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                        """,
+                        rows
+                    )
+                await connection.commit()
+        except Exception as e:
+            # Usage rows are best effort; losing a batch must not affect requests
+            Metrics.incr("llm.usage_dropped", len(rows))
+            logger.warning(f"Writing {len(rows)} LLM usage row(s) failed: {e}")
+            return 0
+        return len(rows)
+
+    @staticmethod
+    async def daily(days: int = 30, user_email: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Calls, tokens, latency and cost per UTC day, user and model over the last `days` days.
+        """
+        query = """
+            SELECT DATE(created_at) AS day, user_email, model,
+                COUNT(*) AS calls, SUM(outcome <> 'success') AS failures,
+                SUM(prompt_tokens) AS prompt_tokens, SUM(completion_tokens) AS completion_tokens,
+                SUM(cached_tokens) AS cached_tokens, AVG(wait_ms) AS avg_wait_ms,
+                AVG(network_ms) AS avg_network_ms, SUM(cost_usd) AS cost_usd
+            FROM llm_calls
+            WHERE created_at >= UTC_TIMESTAMP() - INTERVAL %s DAY
+        """
+        params: List[Any] = [days]
+        if user_email is not None:
+            query += " AND user_email = %s"
+            params.append(user_email)
+        query += " GROUP BY day, user_email, model ORDER BY day DESC, cost_usd DESC"
+        async with AuthDatabaseService.acquire() as connection:
+            async with connection.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(query, params)
+                return list(await cursor.fetchall())
@@ -0,0 +1,107 @@
+import hashlib
+from typing import Dict
+import aiomysql
+from pymysql.err import OperationalError, InternalError
+from app.core.config import logger_settings
+logger = logger_settings.get_logger(__name__)
+from app.services.auth_service import AuthDatabaseService
+from app.sql.main import SqlQuery
+
+# Errors meaning the change a statement makes is already in place
+# (table exists, duplicate column, duplicate key name, can't drop missing key/column).
+# Tolerating them keeps every migration safe to re-run after a partial failure.
+IDEMPOTENT_ERROR_CODES = {1050, 1060, 1061, 1091}
+
+MIGRATION_LOCK_NAME = "care_sim_schema_migrations"
+
+class MigrationService:
+    @staticmethod
+    async def ensure_schema_version_table(connection: aiomysql.Connection) -> None:
+        """
+        Creates the `schema_version` bookkeeping table if it doesn't exist.
+        """
+        async with connection.cursor() as cursor:
+            await cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INT PRIMARY KEY,
+                    name VARCHAR(255) NOT NULL,
+                    checksum CHAR(64) NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+                """
+            )
+        await connection.commit()
+
+    @staticmethod
+    async def applied_versions(connection: aiomysql.Connection) -> Dict[int, str]:
+        """
+        Returns:
+            Dict[int, str]: checksum of every applied migration keyed by version.
+        """
+        async with connection.cursor() as cursor:
+            await cursor.execute("SELECT version, checksum FROM schema_version")
+            rows = await cursor.fetchall()
+        await connection.commit()
+        return {version: checksum for version, checksum in rows}
+
+    @staticmethod
+    async def apply_migration(connection: aiomysql.Connection, version: int, sql_name: str, sql_text: str) -> None:
+        """
+        Runs every statement of one migration and records it in `schema_version`.
+        """
+        async with connection.cursor() as cursor:
+            for statement in SqlQuery.split_statements(sql_text):
+                try:
+                    await cursor.execute(statement)
+                except (OperationalError, InternalError) as e:
+                    if e.args and e.args[0] in IDEMPOTENT_ERROR_CODES:
+                        logger.warning(f"Migration {sql_name}: already applied ({e.args[1]}), skipping statement.")
+                        continue
+                    raise
+            await cursor.execute(
+                "INSERT INTO schema_version (version, name, checksum) VALUES (%s, %s, %s)",
+                (version, sql_name, hashlib.sha256(sql_text.encode("utf-8")).hexdigest())
+            )
+        await connection.commit()
+
+    @staticmethod
+    async def run_migrations() -> int:
+        """
+        Applies all pending migrations in version order.
+        A MySQL named lock serializes concurrent app workers booting at the same time.
+        Returns:
+            int: number of migrations applied.
+        """
+        applied_count = 0
+        async with AuthDatabaseService.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK_NAME, 60))
+                (locked,) = await cursor.fetchone()
+            if locked != 1:
+                raise RuntimeError("Could not acquire the schema migration lock.")
+
+            try:
+                await MigrationService.ensure_schema_version_table(connection)
+                applied = await MigrationService.applied_versions(connection)
+
+                for version, sql_name in SqlQuery.list_migrations():
+                    sql_text = await SqlQuery.read_sql(sql_name)
+                    if version in applied:
+                        checksum = hashlib.sha256(sql_text.encode("utf-8")).hexdigest()
+                        if checksum != applied[version]:
+                            logger.warning(f"Migration {sql_name} changed after it was applied.")
+                        continue
+                    if not sql_text:
+                        raise RuntimeError(f"Migration {sql_name} is empty or unreadable.")
+
+                    logger.info(f"Applying migration {sql_name}...")
+                    await MigrationService.apply_migration(connection, version, sql_name, sql_text)
+                    applied_count += 1
+            finally:
+                async with connection.cursor() as cursor:
+                    await cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK_NAME,))
+                await connection.commit()
+
+        logger.info(f"Schema is up to date ({applied_count} migration(s) applied).")
+        return applied_count
@@ -0,0 +1,145 @@
+import json
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from app.core.config import logger_settings
+logger = logger_settings.get_logger(__name__)
+from app.core.metrics import Metrics
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))]
+
+class ModelStats:
+    """
+    Outcomes and latencies of one model's calls over the last `LLM_ROUTER_WINDOW` seconds.
+    """
+    def __init__(self):
+        self.calls: Deque[Tuple[float, bool, Optional[float]]] = deque()
+
+    def observe(self, ok: bool, latency_ms: Optional[float] = None) -> None:
+        self.calls.append((time.monotonic(), ok, latency_ms))
+        self._trim()
+
+    def _trim(self) -> None:
+        cutoff = time.monotonic() - logger_settings.LLM_ROUTER_WINDOW
+        while self.calls and self.calls[0][0] < cutoff:
+            self.calls.popleft()
+
+    def snapshot(self) -> Dict[str, Any]:
+        self._trim()
+        latencies = [latency for _, ok, latency in self.calls if ok and latency is not None]
+        failures = sum(1 for _, ok, _ in self.calls if not ok)
+        return {
+            "samples": len(self.calls),
+            "error_rate": round(failures / len(self.calls), 3) if self.calls else 0.0,
+            "p50_ms": round(percentile(latencies, 50), 1),
+            "p95_ms": round(percentile(latencies, 95), 1),
+            "p99_ms": round(percentile(latencies, 99), 1),
+        }
+
+class ModelRouter:
+    """
+    Picks the model order for an insight call: `MODEL` first, then
+    `LLM_FALLBACK_MODELS` and `LLM_SMALL_MODEL`; small prompts of standard-tier
+    users try `LLM_SMALL_MODEL` first. Models whose circuit is open or whose rolling error
+    rate is too high are skipped, and models over the `LLM_LATENCY_SLO_MS` p95
+    go last. Callers fail over along the returned order.
+    """
+    _stats: Dict[str, ModelStats] = {}
+
+    @staticmethod
+    def models() -> List[str]:
+        ordered = [logger_settings.MODEL, *logger_settings.LLM_FALLBACK_MODELS, logger_settings.LLM_SMALL_MODEL]
+        return list(dict.fromkeys(model for model in ordered if model))
+
+    @staticmethod
+    def tier(user_email: Optional[str]) -> str:
+        return "premium" if user_email and user_email in logger_settings.LLM_PREMIUM_USERS else "standard"
+
+    @staticmethod
+    def observe(model: str, ok: bool, latency_ms: Optional[float] = None) -> None:
+        ModelRouter._stats.setdefault(model, ModelStats()).observe(ok, latency_ms)
+
+    @staticmethod
+    def stats() -> Dict[str, Dict[str, Any]]:
+        """
+        Rolling latency percentiles, error rate and circuit state per model (exported on `/metrics`).
+        """
+        from app.services.llm_service import LlmService
+
+        return {
+            model: {
+                **ModelRouter._stats.get(model, ModelStats()).snapshot(),
+                "circuit": LlmService.breaker(model).state,
+            }
+            for model in dict.fromkeys([*ModelRouter.models(), *ModelRouter._stats])
+        }
+
+    @staticmethod
+    def preferred(prompt_tokens: int, user_email: Optional[str] = None) -> List[str]:
+        """
+        The model order for a prompt and user before health is taken into account.
+        """
+        preferred = ModelRouter.models()
+        small = logger_settings.LLM_SMALL_MODEL
+        if small and ModelRouter.tier(user_email) != "premium" and prompt_tokens <= logger_settings.LLM_SMALL_PROMPT_TOKENS:
+            preferred = [small, *(model for model in preferred if model != small)]
+        return preferred
+
+    @staticmethod
+    def cacheable(prompt_tokens: int, user_email: Optional[str] = None) -> List[str]:
+        """
+        Models whose cached answer may be served for a prompt and user: the preferred
+        order up to `MODEL`. A small model's answer is never served to premium users
+        or for large prompts, and a failover model's answer is not served at all.
+        """
+        preferred = ModelRouter.preferred(prompt_tokens, user_email)
+        if logger_settings.MODEL not in preferred:
+            return preferred[:1]
+        return preferred[:preferred.index(logger_settings.MODEL) + 1]
+
+    @staticmethod
+    def route(prompt_tokens: int, user_email: Optional[str] = None, operation: str = "insight") -> List[str]:
+        """
+        Models to try, in order. Never empty: when every model is unhealthy the
+        preferred order is kept and the circuits decide.
+        """
+        tier = ModelRouter.tier(user_email)
+        preferred = ModelRouter.preferred(prompt_tokens, user_email)
+
+        stats = ModelRouter.stats()
+        healthy, slow, skipped = [], [], {}
+        for model in preferred:
+            model_stats = stats.get(model, {})
+            trusted = model_stats.get("samples", 0) >= logger_settings.LLM_ROUTER_MIN_SAMPLES
+            if model_stats.get("circuit") == "open":
+                skipped[model] = "circuit_open"
+            elif trusted and model_stats["error_rate"] >= logger_settings.LLM_ROUTER_MAX_ERROR_RATE:
+                skipped[model] = "error_rate"
+            elif trusted and model_stats["p95_ms"] > logger_settings.LLM_LATENCY_SLO_MS:
+                slow.append(model)
+            else:
+                healthy.append(model)
+        order = healthy + slow or preferred
+
+        Metrics.incr("llm.routed", model=order[0], tier=tier)
+        # One JSON line per decision, for offline analysis
+        logger.info("model_route " + json.dumps({
+            "operation": operation,
+            "user_email": user_email,
+            "tier": tier,
+            "prompt_tokens": prompt_tokens,
+            "chosen": order[0],
+            "order": order,
+            "slow": slow,
+            "skipped": skipped,
+            "stats": {model: stats[model] for model in preferred if model in stats},
+        }, separators=(",", ":")))
+        return order
+
+    @staticmethod
+    def reset() -> None:
+        ModelRouter._stats.clear()
@@ -0,0 +1,154 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.core.config import logger_settings
+logger = logger_settings.get_logger(__name__)
+from app.core.metrics import Metrics
+from app.prompts.registry import PromptRegistry
+from app.prompts.tokens import compact_json, count_message_tokens
+from app.services.kpi_service import EXPENSE_CATEGORIES
+
+INSIGHT_PROMPT = "core/insight_core"
+SECTIONS_PROMPT = "core/insight_sections"
+INSIGHT_SYSTEM_MESSAGE = "You are a financial analyst specializing in daycare center operations."
+# Line items kept per list, from full detail down to category totals only
+DETAIL_LEVELS: List[Optional[int]] = [None, 25, 10, 5, 2, 0]
+# Prompt sections (as returned by `InsightPromptService.sections`) and their headings, in prompt order
+PROMPT_PARTS = {
+    "totals": "MONTHLY TOTALS",
+    "kpis": "KEY METRICS",
+    "revenue_sources": "REVENUE SOURCES [name, amount], largest first",
+    "expenses": "EXPENSES BY CATEGORY [name, amount], largest first",
+    "classrooms": "CLASSROOMS [name, capacity, enrolled, staff ratio]",
+    "operating": "OPERATING DETAILS",
+    "goals": "BUSINESS GOALS [goal, target %]",
+}
+# Prompt sections each executive summary section is written from
+SECTION_PARTS = {
+    "financial_overview": ["totals", "kpis", "revenue_sources", "expenses"],
+    "profitability_status": ["totals", "kpis"],
+    "enrollment_status": ["totals", "kpis", "classrooms", "operating"],
+    "recommendations": ["totals", "kpis", "classrooms", "goals"],
+}
+SECTION_FORMATS = {
+    "financial_overview": "string",
+    "profitability_status": "string",
+    "enrollment_status": "string",
+    "recommendations": ["string", "string", "string", "string"],
+}
+
+def number(value: Any) -> Any:
+    value = round(float(value or 0), 2)
+    return int(value) if value.is_integer() else value
+
+def top_items(rows: List[List[Any]], keep: Optional[int]) -> List[List[Any]]:
+    """
+    The `keep` largest rows ([name, amount, ...]); the rest are folded into one
+    "N other items" row so the total still adds up.
+    """
+    rows = sorted(rows, key=lambda row: row[1], reverse=True)
+    if keep is None or len(rows) <= keep:
+        return rows
+    rest = rows[keep:]
+    return rows[:keep] + [[f"{len(rest)} other items", number(sum(row[1] for row in rest))]]
+
+class InsightPromptService:
+    """
+    Builds the insight prompt from the `core/insight_core` template with compact
+    JSON sections, shrinking long line-item lists until it fits `PROMPT_TOKEN_BUDGET`.
+    """
+    @staticmethod
+    def sections(data: Dict[str, Any], kpis: Dict[str, Any], totals: Dict[str, Any], keep: Optional[int]) -> Dict[str, str]:
+        expenses = {
+            label: top_items(
+                [[item["expenseName"], number(item["monthlyAmount"])] for item in data.get(key) or []], keep
+            )
+            for key, label in EXPENSE_CATEGORIES.items()
+        }
+        return {
+            "business_name": data.get("businessName") or "Unnamed Daycare",
+            "totals": compact_json({
+                "revenue": number(totals["revenue"]),
+                "expenses": number(totals["expenses"]),
+                "expenses_by_category": {label: number(amount) for label, amount in totals["expenses_by_category"].items()},
+                "enrolled_students": totals["students"],
+                "capacity": totals["capacity"],
+            }),
+            "kpis": compact_json(kpis),
+            "revenue_sources": compact_json(top_items(
+                [[item["sourceName"], number(item["monthlyAmount"])] for item in data.get("revenueSources") or []], keep
+            )),
+            "expenses": compact_json(expenses),
+            "classrooms": compact_json(top_items(
+                [[room["name"], room["capacity"], room["avgStudents"], number(room["ratio"])] for room in data.get("classrooms") or []],
+                keep
+            )),
+            "operating": compact_json({"hours": number(data.get("operatingHours")), "days": number(data.get("operatingDays"))}),
+            "goals": compact_json([[goal["goal"], number(goal["targetPercentage"])] for goal in data.get("goals") or []]),
+        }
+
+    @staticmethod
+    def fit(render: Callable[[Optional[int]], List[Dict[str, str]]], model: str) -> Tuple[List[Dict[str, str]], int, Optional[int]]:
+        """
+        The messages from `render(keep)` at the most detailed level within `PROMPT_TOKEN_BUDGET`.
+        Returns:
+            Tuple: the messages, their token count and the line items kept per list.
+        """
+        budget = logger_settings.PROMPT_TOKEN_BUDGET
+        for keep in DETAIL_LEVELS:
+            messages = render(keep)
+            tokens = count_message_tokens(messages, model)
+            if tokens <= budget:
+                break
+        else:
+            logger.warning(f"Insight prompt is {tokens} tokens even at category totals, over the {budget} budget.")
+        return messages, tokens, keep
+
+    @staticmethod
+    def full(data: Dict[str, Any], kpis: Dict[str, Any], totals: Dict[str, Any],
+             model: str = "gpt-4-turbo") -> Tuple[List[Dict[str, str]], int, Optional[int]]:
+        template = PromptRegistry.get(INSIGHT_PROMPT)
+        return InsightPromptService.fit(lambda keep: [
+            {"role": "system", "content": INSIGHT_SYSTEM_MESSAGE},
+            {"role": "user", "content": template.render(**InsightPromptService.sections(data, kpis, totals, keep))},
+        ], model)
+
+    @staticmethod
+    def build(data: Dict[str, Any], kpis: Dict[str, Any], totals: Dict[str, Any],
+              model: str = "gpt-4-turbo") -> Tuple[List[Dict[str, str]], int]:
+        """
+        Returns:
+            Tuple[List[Dict[str, str]], int]: the chat messages and their token count.
+        """
+        messages, tokens, keep = InsightPromptService.full(data, kpis, totals, model)
+        logger.info(f"Insight prompt for '{data.get('businessName')}': {tokens} tokens (line items per list: {'all' if keep is None else keep}).")
+        Metrics.observe("llm.prompt_tokens", tokens, prompt=INSIGHT_PROMPT)
+        return messages, tokens
+
+    @staticmethod
+    def build_partial(data: Dict[str, Any], kpis: Dict[str, Any], totals: Dict[str, Any], sections: List[str],
+                      previous: Dict[str, Any], model: str = "gpt-4-turbo") -> Tuple[List[Dict[str, str]], int]:
+        """
+        A smaller prompt asking only for the given executive summary `sections`,
+        with just the inputs they depend on and the other sections for context.
+        Returns:
+            Tuple[List[Dict[str, str]], int]: the chat messages and their token count.
+        """
+        template = PromptRegistry.get(SECTIONS_PROMPT)
+        parts = [part for part in PROMPT_PARTS if any(part in SECTION_PARTS[section] for section in sections)]
+        kept = {name: value for name, value in previous.items() if name not in sections}
+        answer_format = compact_json({section: SECTION_FORMATS[section] for section in sections})
+
+        def render(keep: Optional[int]) -> List[Dict[str, str]]:
+            values = InsightPromptService.sections(data, kpis, totals, keep)
+            context = "\n\n".join(f"{PROMPT_PARTS[part]}:\n{values[part]}" for part in parts)
+            return [
+                {"role": "system", "content": INSIGHT_SYSTEM_MESSAGE},
+                {"role": "user", "content": template.render(
+                    business_name=values["business_name"], context=context,
+                    previous=compact_json(kept), format=answer_format,
+                )},
+            ]
+
+        messages, tokens, _ = InsightPromptService.fit(render, model)
+        logger.info(f"Partial insight prompt for '{data.get('businessName')}' ({', '.join(sections)}): {tokens} tokens.")
+        Metrics.observe("llm.prompt_tokens", tokens, prompt=SECTIONS_PROMPT)
+        return messages, tokens
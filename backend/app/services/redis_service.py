@@ -0,0 +1,129 @@
+import time
+from collections import OrderedDict
+from typing import Optional, Any, Tuple
+import redis.asyncio as redis
+from app.core.config import logger_settings
+logger = logger_settings.get_logger(__name__)
+
+# Seconds between sweeps of expired keys, done on write
+SWEEP_INTERVAL = 60.0
+
+class InMemoryRedis:
+    """
+    Single-process stand-in for the subset of the `redis.asyncio` API the
+    services use. Selected with `REDIS_BACKEND=memory` for local runs and tests.
+    Expired keys are swept on write; with `max_entries`, the least recently
+    used keys are evicted beyond it.
+    """
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._next_sweep = 0.0
+
+    def _sweep(self) -> None:
+        # Keys that are never read again would otherwise outlive their TTL
+        now = time.monotonic()
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + SWEEP_INTERVAL
+        for name in [name for name, (_, expires_at) in self._data.items() if expires_at is not None and expires_at <= now]:
+            del self._data[name]
+
+    def _alive(self, name: str) -> bool:
+        entry = self._data.get(name)
+        if entry is None:
+            return False
+        _, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[name]
+            return False
+        return True
+
+    async def ping(self) -> bool:
+        return True
+
+    async def get(self, name: str) -> Optional[Any]:
+        if not self._alive(name):
+            return None
+        self._data.move_to_end(name)
+        return self._data[name][0]
+
+    async def set(self, name: str, value: Any, ex: Optional[float] = None,
+                  px: Optional[float] = None, nx: bool = False) -> Optional[bool]:
+        if nx and self._alive(name):
+            return None
+        self._sweep()
+        ttl = ex if ex is not None else (px / 1000 if px is not None else None)
+        self._data[name] = (str(value), time.monotonic() + ttl if ttl is not None else None)
+        self._data.move_to_end(name)
+        while self.max_entries is not None and len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+        return True
+
+    async def delete(self, *names: str) -> int:
+        deleted = 0
+        for name in names:
+            if self._alive(name):
+                del self._data[name]
+                deleted += 1
+        return deleted
+
+    async def publish(self, channel: str, message: Any) -> int:
+        # No other processes to notify
+        return 0
+
+    async def aclose(self) -> None:
+        self._data.clear()
+
+class RedisService:
+    # App-wide client, created in the startup hook
+    _client: Optional[Any] = None
+
+    @staticmethod
+    def is_shared() -> bool:
+        """True when the backend is a real Redis shared by every app process."""
+        return RedisService._client is not None and not isinstance(RedisService._client, InMemoryRedis)
+
+    @staticmethod
+    async def startup() -> Optional[Any]:
+        """
+        Creates the app-wide Redis client. Falls back to the in-memory stand-in
+        when `REDIS_BACKEND=memory`; returns None if Redis is unreachable so
+        callers can degrade to their next tier.
+        """
+        if RedisService._client is not None:
+            return RedisService._client
+
+        if logger_settings.REDIS_BACKEND == "memory":
+            RedisService._client = InMemoryRedis()
+            logger.info("Using the in-memory Redis stand-in.")
+            return RedisService._client
+
+        client = redis.from_url(
+            f"redis://{logger_settings.REDIS_HOST}:{logger_settings.REDIS_PORT}",
+            decode_responses=True,
+        )
+        try:
+            await client.ping()
+        except Exception as e:
+            logger.error(f"Error connecting to Redis, continuing without it: {e}")
+            await client.aclose()
+            return None
+        RedisService._client = client
+        logger.info("Successfully connected to Redis.")
+        return client
+
+    @staticmethod
+    def client() -> Optional[Any]:
+        return RedisService._client
+
+    @staticmethod
+    async def shutdown() -> None:
+        client = RedisService._client
+        RedisService._client = None
+        if client is not None:
+            try:
+                await client.aclose()
+                logger.info("Successfully closed Redis connection")
+            except Exception as e:
+                logger.error(f"Error closing Redis connection: {e}")
@@ -0,0 +1,453 @@
+import asyncio
+import calendar
+import hashlib
+import heapq
+import json
+import os
+import re
+import zlib
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import aiomysql
+import pandas as pd
+from app.core.config import logger_settings
+logger = logger_settings.get_logger(__name__)
+from app.core.metrics import Metrics
+from app.services.auth_service import AuthDatabaseService
+from app.services.storage_service import StorageService, SNAPSHOT_TABLES
+
+RETENTION_LOCK_NAME = "care_sim_snapshot_retention"
+PARTITION_PATTERN = re.compile(r"^p(\d{4})(\d{2})$")
+# <table>-<first id>-<last id>.parquet, so reads pick files by id without opening them
+ARCHIVE_FILE_PATTERN = re.compile(r"^[a-z_]+-(\d+)-(\d+)\.parquet$")
+# Users' archive directories are spread over buckets so no directory holds every user
+ARCHIVE_BUCKETS = 64
+
+def archive_bucket(user_email: str) -> int:
+    return zlib.crc32(user_email.encode("utf-8")) % ARCHIVE_BUCKETS
+
+def archive_path(table: str, user_email: str) -> str:
+    """
+    The directory holding only this user's archive files of `table`.
+    """
+    user_key = hashlib.sha256(user_email.encode("utf-8")).hexdigest()[:32]
+    return os.path.join(logger_settings.ARCHIVE_DIR, table, f"bucket={archive_bucket(user_email):02d}", f"user={user_key}")
+
+def archive_files(directory: str) -> List[Tuple[int, int, str]]:
+    """
+    (first id, last id, path) of the archive files in `directory`, newest first.
+    """
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    files = []
+    for name in names:
+        match = ARCHIVE_FILE_PATTERN.match(name)
+        if match:
+            files.append((int(match.group(1)), int(match.group(2)), os.path.join(directory, name)))
+    return sorted(files, key=lambda file: file[1], reverse=True)
+
+def add_months(year: int, month: int, months: int) -> Tuple[int, int]:
+    index = year * 12 + (month - 1) + months
+    return index // 12, index % 12 + 1
+
+def month_start_epoch(year: int, month: int) -> int:
+    """
+    UTC epoch seconds of the first instant of the month (partition boundaries).
+    """
+    return calendar.timegm((year, month, 1, 0, 0, 0))
+
+def epoch_month(epoch: float) -> Tuple[int, int]:
+    moment = datetime.fromtimestamp(epoch, timezone.utc)
+    return moment.year, moment.month
+
+def monthly_partitions(first: Tuple[int, int], last: Tuple[int, int]) -> List[Tuple[str, int]]:
+    """
+    (name, upper bound) of one partition per month from `first` through `last`.
+    """
+    partitions = []
+    year, month = first
+    while (year, month) <= last:
+        partitions.append((f"p{year}{month:02d}", month_start_epoch(*add_months(year, month, 1))))
+        year, month = add_months(year, month, 1)
+    return partitions
+
+def partition_definitions(partitions: List[Tuple[str, int]]) -> str:
+    return ",\n".join(f"PARTITION {name} VALUES LESS THAN ({upper})" for name, upper in partitions)
+
+def partition_clause(year: int, month: int, months_ahead: int) -> str:
+    """
+    `PARTITION BY` for a snapshot table partitioned from (year, month): older rows
+    in `p_history`, one partition per month through `months_ahead`, then `p_future`.
+    """
+    months = monthly_partitions((year, month), add_months(year, month, months_ahead))
+    return (
+        f"PARTITION BY RANGE (UNIX_TIMESTAMP(created_at)) (\n"
+        f"PARTITION p_history VALUES LESS THAN ({month_start_epoch(year, month)}),\n"
+        f"{partition_definitions(months)},\n"
+        f"PARTITION p_future VALUES LESS THAN MAXVALUE)"
+    )
+
+def partition_alter(year: int, month: int, months_ahead: int) -> str:
+    """
+    The change that partitions a snapshot table by month. MySQL requires the
+    partitioning column in every unique key, so the primary key becomes
+    (id, created_at); lookups by id still use its prefix.
+    """
+    return (
+        "MODIFY created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP, "
+        "DROP PRIMARY KEY, ADD PRIMARY KEY (id, created_at)\n"
+        + partition_clause(year, month, months_ahead)
+    )
+
+class RetentionService:
+    """
+    Keeps `input_data` / `insights_data` bounded: once an operator has partitioned
+    them by month (`partition-snapshots`), monthly partitions are created ahead of
+    time, and snapshots beyond each user's newest `SNAPSHOT_RETENTION_KEEP` are
+    moved to Parquet files under `ARCHIVE_DIR`.
+    """
+    @staticmethod
+    def check_archive_dir() -> None:
+        """
+        Raises:
+            RuntimeError: when `ARCHIVE_DIR` is not set. Archived rows are deleted from
+                MySQL, so they must go to storage that every node reads and that outlives
+                the container, never a default local directory.
+        """
+        if not logger_settings.ARCHIVE_DIR:
+            raise RuntimeError(
+                "SNAPSHOT_RETENTION_ENABLED requires ARCHIVE_DIR to point at shared, durable storage."
+            )
+
+    @staticmethod
+    async def run() -> Dict[str, int]:
+        """
+        One retention pass over both tables. Only one process runs it at a time.
+        Returns:
+            Dict[str, int]: rows archived per table.
+        """
+        RetentionService.check_archive_dir()
+        archived: Dict[str, int] = {}
+        async with RetentionService.locked() as acquired:
+            if not acquired:
+                logger.info("Snapshot retention is already running elsewhere, skipping.")
+                return archived
+            for table in SNAPSHOT_TABLES:
+                archived[table] = await RetentionService.archive_table(table)
+        logger.info(f"Snapshot retention finished: {archived}")
+        return archived
+
+    @staticmethod
+    @asynccontextmanager
+    async def locked() -> AsyncIterator[bool]:
+        """
+        Holds the retention lock for the block; yields False when another process has it.
+        """
+        async with AuthDatabaseService.acquire() as lock_connection:
+            async with lock_connection.cursor() as cursor:
+                await cursor.execute("SELECT GET_LOCK(%s, 0)", (RETENTION_LOCK_NAME,))
+                (acquired,) = await cursor.fetchone()
+            if acquired != 1:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                async with lock_connection.cursor() as cursor:
+                    await cursor.execute("SELECT RELEASE_LOCK(%s)", (RETENTION_LOCK_NAME,))
+                    await cursor.fetchone()
+
+    @staticmethod
+    async def maintain_partitions() -> None:
+        """
+        Partition upkeep alone, scheduled whether or not archival is enabled, so
+        months are added while `p_future` is still empty.
+        """
+        try:
+            async with RetentionService.locked() as acquired:
+                if acquired:
+                    for table in SNAPSHOT_TABLES:
+                        await RetentionService.ensure_partitions(table)
+        except Exception as e:
+            logger.error(f"Snapshot partition upkeep failed: {e}")
+
+    @staticmethod
+    async def is_partitioned(table: str) -> bool:
+        async with AuthDatabaseService.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute(
+                    """
+                    SELECT COUNT(*) FROM INFORMATION_SCHEMA.PARTITIONS
+                    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+                    """,
+                    (table,)
+                )
+                (count,) = await cursor.fetchone()
+        return count > 0
+
+    @staticmethod
+    async def partition_table(table: str, months_ahead: int) -> bool:
+        """
+        Partitions `table` by month with a plain ALTER, which copies the table and
+        blocks its writes throughout: only for small tables or a maintenance window.
+        Returns:
+            bool: False when the table was already partitioned.
+        """
+        if await RetentionService.is_partitioned(table):
+            return False
+        now = datetime.now(timezone.utc)
+        async with AuthDatabaseService.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute(f"ALTER TABLE {table} {partition_alter(now.year, now.month, months_ahead)}")
+        logger.info(f"Partitioned {table} by month.")
+        return True
+
+    @staticmethod
+    async def ensure_partitions(table: str) -> int:
+        """
+        Splits the empty `p_future` partition into months up to
+        `SNAPSHOT_PARTITION_MONTHS_AHEAD` from now, which moves no rows. Rows in
+        `p_history` stay there until archival drains them, and a `p_future` that
+        already holds rows is left alone, since splitting it would copy them
+        under the table's metadata lock.
+        Returns:
+            int: number of partitions added.
+        """
+        async with AuthDatabaseService.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute(
+                    """
+                    SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM INFORMATION_SCHEMA.PARTITIONS
+                    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+                    """,
+                    (table,)
+                )
+                bounds = {name: description for name, description in await cursor.fetchall()}
+                if "p_future" not in bounds:
+                    logger.info(f"{table} is not partitioned by month, skipping partition upkeep.")
+                    return 0
+
+                existing = sorted(
+                    (int(match.group(1)), int(match.group(2)))
+                    for match in map(PARTITION_PATTERN.match, bounds) if match
+                )
+                now = datetime.now(timezone.utc)
+                # Months must be appended in order, so continue after the newest one
+                if existing:
+                    first = add_months(*existing[-1], 1)
+                elif "p_history" in bounds:
+                    first = epoch_month(float(bounds["p_history"]))
+                else:
+                    first = (now.year, now.month)
+                ahead = monthly_partitions(first, add_months(now.year, now.month, logger_settings.SNAPSHOT_PARTITION_MONTHS_AHEAD))
+                if not ahead:
+                    return 0
+
+                await cursor.execute(f"SELECT 1 FROM {table} PARTITION (p_future) LIMIT 1")
+                if await cursor.fetchone() is not None:
+                    Metrics.incr("retention.partition_future_rows", table=table)
+                    logger.error(
+                        f"p_future of {table} holds rows, not splitting it online. Split it off-peak "
+                        f"or raise SNAPSHOT_PARTITION_MONTHS_AHEAD so upkeep stays ahead of the clock."
+                    )
+                    return 0
+                await cursor.execute(
+                    f"""
+                    ALTER TABLE {table} REORGANIZE PARTITION p_future INTO (
+                        {partition_definitions(ahead)},
+                        PARTITION p_future VALUES LESS THAN MAXVALUE
+                    )
+                    """
+                )
+        logger.info(f"Added {len(ahead)} monthly partition(s) to {table}.")
+        return len(ahead)
+
+    @staticmethod
+    async def archive_table(table: str) -> int:
+        """
+        Archives every user's old snapshots of `table`, walking users in key order.
+        """
+        last_email, total = "", 0
+        while True:
+            async with AuthDatabaseService.acquire() as connection:
+                async with connection.cursor() as cursor:
+                    await cursor.execute(
+                        "SELECT user_email FROM user_current WHERE user_email > %s ORDER BY user_email LIMIT 200",
+                        (last_email,)
+                    )
+                    emails = [row[0] for row in await cursor.fetchall()]
+                await connection.commit()
+            if not emails:
+                return total
+            for user_email in emails:
+                total += await RetentionService.archive_user(table, user_email)
+            last_email = emails[-1]
+
+    @staticmethod
+    async def archive_user(table: str, user_email: str) -> int:
+        """
+        Moves the user's snapshots beyond the newest `SNAPSHOT_RETENTION_KEEP` (and older
+        than `SNAPSHOT_ARCHIVE_MIN_AGE_DAYS`) to Parquet, one short transaction per batch.
+        A batch is deleted only after its file is on disk; a crash in between leaves
+        duplicates that `history` drops by id.
+        """
+        keep = max(logger_settings.SNAPSHOT_RETENTION_KEEP, 1)
+        batch_size = logger_settings.SNAPSHOT_ARCHIVE_BATCH_SIZE
+        async with AuthDatabaseService.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute(
+                    f"SELECT id FROM {table} WHERE user_email = %s ORDER BY id DESC LIMIT 1 OFFSET %s",
+                    (user_email, keep)
+                )
+                cutoff = await cursor.fetchone()
+            await connection.commit()
+        if cutoff is None:
+            return 0
+
+        archived = 0
+        while True:
+            async with AuthDatabaseService.acquire() as connection:
+                await connection.begin()
+                async with connection.cursor(aiomysql.DictCursor) as cursor:
+                    await cursor.execute(
+                        f"""
+                        SELECT id, user_email, data, data_blob, created_at FROM {table}
+                        WHERE user_email = %s AND id <= %s AND created_at < NOW() - INTERVAL %s DAY
+                        ORDER BY id LIMIT %s
+                        """,
+                        (user_email, cutoff[0], logger_settings.SNAPSHOT_ARCHIVE_MIN_AGE_DAYS, batch_size)
+                    )
+                    rows = await cursor.fetchall()
+                if not rows:
+                    await connection.commit()
+                    break
+
+                records = [{
+                    "id": row["id"],
+                    "user_email": row["user_email"],
+                    "created_at": row["created_at"],
+                    "data": json.dumps(await StorageService.decode_row(row)),
+                } for row in rows]
+                await asyncio.to_thread(RetentionService._write_parquet, table, user_email, records)
+
+                ids = [row["id"] for row in rows]
+                async with connection.cursor() as cursor:
+                    await cursor.execute(
+                        f"DELETE FROM {table} WHERE id IN ({', '.join(['%s'] * len(ids))})", ids
+                    )
+                await connection.commit()
+
+            archived += len(rows)
+            Metrics.incr("retention.archived", len(rows), table=table)
+            if len(rows) < batch_size:
+                break
+            # Let foreground traffic in between batches
+            await asyncio.sleep(0.05)
+        if archived:
+            await asyncio.to_thread(RetentionService.compact_archive, table, user_email)
+        return archived
+
+    @staticmethod
+    def _write_parquet(table: str, user_email: str, records: List[Dict[str, Any]]) -> str:
+        directory = archive_path(table, user_email)
+        os.makedirs(directory, exist_ok=True)
+        filename = f"{table}-{records[0]['id']}-{records[-1]['id']}.parquet"
+        path = os.path.join(directory, filename)
+        # Dot-files are skipped by Parquet dataset readers, so readers only ever see complete files
+        temporary = os.path.join(directory, f".{filename}.tmp")
+        pd.DataFrame.from_records(records).to_parquet(temporary, index=False, compression="zstd")
+        os.replace(temporary, path)
+        return path
+
+    @staticmethod
+    def compact_archive(table: str, user_email: str) -> bool:
+        """
+        Merges the user's archive files into one once there are more than
+        `ARCHIVE_COMPACT_FILES`. The merged file is in place before the small
+        ones are removed, so readers see every row throughout (duplicates are
+        dropped by id).
+        Returns:
+            bool: whether the files were merged.
+        """
+        files = archive_files(archive_path(table, user_email))
+        if len(files) <= logger_settings.ARCHIVE_COMPACT_FILES:
+            return False
+        frame = pd.concat([pd.read_parquet(path) for _, _, path in files], ignore_index=True)
+        records = frame.drop_duplicates("id").sort_values("id").to_dict("records")
+        merged = RetentionService._write_parquet(table, user_email, records)
+        for _, _, path in files:
+            if path != merged:
+                os.remove(path)
+        Metrics.incr("retention.archive_compactions", table=table)
+        return True
+
+    @staticmethod
+    def read_archive(table: str, user_email: str, before_id: Optional[int], limit: int) -> List[Dict[str, Any]]:
+        """
+        Newest-first archived snapshots of the user with `id < before_id`. Only the
+        user's own files are read, newest first, and only until the page is full.
+        """
+        if not logger_settings.ARCHIVE_DIR:
+            return []
+        filters = [("id", "<", before_id)] if before_id is not None else None
+        # A compaction may remove files after they were listed; their rows are in the merged file
+        for _ in range(2):
+            frames, ids = [], []
+            try:
+                for first, last, path in archive_files(archive_path(table, user_email)):
+                    if before_id is not None and first >= before_id:
+                        continue
+                    # Files are ordered by last id, so none of the rest can hold a newer row
+                    if len(ids) >= limit and heapq.nlargest(limit, ids)[-1] > last:
+                        break
+                    frame = pd.read_parquet(path, filters=filters)
+                    frames.append(frame)
+                    ids.extend(frame["id"].tolist())
+                break
+            except FileNotFoundError:
+                continue
+        if not frames:
+            return []
+        frame = pd.concat(frames, ignore_index=True).drop_duplicates("id").sort_values("id", ascending=False).head(limit)
+        return [{
+            "id": int(row.id),
+            "created_at": row.created_at.isoformat(),
+            "data": json.loads(row.data),
+            "archived": True,
+        } for row in frame.itertuples()]
+
+    @staticmethod
+    async def history(table: str, user_email: str, limit: int = 20, before_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        The user's snapshots newest first, from MySQL and then from the archive.
+        Archived ids are always older than the ones still in MySQL.
+        """
+        if table not in SNAPSHOT_TABLES:
+            raise ValueError(f"Unknown snapshot table '{table}'")
+        async with AuthDatabaseService.acquire_read(user_email) as connection:
+            async with connection.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(
+                    f"""
+                    SELECT id, data, data_blob, created_at FROM {table}
+                    WHERE user_email = %s AND id < %s
+                    ORDER BY id DESC LIMIT %s
+                    """,
+                    (user_email, before_id if before_id is not None else 2 ** 63 - 1, limit)
+                )
+                rows = await cursor.fetchall()
+
+        items = [{
+            "id": row["id"],
+            "created_at": row["created_at"].isoformat(),
+            "data": await StorageService.decode_row(row),
+            "archived": False,
+        } for row in rows]
+        if len(items) < limit:
+            older_than = items[-1]["id"] if items else before_id
+            items += await asyncio.to_thread(
+                RetentionService.read_archive, table, user_email, older_than, limit - len(items)
+            )
+        return items
@@ -0,0 +1,118 @@
+import asyncio
+import json
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Tuple
+from app.core.config import logger_settings
+logger = logger_settings.get_logger(__name__)
+from app.core.metrics import Metrics
+from app.services.redis_service import RedisService
+
+SINGLE_FLIGHT_PREFIX = "caresim:singleflight"
+
+class SingleFlight:
+    """
+    Runs one call per key at a time; concurrent callers with the same key share
+    its result. Within a process callers await the in-flight future. Across
+    processes the first one takes a Redis lock and publishes the result for the
+    others; without a shared Redis only local calls are coalesced.
+    """
+    # key -> task running the call
+    _calls: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    async def do(key: str, call: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Returns:
+            Tuple[Any, bool]: the result, and whether it was shared from another caller's call.
+                The result must be JSON-serializable to be shared across processes.
+        """
+        task = SingleFlight._calls.get(key)
+        if task is not None:
+            Metrics.incr("singleflight.coalesced", scope="local")
+            result, _ = await asyncio.shield(task)
+            return result, True
+
+        # A separate task, so the shared call survives any one caller going away
+        task = asyncio.ensure_future(SingleFlight._run_shared(key, call))
+        SingleFlight._calls[key] = task
+        task.add_done_callback(lambda done: SingleFlight._finished(key, done))
+        return await asyncio.shield(task)
+
+    @staticmethod
+    def _finished(key: str, task: asyncio.Future) -> None:
+        if SingleFlight._calls.get(key) is task:
+            del SingleFlight._calls[key]
+        # Mark a failure as retrieved even if every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    @staticmethod
+    async def _run_shared(key: str, call: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        client = RedisService.client()
+        if not RedisService.is_shared():
+            return await call(), False
+
+        lock_key = f"{SINGLE_FLIGHT_PREFIX}:lock:{key}"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + logger_settings.SINGLE_FLIGHT_LOCK_TTL
+        while time.monotonic() < deadline:
+            try:
+                acquired = await client.set(lock_key, token, nx=True, px=int(logger_settings.SINGLE_FLIGHT_LOCK_TTL * 1000))
+                leader = None if acquired else await client.get(lock_key)
+            except Exception as e:
+                logger.warning(f"Single-flight lock unavailable, running locally: {e}")
+                break
+            if acquired:
+                return await SingleFlight._lead(client, lock_key, token, call), False
+            if leader is None:
+                # Released between our SET and GET; try to take it
+                continue
+            try:
+                result = await SingleFlight._follow(client, lock_key, leader, deadline)
+            except Exception as e:
+                logger.warning(f"Lost track of the single-flight leader, running locally: {e}")
+                break
+            if result is not None:
+                Metrics.incr("singleflight.coalesced", scope="remote")
+                return result[0], True
+            # The leader failed or its lock expired without a result
+        return await call(), False
+
+    @staticmethod
+    async def _lead(client: Any, lock_key: str, token: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            result = await call()
+            try:
+                await client.set(
+                    f"{SINGLE_FLIGHT_PREFIX}:result:{token}", json.dumps([result], default=str),
+                    px=int(logger_settings.SINGLE_FLIGHT_RESULT_TTL * 1000)
+                )
+            except Exception as e:
+                logger.warning(f"Could not publish single-flight result: {e}")
+            return result
+        finally:
+            try:
+                # Compare before deleting so an expired lock taken over by another leader survives
+                if await client.get(lock_key) == token:
+                    await client.delete(lock_key)
+            except Exception as e:
+                logger.warning(f"Could not release single-flight lock: {e}")
+
+    @staticmethod
+    async def _follow(client: Any, lock_key: str, leader: str, deadline: float) -> Any:
+        """
+        Waits for the leader's result. Returns it wrapped in a list, or None when the
+        leader is gone without publishing one.
+        """
+        result_key = f"{SINGLE_FLIGHT_PREFIX}:result:{leader}"
+        while time.monotonic() < deadline:
+            raw = await client.get(result_key)
+            if raw is not None:
+                return json.loads(raw)
+            if await client.get(lock_key) != leader:
+                # Released or expired: it may still have published just before
+                raw = await client.get(result_key)
+                return json.loads(raw) if raw is not None else None
+            await asyncio.sleep(logger_settings.SINGLE_FLIGHT_POLL_INTERVAL)
+        return None
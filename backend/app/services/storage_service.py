@@ -0,0 +1,191 @@
+import asyncio
+import json
+import statistics
+import time
+from typing import Any, Dict, List, Optional
+import aiomysql
+from app.core.config import logger_settings
+logger = logger_settings.get_logger(__name__)
+from app.core.codec import StorageCodec, CodecError, zstandard
+from app.services.auth_service import AuthDatabaseService
+
+SNAPSHOT_TABLES = ("input_data", "insights_data")
+
+class StorageService:
+    """
+    Database side of the snapshot codec: shared dictionaries, re-encoding of
+    existing rows and the size/speed benchmark.
+    """
+    @staticmethod
+    async def load_dictionaries() -> int:
+        """
+        Registers every stored compression dictionary with the codec.
+        Returns:
+            int: number of dictionaries loaded.
+        """
+        async with AuthDatabaseService.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute("SELECT id, algorithm, dictionary FROM codec_dictionaries")
+                rows = await cursor.fetchall()
+        for dictionary_id, algorithm, dictionary in rows:
+            StorageCodec.register_dictionary(dictionary_id, algorithm, dictionary)
+        return len(rows)
+
+    @staticmethod
+    async def decode_row(row: Dict[str, Any]) -> Any:
+        """
+        Decodes a snapshot row, loading dictionaries trained by another process on demand.
+        """
+        try:
+            return StorageCodec.decode_row(row.get("data"), row.get("data_blob"))
+        except KeyError:
+            await StorageService.load_dictionaries()
+            return StorageCodec.decode_row(row.get("data"), row.get("data_blob"))
+
+    @staticmethod
+    async def sample_payloads(table: str, limit: int) -> List[bytes]:
+        """
+        Compact JSON of the newest `limit` rows of `table`.
+        """
+        if table not in SNAPSHOT_TABLES:
+            raise ValueError(f"Unknown snapshot table '{table}'")
+        async with AuthDatabaseService.acquire_read() as connection:
+            async with connection.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(
+                    f"SELECT data, data_blob FROM {table} ORDER BY id DESC LIMIT %s", (limit,)
+                )
+                rows = await cursor.fetchall()
+        samples = []
+        for row in rows:
+            value = await StorageService.decode_row(row)
+            if value is not None:
+                samples.append(json.dumps(value, separators=(",", ":")).encode("utf-8"))
+        return samples
+
+    @staticmethod
+    async def train_dictionary(table: str, algorithm: str, samples: int = 2000, size: int = 64 * 1024) -> int:
+        """
+        Trains a shared dictionary on recent rows of `table` and stores it.
+        New rows use it once `STORAGE_CODEC_USE_DICTIONARY` is on.
+        Returns:
+            int: id of the new dictionary.
+        """
+        payloads = await StorageService.sample_payloads(table, samples)
+        if not payloads:
+            raise CodecError(f"No rows in {table} to train a dictionary on")
+        dictionary = StorageCodec.train_dictionary(payloads, algorithm, size)
+        async with AuthDatabaseService.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute(
+                    "INSERT INTO codec_dictionaries (algorithm, dictionary) VALUES (%s, %s)",
+                    (algorithm, dictionary)
+                )
+                dictionary_id = cursor.lastrowid
+            await connection.commit()
+        StorageCodec.register_dictionary(dictionary_id, algorithm, dictionary)
+        logger.info(f"Trained {algorithm} dictionary {dictionary_id} ({len(dictionary)} bytes) on {len(payloads)} {table} rows.")
+        return dictionary_id
+
+    @staticmethod
+    async def reencode(table: str, batch_size: int = 500, recompress: bool = False, pause: float = 0.05) -> int:
+        """
+        Rewrites rows of `table` in the configured codec, one short transaction
+        per `batch_size` rows. Legacy plain-JSON rows are always converted;
+        with `recompress`, blobs in another algorithm or dictionary are too.
+        Returns:
+            int: number of rows rewritten.
+        """
+        if table not in SNAPSHOT_TABLES:
+            raise ValueError(f"Unknown snapshot table '{table}'")
+        algorithm = StorageCodec.algorithm()
+        if algorithm == "json":
+            raise CodecError("STORAGE_CODEC=json has nothing to re-encode into")
+        target = (algorithm, StorageCodec.active_dictionary(algorithm))
+
+        last_id, rewritten = 0, 0
+        while True:
+            async with AuthDatabaseService.acquire() as connection:
+                async with connection.cursor(aiomysql.DictCursor) as cursor:
+                    await cursor.execute(
+                        f"SELECT id, data, data_blob FROM {table} WHERE id > %s ORDER BY id LIMIT %s",
+                        (last_id, batch_size)
+                    )
+                    rows = await cursor.fetchall()
+                if not rows:
+                    await connection.commit()
+                    break
+                last_id = rows[-1]["id"]
+
+                updates = []
+                for row in rows:
+                    if row["data_blob"] is not None:
+                        if not recompress or StorageCodec.header(row["data_blob"])[1:] == target:
+                            continue
+                    value = await StorageService.decode_row(row)
+                    if value is not None:
+                        updates.append((StorageCodec.encode(value), row["id"]))
+
+                async with connection.cursor() as cursor:
+                    if updates:
+                        await cursor.executemany(
+                            f"UPDATE {table} SET data_blob = %s, data = NULL WHERE id = %s", updates
+                        )
+                await connection.commit()
+            rewritten += len(updates)
+            # Let foreground traffic in between batches
+            await asyncio.sleep(pause)
+
+        logger.info(f"Re-encoded {rewritten} {table} row(s) as {algorithm}.")
+        return rewritten
+
+    @staticmethod
+    def benchmark(payloads: List[bytes], dictionary_size: int = 64 * 1024, repeat: int = 3) -> List[Dict[str, Any]]:
+        """
+        Bytes per row, size ratio against legacy JSON rows and encode/decode time
+        for each available codec over `payloads` (dictionaries are trained on the
+        same sample, so treat those numbers as a best case).
+        """
+        values = [json.loads(payload) for payload in payloads]
+        legacy_bytes = statistics.mean(len(json.dumps(value).encode("utf-8")) for value in values)
+        variants = [("json", None), ("none", None), ("zlib", None), ("zlib", "dict")]
+        if zstandard is not None:
+            variants += [("zstd", None), ("zstd", "dict")]
+
+        results = []
+        for algorithm, dictionary in variants:
+            dictionary_id: Optional[int] = 0
+            if dictionary:
+                # Ids at the top of the range never collide with stored dictionaries
+                dictionary_id = 0xFFFFFFFF - len(results)
+                StorageCodec.register_dictionary(
+                    dictionary_id, algorithm, StorageCodec.train_dictionary(payloads, algorithm, dictionary_size)
+                )
+            try:
+                encode_times, decode_times = [], []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    if algorithm == "json":
+                        encoded = [json.dumps(value).encode("utf-8") for value in values]
+                    else:
+                        encoded = [StorageCodec.encode(value, algorithm, dictionary_id) for value in values]
+                    encode_times.append(time.perf_counter() - started)
+
+                    started = time.perf_counter()
+                    for blob in encoded:
+                        json.loads(blob) if algorithm == "json" else StorageCodec.decode(blob)
+                    decode_times.append(time.perf_counter() - started)
+            finally:
+                if dictionary:
+                    StorageCodec._dictionaries.pop(dictionary_id, None)
+                    StorageCodec._zstd_dictionaries.pop(dictionary_id, None)
+
+            sizes = [len(blob) for blob in encoded]
+            results.append({
+                "codec": algorithm + ("+dict" if dictionary else ""),
+                "rows": len(values),
+                "avg_bytes": round(statistics.mean(sizes), 1),
+                "ratio": round(legacy_bytes / statistics.mean(sizes), 2),
+                "encode_us_per_row": round(min(encode_times) / len(values) * 1e6, 1),
+                "decode_us_per_row": round(min(decode_times) / len(values) * 1e6, 1),
+            })
+        return results
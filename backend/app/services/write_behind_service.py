@@ -0,0 +1,310 @@
+import asyncio
+import json
+import os
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import HTTPException
+from app.core.config import logger_settings
+logger = logger_settings.get_logger(__name__)
+from app.core.codec import StorageCodec
+from app.core.metrics import Metrics
+from app.services.auth_service import AuthDatabaseService
+from app.services.cache_service import CacheService
+
+# Keep every multi-row INSERT well under the default max_allowed_packet / aiomysql max_stmt_length
+MAX_CHUNK_BYTES = 512 * 1024
+# Queued by shutdown to end the flusher once everything before it is written
+STOP = None
+DEAD_LETTER_SUFFIX = ".jsonl"
+
+def chunk_rows(rows: List[Tuple[str, Optional[str], Optional[bytes]]]) -> List[List[Tuple[str, Optional[str], Optional[bytes]]]]:
+    """
+    Splits (user_email, data, data_blob) rows into multi-row INSERT sized chunks.
+    """
+    chunks, current, size = [], [], 0
+    for row in rows:
+        # Escaping can grow a blob inside the statement; budget for up to twice its size
+        row_size = len(row[0]) + len(row[1] or "") + 2 * len(row[2] or b"") + 16
+        if current and size + row_size > MAX_CHUNK_BYTES:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(row)
+        size += row_size
+    if current:
+        chunks.append(current)
+    return chunks
+
+class WriteBehindQueue:
+    """
+    Optional asynchronous write-behind for `input_data` / `insights_data` snapshots.
+    Saves are queued in memory and flushed as multi-row INSERTs by size or time.
+    The queue is bounded: when full, `enqueue` waits up to
+    `WRITE_BEHIND_ENQUEUE_TIMEOUT` and then rejects with 503.
+
+    This trades durability for latency: a save is acknowledged before it reaches
+    MySQL, and saves still queued when the process dies are lost. Batches that
+    keep failing to flush are written to `WRITE_BEHIND_DEAD_LETTER_DIR`, from
+    where `replay_dead_letters` (`care-sim replay-write-behind`) saves them later.
+    """
+    _queue: Optional[asyncio.Queue] = None
+    _flusher: Optional[asyncio.Task] = None
+    # (table, user_email) -> (sequence, data) of the newest not-yet-flushed snapshot
+    _pending: Dict[Tuple[str, str], Tuple[int, Dict[str, Any]]] = {}
+    _sequence: int = 0
+
+    @staticmethod
+    def enabled() -> bool:
+        return WriteBehindQueue._queue is not None
+
+    @staticmethod
+    async def startup() -> None:
+        if not logger_settings.WRITE_BEHIND_ENABLED or WriteBehindQueue._queue is not None:
+            return
+        WriteBehindQueue._queue = asyncio.Queue(maxsize=logger_settings.WRITE_BEHIND_MAX_QUEUE)
+        WriteBehindQueue._flusher = asyncio.create_task(WriteBehindQueue._run())
+        logger.info("Write-behind queue started.")
+
+    @staticmethod
+    async def shutdown() -> None:
+        """
+        Stops accepting writes and flushes everything still queued.
+        """
+        queue = WriteBehindQueue._queue
+        if queue is None:
+            return
+        WriteBehindQueue._queue = None
+        flusher = WriteBehindQueue._flusher
+        WriteBehindQueue._flusher = None
+        if flusher is not None and not flusher.done():
+            # Queued behind every earlier save, so the flusher writes its current batch and the rest first
+            await queue.put(STOP)
+            await flusher
+
+        # Saves that were still waiting for a slot when the flusher stopped
+        remaining = []
+        while not queue.empty():
+            remaining.append(queue.get_nowait())
+        for start in range(0, len(remaining), logger_settings.WRITE_BEHIND_BATCH_SIZE):
+            await WriteBehindQueue._flush(remaining[start:start + logger_settings.WRITE_BEHIND_BATCH_SIZE])
+        logger.info(f"Write-behind queue drained ({len(remaining)} row(s) flushed on shutdown).")
+
+    @staticmethod
+    def pending(table: str, user_email: str) -> Optional[Dict[str, Any]]:
+        """
+        Newest queued snapshot for the user, so reads see writes that are not flushed yet.
+        """
+        entry = WriteBehindQueue._pending.get((table, user_email))
+        return entry[1] if entry else None
+
+    @staticmethod
+    async def enqueue(table: str, user_email: str, data: Dict[str, Any]) -> None:
+        """
+        Queues a snapshot and writes it through the cache, so the user's next read
+        sees it on any process sharing Redis.
+        """
+        from app.services.insight_service import CACHE_KINDS
+
+        queue = WriteBehindQueue._queue
+        if queue is None:
+            raise RuntimeError("Write-behind queue is not running.")
+        WriteBehindQueue._sequence += 1
+        item = (WriteBehindQueue._sequence, table, user_email, data, time.time())
+        try:
+            await asyncio.wait_for(queue.put(item), timeout=logger_settings.WRITE_BEHIND_ENQUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            Metrics.incr("write_behind.rejected")
+            raise HTTPException(status_code=503, detail="Too many pending saves, try again shortly")
+        WriteBehindQueue._pending[(table, user_email)] = item[0], data
+        await CacheService.put(CACHE_KINDS[table], user_email, data)
+        Metrics.incr("write_behind.enqueued", table=table)
+        Metrics.set_gauge("write_behind.depth", queue.qsize())
+
+    @staticmethod
+    async def _run() -> None:
+        queue = WriteBehindQueue._queue
+        stopping = False
+        while not stopping:
+            item = await queue.get()
+            if item is STOP:
+                return
+            batch = [item]
+            deadline = time.monotonic() + logger_settings.WRITE_BEHIND_FLUSH_INTERVAL
+            while len(batch) < logger_settings.WRITE_BEHIND_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                await WriteBehindQueue._flush(batch)
+            except Exception as e:
+                # Keep flushing later saves
+                logger.error(f"Write-behind flush of {len(batch)} row(s) failed unexpectedly: {e}")
+                await WriteBehindQueue.dead_letter(batch, e)
+            Metrics.set_gauge("write_behind.depth", queue.qsize())
+
+    @staticmethod
+    async def dead_letter(items: List[Tuple[int, str, str, Dict[str, Any], float]], error: BaseException) -> None:
+        """
+        Writes saves that could not be flushed to a file under
+        `WRITE_BEHIND_DEAD_LETTER_DIR`, one JSON line per save, for `replay_dead_letters`.
+        """
+        try:
+            path = await asyncio.to_thread(WriteBehindQueue._write_dead_letter, items, str(error))
+        except Exception as e:
+            Metrics.incr("write_behind.dropped", len(items))
+            logger.critical(f"Could not dead-letter {len(items)} unsaved snapshot(s), they are lost: {e}")
+            return
+        Metrics.incr("write_behind.dead_lettered", len(items))
+        logger.error(f"Dead-lettered {len(items)} unsaved snapshot(s) to {path}: {error}")
+
+    @staticmethod
+    def _write_dead_letter(items: List[Tuple[int, str, str, Dict[str, Any], float]], error: str) -> str:
+        directory = logger_settings.WRITE_BEHIND_DEAD_LETTER_DIR
+        os.makedirs(directory, exist_ok=True)
+        filename = f"{time.time_ns()}-{os.getpid()}-{items[0][0]}{DEAD_LETTER_SUFFIX}"
+        path = os.path.join(directory, filename)
+        # Dot-files are skipped by replay, so it only ever sees complete files
+        temporary = os.path.join(directory, f".{filename}.tmp")
+        with open(temporary, "w", encoding="utf-8") as file:
+            for sequence, table, user_email, data, queued_at in items:
+                file.write(json.dumps({
+                    "table": table, "user_email": user_email, "data": data,
+                    "queued_at": queued_at, "error": error,
+                }, default=str) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, path)
+        return path
+
+    @staticmethod
+    async def replay_dead_letters() -> int:
+        """
+        Saves dead-lettered snapshots, one file per transaction, and deletes each
+        file once it is committed. A replayed snapshot becomes the user's current
+        one only if nothing newer was saved since it was queued.
+        Returns:
+            int: number of snapshots saved.
+        """
+        from app.services.insight_service import SNAPSHOT_TABLES, CACHE_KINDS
+
+        directory = logger_settings.WRITE_BEHIND_DEAD_LETTER_DIR
+        if not os.path.isdir(directory):
+            return 0
+        replayed = 0
+        for name in sorted(os.listdir(directory)):
+            if name.startswith(".") or not name.endswith(DEAD_LETTER_SUFFIX):
+                continue
+            path = os.path.join(directory, name)
+            with open(path, encoding="utf-8") as file:
+                records = [json.loads(line) for line in file if line.strip()]
+            async with AuthDatabaseService.acquire() as connection:
+                await connection.begin()
+                try:
+                    async with connection.cursor() as cursor:
+                        for record in records:
+                            table, user_email = record["table"], record["user_email"]
+                            pointer_column = SNAPSHOT_TABLES[table]
+                            await cursor.execute(
+                                f"INSERT INTO {table} (user_email, data, data_blob, created_at) VALUES (%s, %s, %s, FROM_UNIXTIME(%s))",
+                                (user_email, *StorageCodec.to_columns(record["data"]), record["queued_at"])
+                            )
+                            row_id = cursor.lastrowid
+                            await cursor.execute(
+                                f"""
+                                INSERT INTO user_current (user_email, {pointer_column}) VALUES (%s, %s)
+                                ON DUPLICATE KEY UPDATE {pointer_column} = COALESCE({pointer_column}, VALUES({pointer_column}))
+                                """,
+                                (user_email, row_id)
+                            )
+                            # Only over a current snapshot older than this one
+                            await cursor.execute(
+                                f"""
+                                UPDATE user_current uc JOIN {table} s ON s.id = uc.{pointer_column}
+                                SET uc.{pointer_column} = %s
+                                WHERE uc.user_email = %s AND s.created_at < FROM_UNIXTIME(%s)
+                                """,
+                                (row_id, user_email, record["queued_at"])
+                            )
+                    await connection.commit()
+                except Exception:
+                    await connection.rollback()
+                    raise
+            for user_email in {record["user_email"] for record in records}:
+                await AuthDatabaseService.mark_written(user_email)
+                await CacheService.invalidate(user_email, *CACHE_KINDS.values())
+            os.remove(path)
+            replayed += len(records)
+            logger.info(f"Replayed {len(records)} dead-lettered snapshot(s) from {name}.")
+        return replayed
+
+    @staticmethod
+    async def _flush(batch: List[Tuple[int, str, str, Dict[str, Any], float]]) -> None:
+        from app.services.insight_service import SNAPSHOT_TABLES, CACHE_KINDS
+
+        by_table: Dict[str, List[Tuple[int, str, str, Dict[str, Any], float]]] = defaultdict(list)
+        for item in batch:
+            by_table[item[1]].append(item)
+
+        for table, items in by_table.items():
+            pointer_column = SNAPSHOT_TABLES[table]
+            rows = [(user_email, *StorageCodec.to_columns(data)) for _, _, user_email, data, _ in items]
+            emails = sorted({user_email for _, _, user_email, _, _ in items})
+            started = time.perf_counter()
+            flushed = False
+
+            for attempt in range(1, logger_settings.WRITE_BEHIND_MAX_RETRIES + 1):
+                try:
+                    async with AuthDatabaseService.acquire() as connection:
+                        await connection.begin()
+                        async with connection.cursor() as cursor:
+                            first_id = None
+                            for chunk in chunk_rows(rows):
+                                await cursor.executemany(
+                                    f"INSERT INTO {table} (user_email, data, data_blob) VALUES (%s, %s, %s)", chunk
+                                )
+                                first_id = cursor.lastrowid if first_id is None else first_id
+                            placeholders = ", ".join(["%s"] * len(emails))
+                            await cursor.execute(
+                                f"""
+                                INSERT INTO user_current (user_email, {pointer_column})
+                                SELECT user_email, MAX(id) FROM {table}
+                                WHERE id >= %s AND user_email IN ({placeholders})
+                                GROUP BY user_email
+                                ON DUPLICATE KEY UPDATE
+                                    {pointer_column} = GREATEST(COALESCE({pointer_column}, 0), VALUES({pointer_column}))
+                                """,
+                                (first_id, *emails)
+                            )
+                        await connection.commit()
+                    flushed = True
+                    break
+                except Exception as e:
+                    if attempt == logger_settings.WRITE_BEHIND_MAX_RETRIES:
+                        logger.error(f"Write-behind flush of {len(rows)} {table} row(s) failed: {e}")
+                        await WriteBehindQueue.dead_letter(items, e)
+                        break
+                    logger.warning(f"Write-behind flush of {table} failed (attempt {attempt}): {e}")
+                    await asyncio.sleep(0.5 * 2 ** (attempt - 1))
+
+            if flushed:
+                Metrics.incr("write_behind.flushed", len(rows), table=table)
+                Metrics.observe("write_behind.flush_ms", (time.perf_counter() - started) * 1000, table=table)
+
+            # Drop overlays that are settled; newer queued saves keep theirs
+            for sequence, _, user_email, _, _ in items:
+                entry = WriteBehindQueue._pending.get((table, user_email))
+                if entry and entry[0] == sequence:
+                    del WriteBehindQueue._pending[(table, user_email)]
+                    if flushed:
+                        # The cache already holds this snapshot; keep replica reads off until they catch up
+                        await AuthDatabaseService.mark_written(user_email)
+                    else:
+                        await CacheService.invalidate(user_email, CACHE_KINDS[table])
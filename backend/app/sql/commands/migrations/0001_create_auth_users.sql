@@ -0,0 +1,11 @@
+-- Table for registered users
+CREATE TABLE IF NOT EXISTS auth_users (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    username VARCHAR(50) UNIQUE NOT NULL,
+    email VARCHAR(100) UNIQUE NOT NULL,
+    password VARCHAR(100) NOT NULL,
+    phone_number VARCHAR(15),
+    address VARCHAR(255),
+    security_question VARCHAR(255),
+    security_answer VARCHAR(255)
+);
@@ -0,0 +1,15 @@
+-- Table for storing the raw input data you send to the model
+CREATE TABLE IF NOT EXISTS input_data (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_email VARCHAR(255) NOT NULL,
+    data JSON,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Table for storing the insights JSON you get back
+CREATE TABLE IF NOT EXISTS insights_data (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_email VARCHAR(255) NOT NULL,
+    data JSON,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,2 @@
+-- Serves "latest input per user" lookups without a filesort over the user's history
+ALTER TABLE input_data ADD INDEX idx_input_data_user_created (user_email, created_at);
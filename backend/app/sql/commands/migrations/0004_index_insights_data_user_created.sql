@@ -0,0 +1,2 @@
+-- Serves "latest insight per user" lookups without a filesort over the user's history
+ALTER TABLE insights_data ADD INDEX idx_insights_data_user_created (user_email, created_at);
@@ -0,0 +1,17 @@
+-- Pointer to the newest input and insight snapshot of every user,
+-- kept current in the same transaction as the snapshot INSERTs
+CREATE TABLE IF NOT EXISTS user_current (
+    user_email VARCHAR(255) PRIMARY KEY,
+    input_id INT NULL,
+    insight_id INT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- Backfill pointers from the existing history
+INSERT INTO user_current (user_email, input_id)
+SELECT user_email, MAX(id) FROM input_data GROUP BY user_email
+ON DUPLICATE KEY UPDATE input_id = VALUES(input_id);
+
+INSERT INTO user_current (user_email, insight_id)
+SELECT user_email, MAX(id) FROM insights_data GROUP BY user_email
+ON DUPLICATE KEY UPDATE insight_id = VALUES(insight_id);
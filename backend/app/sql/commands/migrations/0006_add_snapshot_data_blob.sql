@@ -0,0 +1,11 @@
+-- Compressed snapshot payloads (see app/core/codec.py); legacy rows keep plain JSON in `data`
+ALTER TABLE input_data ADD COLUMN data_blob LONGBLOB NULL AFTER data;
+ALTER TABLE insights_data ADD COLUMN data_blob LONGBLOB NULL AFTER data;
+
+-- Shared compression dictionaries referenced by id from each blob header
+CREATE TABLE IF NOT EXISTS codec_dictionaries (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    algorithm VARCHAR(16) NOT NULL,
+    dictionary LONGBLOB NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,12 @@
+-- Exact-match cache of generated insights, keyed by the canonical hash of the
+-- DaycareInput plus the model and prompt version (see InsightCacheService)
+CREATE TABLE IF NOT EXISTS insight_cache (
+    input_hash CHAR(64) PRIMARY KEY,
+    model VARCHAR(64) NOT NULL,
+    prompt_version VARCHAR(32) NOT NULL,
+    insight LONGBLOB NOT NULL,
+    hits INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL,
+    INDEX idx_insight_cache_expires (expires_at)
+);
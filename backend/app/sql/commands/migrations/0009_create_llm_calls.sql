@@ -0,0 +1,17 @@
+-- One row per model call (see LlmUsageService), for cost and latency by user and by day
+CREATE TABLE IF NOT EXISTS llm_calls (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    created_at TIMESTAMP(3) NOT NULL,
+    user_email VARCHAR(255) NULL,
+    model VARCHAR(64) NOT NULL,
+    operation VARCHAR(32) NOT NULL,
+    outcome VARCHAR(16) NOT NULL,
+    prompt_tokens INT UNSIGNED NOT NULL DEFAULT 0,
+    completion_tokens INT UNSIGNED NOT NULL DEFAULT 0,
+    cached_tokens INT UNSIGNED NOT NULL DEFAULT 0,
+    wait_ms INT UNSIGNED NOT NULL DEFAULT 0,
+    network_ms INT UNSIGNED NOT NULL DEFAULT 0,
+    cost_usd DECIMAL(12, 6) NOT NULL DEFAULT 0,
+    INDEX idx_llm_calls_created (created_at),
+    INDEX idx_llm_calls_user_created (user_email, created_at)
+);
@@ -0,0 +1,7 @@
+-- Input and executive summary behind each user's latest model-written insight,
+-- so an edit only regenerates the summary sections it affects (see InsightBasisService)
+CREATE TABLE IF NOT EXISTS insight_basis (
+    user_email VARCHAR(255) PRIMARY KEY,
+    basis LONGBLOB NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
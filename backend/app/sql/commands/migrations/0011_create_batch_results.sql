@@ -0,0 +1,12 @@
+-- Results of POST /insight/batch, one row per successful center; kept apart from
+-- input_data/insights_data so a batch never moves the caller's user_current pointers
+CREATE TABLE IF NOT EXISTS batch_results (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    batch_id CHAR(32) NOT NULL,
+    user_email VARCHAR(255) NOT NULL,
+    center_index INT NOT NULL,
+    result LONGBLOB NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_batch_results_batch_center (batch_id, center_index),
+    KEY idx_batch_results_user_created (user_email, created_at)
+);
@@ -1,9 +1,11 @@
 import os, re
-from typing import Optional
+from typing import Optional, List, Tuple
 from app.core.config import logger_settings, Settings
 logger = logger_settings.get_logger(__name__)
 import aiofiles
 
+MIGRATION_PATTERN = re.compile(r'^(\d+)_\w+\.sql$')
+
 class SqlQuery:
     @staticmethod
     async def read_sql(sql_name) -> str:
@@ -114,3 +116,33 @@ class SqlQuery:
             print(f"An error occurred: {e}")
         
         return matches
+    
+    @staticmethod
+    def list_migrations() -> List[Tuple[int, str]]:
+        """
+        List the schema migrations under `sql/commands/migrations`, ordered by version.
+        Migration files are named `<version>_<description>.sql`, e.g. `0003_add_index.sql`.
+        Returns:
+            List[Tuple[int, str]]: (version, sql_name) pairs usable with `read_sql`.
+        """
+        migrations = []
+        try:
+            for file in os.listdir(logger_settings.MIGRATIONS_DIR):
+                match = MIGRATION_PATTERN.match(file)
+                if match:
+                    sql_name = os.path.join("migrations", file[:-len(".sql")])
+                    migrations.append((int(match.group(1)), sql_name))
+        except FileNotFoundError:
+            logger.error(f"Directory {logger_settings.MIGRATIONS_DIR} not found.")
+        except Exception as e:
+            logger.error(f"An error occurred while listing {logger_settings.MIGRATIONS_DIR}: {e}")
+        return sorted(migrations)
+    
+    @staticmethod
+    def split_statements(sql_text: str) -> List[str]:
+        """
+        Split a migration script into individual statements.
+        `--` comment lines are dropped and statements are separated by `;`.
+        """
+        lines = [line for line in sql_text.splitlines() if not line.strip().startswith("--")]
+        return [statement.strip() for statement in "\n".join(lines).split(";") if statement.strip()]
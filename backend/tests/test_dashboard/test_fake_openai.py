@@ -0,0 +1,124 @@
+import asyncio
+import random
+import time
+import httpx
+import openai
+import pytest
+from app.core.config import logger_settings
+from app.core.circuit_breaker import CircuitOpenError
+from app.core.metrics import Metrics
+from app.services.insight_stream_service import InsightStreamService
+from app.services.llm_service import LlmService
+from utils.loadtest.fake_openai import DEFAULT_RESPONSE, create_fake_openai_app, sample_latency
+
+'''
+    to run specific file: pytest -v tests/test_dashboard/test_fake_openai.py
+'''
+
+def client_for(app) -> openai.AsyncOpenAI:
+    return openai.AsyncOpenAI(
+        api_key="test", base_url="http://fake-openai/v1", max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=app)),
+    )
+
+MESSAGES = [{"role": "user", "content": "Summarize"}]
+
+class TestFakeOpenAI:
+    @pytest.mark.simple
+    def test_latency_distributions(self):
+        rng = random.Random(7)
+        assert sample_latency("fixed:0.25", rng) == 0.25
+        assert all(1 <= sample_latency("uniform:1:2", rng) <= 2 for _ in range(100))
+        assert all(sample_latency("lognormal:1.0:0.5", rng) > 0 for _ in range(100))
+        with pytest.raises(ValueError):
+            sample_latency("gaussian:1", rng)
+
+    @pytest.mark.operation
+    def test_plain_and_streamed_completions(self):
+        app = create_fake_openai_app(latency="fixed:0", error_rate=0, rate_limit_rate=0, response_file="")
+
+        async def run():
+            client = client_for(app)
+            response = await client.chat.completions.create(model="gpt-4-turbo", messages=MESSAGES)
+            sections = [section async for section in InsightStreamService.generate(client, "gpt-4-turbo", {}, MESSAGES)]
+            return response, sections
+
+        response, sections = asyncio.run(run())
+        assert response.usage.total_tokens > 0
+        assert sections == [("executive_summary", DEFAULT_RESPONSE["executive_summary"])]
+
+    @pytest.mark.operation
+    def test_injected_errors(self):
+        failing = create_fake_openai_app(latency="fixed:0", error_rate=1.0, rate_limit_rate=0, response_file="")
+        limited = create_fake_openai_app(latency="fixed:0", error_rate=0, rate_limit_rate=1.0, response_file="")
+
+        async def call(app):
+            return await client_for(app).chat.completions.create(model="gpt-4-turbo", messages=MESSAGES)
+
+        with pytest.raises(openai.InternalServerError):
+            asyncio.run(call(failing))
+        with pytest.raises(openai.RateLimitError):
+            asyncio.run(call(limited))
+
+    @pytest.mark.operation
+    def test_llm_service_uses_the_fake_when_selected(self, monkeypatch):
+        monkeypatch.setattr(logger_settings, "LLM_FAKE", True)
+        monkeypatch.setattr(logger_settings, "FAKE_LLM_LATENCY", "fixed:0")
+
+        async def run():
+            try:
+                return await LlmService.chat(MESSAGES, model="gpt-4-turbo", max_tokens=100)
+            finally:
+                await LlmService.shutdown()
+
+        response = asyncio.run(run())
+        assert response.choices[0].message.content.startswith('{"executive_summary"')
+
+async def chat_against(app, calls: int = 1):
+    """Runs `calls` LlmService.chat calls answered by `app`; returns each result or exception."""
+    await LlmService.startup().close()
+    LlmService._client = client_for(app)
+    results = []
+    try:
+        for _ in range(calls):
+            try:
+                results.append(await LlmService.chat(MESSAGES, model="gpt-4-turbo", max_tokens=100))
+            except Exception as e:
+                results.append(e)
+    finally:
+        await LlmService.shutdown()
+    return results
+
+class TestTailLatency:
+    @pytest.mark.operation
+    def test_deadline_retries_then_opens_the_circuit(self, monkeypatch):
+        monkeypatch.setattr(logger_settings, "LLM_ATTEMPT_TIMEOUT", 0.05)
+        monkeypatch.setattr(logger_settings, "LLM_DEADLINE", 0.5)
+        monkeypatch.setattr(logger_settings, "LLM_MAX_ATTEMPTS", 2)
+        monkeypatch.setattr(logger_settings, "LLM_RETRY_BASE_DELAY", 0.01)
+        monkeypatch.setattr(logger_settings, "LLM_HEDGE_ENABLED", False)
+        monkeypatch.setattr(logger_settings, "LLM_BREAKER_MIN_CALLS", 2)
+        stuck = create_fake_openai_app(latency="fixed:5", error_rate=0, rate_limit_rate=0, response_file="")
+        retries = Metrics.counter("llm.retries", model="gpt-4-turbo")
+
+        started = time.monotonic()
+        timed_out, rejected = asyncio.run(chat_against(stuck, calls=2))
+        assert time.monotonic() - started < 1.0
+        assert isinstance(timed_out, asyncio.TimeoutError)
+        assert Metrics.counter("llm.retries", model="gpt-4-turbo") == retries + 1
+        # Both timed-out attempts counted against the upstream
+        assert isinstance(rejected, CircuitOpenError)
+
+    @pytest.mark.operation
+    def test_slow_attempt_is_hedged(self, monkeypatch):
+        monkeypatch.setattr(logger_settings, "LLM_HEDGE_AFTER_MS", 100.0)
+        monkeypatch.setattr(logger_settings, "LLM_HEDGE_MIN_MS", 0.0)
+        # Seed 2 makes the first call take ~0.57s and the hedge ~0.04s
+        app = create_fake_openai_app(latency="uniform:0.01:0.6", error_rate=0, rate_limit_rate=0, response_file="", seed=2)
+        won = Metrics.counter("llm.hedge_won", model="gpt-4-turbo")
+
+        started = time.monotonic()
+        (response,) = asyncio.run(chat_against(app))
+        assert time.monotonic() - started < 0.4
+        assert response.choices[0].message.content.startswith('{"executive_summary"')
+        assert Metrics.counter("llm.hedge_won", model="gpt-4-turbo") == won + 1
@@ -0,0 +1,70 @@
+import asyncio
+import httpx
+import openai
+import pytest
+from app.core.config import logger_settings
+from app.schemas.insight_schema import DaycareInput
+from app.services.fallback_insight_service import FallbackInsightService, RECOMMENDATION_COUNT
+from app.services.insight_generation_service import InsightGenerationService
+from app.services.llm_service import LlmService
+from utils.loadtest.fake_openai import DEFAULT_RESPONSE, create_fake_openai_app
+from utils.loadtest.harness import SAMPLE_INPUT
+
+'''
+    to run specific file: pytest -v tests/test_dashboard/test_fallback_insight.py
+'''
+
+LOSING_CENTER = {
+    "businessName": "Little Steps",
+    "revenueSources": [{"sourceName": "Tuition", "monthlyAmount": 9000.0, "tag": "tuition"}],
+    "employees": [{"expenseName": "Teachers", "monthlyAmount": 12000.0, "type": "salary"}],
+    "facilities": [{"expenseName": "Rent", "monthlyAmount": 3000.0, "type": "fixed"}],
+    "classrooms": [{"name": "Toddlers", "capacity": 20, "ratio": 6.0, "avgStudents": 9}],
+    "goals": [{"goal": "Break even", "targetPercentage": 100.0}],
+}
+
+class TestFallbackInsight:
+    @pytest.mark.simple
+    def test_template_insight_has_the_report_shape(self):
+        insight = FallbackInsightService.build(LOSING_CENTER)
+
+        assert insight["degraded"] is True
+        assert set(insight) == {
+            "net_monthly_income", "break_even_enrollment", "largest_expense", "capacity_utilization",
+            "executive_summary", "degraded",
+        }
+        summary = insight["executive_summary"]
+        assert summary["profitability_status"] == "Not profitable, losing $6,000.00 each month."
+        assert len(summary["recommendations"]) == RECOMMENDATION_COUNT
+        # Loss, then break-even enrollment (15 of 20 seats), then low utilization
+        assert summary["recommendations"][0].startswith("Employees is 80.0% of expenses")
+        assert summary["recommendations"][1] == "Enroll 6 more student(s) to reach break-even."
+        assert "11 open seat(s)" in summary["recommendations"][2]
+
+    @pytest.mark.operation
+    def test_late_model_degrades_then_upgrades(self, monkeypatch):
+        monkeypatch.setattr(logger_settings, "INSIGHT_DEADLINE", 0.05)
+        monkeypatch.setattr(logger_settings, "INSIGHT_CACHE_ENABLED", False)
+        upgrades = []
+        monkeypatch.setattr(InsightGenerationService, "upgrade_later",
+                            lambda generation, *args: upgrades.append(generation))
+        app = create_fake_openai_app(latency="fixed:0.3", error_rate=0, rate_limit_rate=0, response_file="")
+
+        async def run():
+            await LlmService.startup().close()
+            LlmService._client = openai.AsyncOpenAI(
+                api_key="test", base_url="http://fake-openai/v1", max_retries=0,
+                http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=app)),
+            )
+            try:
+                degraded, _ = await InsightGenerationService.within_deadline(DaycareInput(**SAMPLE_INPUT))
+                upgraded, _ = await upgrades[0]
+                return degraded, upgraded
+            finally:
+                await LlmService.shutdown()
+
+        degraded, upgraded = asyncio.run(run())
+        assert degraded["degraded"] is True
+        assert "degraded" not in upgraded
+        assert upgraded["executive_summary"] == DEFAULT_RESPONSE["executive_summary"]
+        assert upgraded["net_monthly_income"] == degraded["net_monthly_income"]
@@ -0,0 +1,85 @@
+import asyncio
+import copy
+import json
+import httpx
+import openai
+import pytest
+from app.core.metrics import Metrics
+from app.schemas.insight_schema import DaycareInput
+from app.services.insight_generation_service import InsightGenerationService, changed_sections
+from app.services.kpi_service import KpiService
+from app.services.llm_service import LlmService
+from app.services.prompt_service import InsightPromptService
+from utils.loadtest.fake_openai import create_fake_openai_app
+from utils.loadtest.harness import SAMPLE_INPUT
+
+'''
+    to run specific file: pytest -v tests/test_dashboard/test_incremental_insight.py
+'''
+
+PREVIOUS_SUMMARY = {
+    "financial_overview": "Revenue covers expenses.",
+    "profitability_status": "Profitable.",
+    "enrollment_status": "Nearly full.",
+    "recommendations": ["a", "b", "c", "d"],
+}
+
+def edited(**changes):
+    data = copy.deepcopy(SAMPLE_INPUT)
+    data.update(changes)
+    return data
+
+class TestIncrementalInsight:
+    @pytest.mark.simple
+    def test_changes_map_to_dependent_sections(self):
+        goals = [{"goal": "Hire a cook", "targetPercentage": 5.0}]
+        supplies = [{"expenseName": "Food", "monthlyAmount": 2500.0, "type": "variable"}]
+        reordered = edited(classrooms=[dict(room, id=str(n)) for n, room in enumerate(reversed(SAMPLE_INPUT["classrooms"]))])
+
+        assert changed_sections(SAMPLE_INPUT, edited(goals=goals)) == ["recommendations"]
+        assert changed_sections(SAMPLE_INPUT, edited(supplies=supplies)) == [
+            "financial_overview", "profitability_status", "recommendations"
+        ]
+        assert changed_sections(SAMPLE_INPUT, reordered) == []
+        assert len(changed_sections(SAMPLE_INPUT, edited(businessName="Renamed"))) == 4
+
+    @pytest.mark.simple
+    def test_partial_prompt_carries_only_what_the_sections_need(self):
+        kpis, totals = KpiService.compute(SAMPLE_INPUT), KpiService.totals(SAMPLE_INPUT)
+        _, full_tokens = InsightPromptService.build(SAMPLE_INPUT, kpis, totals)
+        messages, tokens = InsightPromptService.build_partial(
+            SAMPLE_INPUT, kpis, totals, ["recommendations"], PREVIOUS_SUMMARY
+        )
+        prompt = messages[-1]["content"]
+
+        assert tokens < full_tokens
+        assert "BUSINESS GOALS" in prompt and "EXPENSES BY CATEGORY" not in prompt
+        assert '{"recommendations":["string","string","string","string"]}' in prompt
+        assert '"financial_overview":"Revenue covers expenses."' in prompt
+
+    @pytest.mark.operation
+    def test_regenerate_merges_rewritten_sections(self, tmp_path):
+        answer = tmp_path / "answer.json"
+        answer.write_text(json.dumps({"recommendations": ["w", "x", "y", "z"]}))
+        app = create_fake_openai_app(latency="fixed:0", error_rate=0, rate_limit_rate=0, response_file=str(answer))
+        basis = {"input": DaycareInput(**SAMPLE_INPUT).dict(), "executive_summary": PREVIOUS_SUMMARY}
+        saved = Metrics.counter("insight.tokens_saved")
+
+        async def run():
+            await LlmService.startup().close()
+            LlmService._client = openai.AsyncOpenAI(
+                api_key="test", base_url="http://fake-openai/v1", max_retries=0,
+                http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=app)),
+            )
+            try:
+                goals = [{"goal": "Hire a cook", "targetPercentage": 5.0}]
+                return await InsightGenerationService.regenerate(DaycareInput(**edited(goals=goals)), basis)
+            finally:
+                await LlmService.shutdown()
+
+        insight, model = asyncio.run(run())
+        # The basis does not say which model wrote the other sections
+        assert model is None
+        assert insight["executive_summary"] == {**PREVIOUS_SUMMARY, "recommendations": ["w", "x", "y", "z"]}
+        assert insight["net_monthly_income"] == KpiService.compute(SAMPLE_INPUT)["net_monthly_income"]
+        assert Metrics.counter("insight.tokens_saved") > saved
@@ -0,0 +1,78 @@
+import asyncio
+import json
+import httpx
+import openai
+import pytest
+from app.services.insight_stream_service import IncrementalJsonParser, InsightStreamService
+
+'''
+    to run specific file: pytest -v tests/test_dashboard/test_insight_stream.py
+'''
+
+SUMMARY = {
+    "executive_summary": {
+        "financial_overview": "Profitable, with a \"healthy\" margin {of} 20%.",
+        "recommendations": ["Raise tuition", "Fill the toddler room"],
+    }
+}
+
+def completion_chunks(content: str, size: int):
+    for start in range(0, len(content), size):
+        yield {
+            "id": "chatcmpl-test",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "gpt-4-turbo",
+            "choices": [{"index": 0, "delta": {"content": content[start:start + size]}, "finish_reason": None}],
+        }
+
+def fake_openai(content: str, size: int = 7) -> openai.AsyncOpenAI:
+    """
+    An OpenAI client whose HTTP transport streams `content` back as canned SSE chunks.
+    """
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert json.loads(request.content)["stream"] is True
+        body = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in completion_chunks(content, size))
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=(body + "data: [DONE]\n\n").encode())
+    return openai.AsyncOpenAI(api_key="test", http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+class TestInsightStream:
+    @pytest.mark.simple
+    def test_parser_reports_members_as_they_complete(self):
+        parser = IncrementalJsonParser()
+        document = 'Sure! {"a": {"b": [1, "x}"]}, "c": "d,e", "f": 2.5}'
+        seen = []
+        for char in document:
+            seen.append(parser.feed(char))
+        parser.close()
+
+        completed = [(index, member) for index, members in enumerate(seen) for member in members]
+        assert [member for _, member in completed] == [("a", {"b": [1, "x}"]}), ("c", "d,e"), ("f", 2.5)]
+        # "a" is reported at the comma after it, not at the end of the document
+        assert completed[0][0] == document.index(', "c"')
+
+    @pytest.mark.simple
+    def test_parser_rejects_truncated_stream(self):
+        parser = IncrementalJsonParser()
+        parser.feed('{"a": 1, "b": [')
+        with pytest.raises(ValueError):
+            parser.close()
+
+    @pytest.mark.operation
+    def test_generate_streams_kpis_then_summary(self):
+        kpis = {"net_monthly_income": {"value": 100}, "capacity_utilization": {"value": 80.0}}
+
+        async def run():
+            client = fake_openai(json.dumps(SUMMARY))
+            return [section async for section in InsightStreamService.generate(client, "gpt-4-turbo", kpis, [])]
+
+        sections = asyncio.run(run())
+        assert sections == list(kpis.items()) + [("executive_summary", SUMMARY["executive_summary"])]
+
+    @pytest.mark.operation
+    def test_generate_wraps_unwrapped_summary(self):
+        async def run():
+            client = fake_openai(json.dumps(SUMMARY["executive_summary"]), size=3)
+            return [section async for section in InsightStreamService.generate(client, "gpt-4-turbo", {}, [])]
+
+        assert asyncio.run(run()) == [("executive_summary", SUMMARY["executive_summary"])]
@@ -0,0 +1,48 @@
+import pytest
+from app.services.kpi_service import KpiService
+
+'''
+    to run specific file: pytest -v tests/test_dashboard/test_kpi.py
+'''
+
+CENTER = {
+    "revenueSources": [{"sourceName": "Tuition", "monthlyAmount": 24000.0}, {"sourceName": "Meals", "monthlyAmount": 0.1}],
+    "employees": [{"expenseName": "Teachers", "monthlyAmount": 14000.0}],
+    "facilities": [{"expenseName": "Rent", "monthlyAmount": 5000.0}],
+    "administrative": [{"expenseName": "Software", "monthlyAmount": 0.2}],
+    "supplies": [{"expenseName": "Food", "monthlyAmount": 1000.0}],
+    "classrooms": [{"name": "Infants", "capacity": 10, "avgStudents": 8}, {"name": "Toddlers", "capacity": 20, "avgStudents": 16}],
+}
+
+class TestKpis:
+    @pytest.mark.simple
+    def test_metrics_are_exact(self):
+        kpis = KpiService.compute(CENTER)
+
+        assert kpis["net_monthly_income"]["value"] == 3999.9
+        # 20000.2 / (24000.1 / 24 students) = 20.0001... -> 21 students
+        assert kpis["break_even_enrollment"]["value"] == 21
+        assert kpis["largest_expense"]["category"] == "Employees"
+        assert kpis["largest_expense"]["percentage_of_total_expenses"] == 70.0
+        assert kpis["capacity_utilization"]["value"] == 80.0
+
+    @pytest.mark.simple
+    def test_empty_input_does_not_divide_by_zero(self):
+        kpis = KpiService.compute({})
+
+        assert kpis["break_even_enrollment"]["value"] == 0
+        assert kpis["capacity_utilization"]["value"] == 0.0
+        assert kpis["largest_expense"]["category"] == "None"
+
+    @pytest.mark.simple
+    def test_portfolio_combines_centers(self):
+        losing = dict(CENTER, revenueSources=[{"sourceName": "Tuition", "monthlyAmount": 10000.0}])
+        portfolio = KpiService.portfolio([("A", CENTER), ("B", losing)])
+
+        assert portfolio["centers"] == 2
+        assert portfolio["profitable_centers"] == 1
+        assert portfolio["unprofitable_centers"] == 1
+        assert portfolio["net_monthly_income"]["value"] == round(3999.9 - 10000.2, 2)
+        assert portfolio["capacity_utilization"]["value"] == 80.0
+        assert [center["name"] for center in portfolio["top_centers"]] == ["A", "B"]
+        assert portfolio["bottom_centers"][0]["name"] == "B"
@@ -0,0 +1,264 @@
+import asyncio
+import json
+from collections import deque
+import httpx
+import openai
+import pytest
+import time
+from app.core.config import logger_settings
+from app.core.metrics import Metrics
+from app.prompts.tokens import count_message_tokens
+from app.schemas.insight_schema import DaycareInput
+from app.services.insight_cache_service import InsightCacheService
+from app.services.insight_generation_service import InsightGenerationService
+from app.services.llm_service import LlmQueueTimeoutError, LlmService, estimate_tokens
+from app.services.llm_usage_service import LlmUsageService, MODEL_PRICES, estimate_cost, model_price
+from app.services.model_router_service import ModelRouter
+from utils.loadtest.harness import SAMPLE_INPUT
+
+'''
+    to run specific file: pytest -v tests/test_dashboard/test_llm.py
+'''
+
+class TestLlmService:
+    @pytest.mark.simple
+    def test_estimate_includes_completion_budget(self):
+        messages = [{"role": "system", "content": "x" * 40}, {"role": "user", "content": "y" * 400}]
+        assert estimate_tokens(messages, 600) == count_message_tokens(messages) + 600 > 600 + 110
+
+    @pytest.mark.operation
+    def test_admit_bounds_concurrency_in_arrival_order(self, monkeypatch):
+        monkeypatch.setattr(logger_settings, "LLM_MAX_CONCURRENCY", 2)
+        running = {"now": 0, "peak": 0}
+        started = []
+
+        async def call(number):
+            async with LlmService.admit([{"role": "user", "content": "hi"}], 10):
+                started.append(number)
+                running["now"] += 1
+                running["peak"] = max(running["peak"], running["now"])
+                await asyncio.sleep(0.01)
+                running["now"] -= 1
+
+        async def run():
+            LlmService.startup()
+            try:
+                await asyncio.gather(*[call(number) for number in range(8)])
+            finally:
+                await LlmService.shutdown()
+
+        asyncio.run(run())
+        assert running["peak"] == 2
+        assert started == list(range(8))
+        gauges = Metrics.snapshot()["gauges"]
+        assert gauges["llm.queue_depth"] == 0 and gauges["llm.in_flight"] == 0
+
+    @pytest.mark.operation
+    def test_queue_wait_does_not_count_against_the_model(self, monkeypatch):
+        monkeypatch.setattr(logger_settings, "LLM_MAX_CONCURRENCY", 1)
+        monkeypatch.setattr(logger_settings, "LLM_QUEUE_TIMEOUT", 0.05)
+        monkeypatch.setattr(LlmService, "_breakers", {})
+        ModelRouter.reset()
+        messages = [{"role": "user", "content": "hi"}]
+
+        async def run():
+            LlmService.startup()
+            try:
+                # Another call holds the only slot for longer than the queue timeout
+                async with LlmService.admit(messages, 10):
+                    with pytest.raises(LlmQueueTimeoutError):
+                        await LlmService.chat(messages, "gpt-4o", 10)
+                return LlmService.breaker("gpt-4o")
+            finally:
+                await LlmService.shutdown()
+
+        breaker = asyncio.run(run())
+        assert breaker.results == deque() and breaker.state == "closed"
+        assert "gpt-4o" not in ModelRouter._stats
+
+class TestLlmUsage:
+    @pytest.mark.simple
+    def test_cost_uses_longest_price_prefix_and_cache_discount(self):
+        assert model_price("gpt-4o-mini-2024-07-18") == MODEL_PRICES["gpt-4o-mini"]
+        assert model_price("gpt-4o-2024-08-06") == MODEL_PRICES["gpt-4o"]
+        assert model_price("unknown-model") is None
+        # 1000 fresh + 1000 cached prompt tokens at 2.5 / 1.25 $/M, 500 completion at 10 $/M
+        assert estimate_cost("gpt-4o", 2000, 1000, 500) == pytest.approx(0.00875)
+
+    @pytest.mark.operation
+    def test_chat_records_usage_and_json_failures(self):
+        completion = {
+            "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": "gpt-4o",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "{not json"}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 120, "completion_tokens": 30, "total_tokens": 150,
+                      "prompt_tokens_details": {"cached_tokens": 100}},
+        }
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, json=completion))
+        messages = [{"role": "user", "content": "hi"}]
+
+        async def run():
+            # Real limits and slots, answered by the mock transport
+            await LlmService.startup().close()
+            LlmService._client = openai.AsyncOpenAI(
+                api_key="test", base_url="http://fake-openai/v1", http_client=httpx.AsyncClient(transport=transport)
+            )
+            try:
+                with pytest.raises(json.JSONDecodeError):
+                    async with LlmUsageService.track("gpt-4o", "test", "usage@example.com") as call:
+                        response = await LlmService.chat(messages, "gpt-4o", 50, call=call)
+                        json.loads(response.choices[0].message.content)
+                return call
+            finally:
+                await LlmService.shutdown()
+
+        call = asyncio.run(run())
+        assert call.outcome == "json_error"
+        assert (call.prompt_tokens, call.completion_tokens, call.cached_tokens) == (120, 30, 100)
+        assert call.network_ms > 0
+        counters = Metrics.snapshot()["counters"]
+        assert counters["llm.calls{model=gpt-4o,operation=test,outcome=json_error}"] >= 1
+        assert counters["llm.tokens{kind=cached,model=gpt-4o}"] >= 100
+
+class TestModelRouter:
+    @pytest.fixture(autouse=True)
+    def models(self, monkeypatch):
+        monkeypatch.setattr(logger_settings, "MODEL", "gpt-4-turbo")
+        monkeypatch.setattr(logger_settings, "LLM_FALLBACK_MODELS", ["gpt-4o"])
+        monkeypatch.setattr(logger_settings, "LLM_SMALL_MODEL", "gpt-4o-mini")
+        monkeypatch.setattr(logger_settings, "LLM_SMALL_PROMPT_TOKENS", 1000)
+        monkeypatch.setattr(logger_settings, "LLM_PREMIUM_USERS", ["vip@example.com"])
+        monkeypatch.setattr(logger_settings, "LLM_ROUTER_MIN_SAMPLES", 5)
+        monkeypatch.setattr(LlmService, "_breakers", {})
+        ModelRouter.reset()
+        yield
+        ModelRouter.reset()
+
+    @pytest.mark.simple
+    def test_size_and_tier_pick_the_first_model(self):
+        assert ModelRouter.route(500, "someone@example.com") == ["gpt-4o-mini", "gpt-4-turbo", "gpt-4o"]
+        assert ModelRouter.route(500, "vip@example.com") == ["gpt-4-turbo", "gpt-4o", "gpt-4o-mini"]
+        assert ModelRouter.route(2500, "someone@example.com")[0] == "gpt-4-turbo"
+
+    @pytest.mark.simple
+    def test_cached_answers_are_served_only_from_models_up_to_the_primary(self):
+        assert ModelRouter.cacheable(500, "someone@example.com") == ["gpt-4o-mini", "gpt-4-turbo"]
+        assert ModelRouter.cacheable(500, "vip@example.com") == ["gpt-4-turbo"]
+        assert ModelRouter.cacheable(2500, "someone@example.com") == ["gpt-4-turbo"]
+
+    @pytest.mark.operation
+    def test_small_model_insight_is_not_served_to_premium_users(self, monkeypatch):
+        monkeypatch.setattr(logger_settings, "LLM_SMALL_PROMPT_TOKENS", 100000)
+        store = {}
+
+        async def get(key):
+            return store.get(key)
+
+        async def put(key, model, prompt_version, insight):
+            store[key] = insight
+
+        async def ask_model(model, messages, max_tokens, user_email=None, operation="insight"):
+            return {"written_by": model}
+
+        monkeypatch.setattr(InsightCacheService, "get", get)
+        monkeypatch.setattr(InsightCacheService, "put", put)
+        monkeypatch.setattr(InsightGenerationService, "ask_model", ask_model)
+        data = DaycareInput(**SAMPLE_INPUT)
+
+        async def run():
+            return [await InsightGenerationService.cached(data, user_email=user_email) for user_email in (
+                "someone@example.com", "vip@example.com", "vip@example.com", "other@example.com"
+            )]
+
+        assert [(insight["executive_summary"]["written_by"], cache_status) for insight, cache_status in asyncio.run(run())] == [
+            ("gpt-4o-mini", "miss"), ("gpt-4-turbo", "miss"), ("gpt-4-turbo", "hit"), ("gpt-4o-mini", "hit")
+        ]
+
+    @pytest.mark.simple
+    def test_unhealthy_models_are_skipped_and_slow_ones_go_last(self, monkeypatch):
+        monkeypatch.setattr(logger_settings, "LLM_LATENCY_SLO_MS", 1000.0)
+        for _ in range(5):
+            ModelRouter.observe("gpt-4o-mini", ok=False)
+            ModelRouter.observe("gpt-4-turbo", ok=True, latency_ms=4000.0)
+        assert ModelRouter.route(500, "someone@example.com") == ["gpt-4o", "gpt-4-turbo"]
+
+        LlmService.breaker("gpt-4o")._open(time.monotonic())
+        assert ModelRouter.route(500, "someone@example.com") == ["gpt-4-turbo"]
+        stats = ModelRouter.stats()
+        assert stats["gpt-4o"]["circuit"] == "open"
+        assert stats["gpt-4o-mini"]["error_rate"] == 1.0
+        assert stats["gpt-4-turbo"]["p95_ms"] == 4000.0
+
+    @pytest.mark.operation
+    def test_ask_fails_over_to_the_next_model(self, monkeypatch):
+        monkeypatch.setattr(logger_settings, "LLM_MAX_ATTEMPTS", 1)
+        served = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            model = json.loads(request.content)["model"]
+            served.append(model)
+            if model == "gpt-4o-mini":
+                return httpx.Response(500, json={"error": {"message": "down", "type": "server_error"}})
+            return httpx.Response(200, json={
+                "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": '{"recommendations":["a"]}'}, "finish_reason": "stop"}],
+            })
+
+        async def run():
+            await LlmService.startup().close()
+            LlmService._client = openai.AsyncOpenAI(
+                api_key="test", base_url="http://fake-openai/v1", max_retries=0,
+                http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+            )
+            try:
+                return await InsightGenerationService.ask([{"role": "user", "content": "hi"}], 50, "someone@example.com")
+            finally:
+                await LlmService.shutdown()
+
+        failovers = Metrics.counter("llm.failover", model="gpt-4o-mini")
+        assert asyncio.run(run()) == ({"recommendations": ["a"]}, "gpt-4-turbo")
+        assert served == ["gpt-4o-mini", "gpt-4-turbo"]
+        assert Metrics.counter("llm.failover", model="gpt-4o-mini") == failovers + 1
+        assert ModelRouter.stats()["gpt-4o-mini"]["error_rate"] == 1.0
+
+    @pytest.mark.operation
+    def test_stalled_stream_fails_over_before_the_first_section(self, monkeypatch):
+        monkeypatch.setattr(logger_settings, "LLM_STREAM_IDLE_TIMEOUT", 0.05)
+        monkeypatch.setattr(logger_settings, "LLM_MAX_ATTEMPTS", 1)
+        served = []
+
+        async def stalled():
+            await asyncio.sleep(5)
+            yield b""
+
+        def chunk(model, content):
+            return "data: " + json.dumps({
+                "id": "chatcmpl-1", "object": "chat.completion.chunk", "created": 0, "model": model,
+                "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}],
+            }) + "\n\n"
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            model = json.loads(request.content)["model"]
+            served.append(model)
+            headers = {"content-type": "text/event-stream"}
+            if model == "gpt-4o-mini":
+                return httpx.Response(200, headers=headers, content=stalled())
+            body = chunk(model, '{"executive_summary": {"recommendations": ["a"]}}') + "data: [DONE]\n\n"
+            return httpx.Response(200, headers=headers, content=body.encode("utf-8"))
+
+        async def run():
+            await LlmService.startup().close()
+            LlmService._client = openai.AsyncOpenAI(
+                api_key="test", base_url="http://fake-openai/v1", max_retries=0,
+                http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+            )
+            try:
+                return [item async for item in InsightGenerationService.stream_summary(
+                    [{"role": "user", "content": "hi"}], "someone@example.com"
+                )]
+            finally:
+                await LlmService.shutdown()
+
+        started = time.monotonic()
+        assert asyncio.run(run()) == [("gpt-4-turbo", "executive_summary", {"recommendations": ["a"]})]
+        assert time.monotonic() - started < 1.0
+        assert served == ["gpt-4o-mini", "gpt-4-turbo"]
@@ -0,0 +1,70 @@
+import json
+import os
+import pytest
+from app.core.config import logger_settings
+from app.prompts.registry import PromptRegistry, PromptTemplate
+from app.services.kpi_service import KpiService
+from app.services.prompt_service import InsightPromptService, top_items
+
+'''
+    to run specific file: pytest -v tests/test_dashboard/test_prompt.py
+'''
+
+def center(line_items: int):
+    return {
+        "businessName": "Sunny Days",
+        "revenueSources": [{"sourceName": "Tuition", "monthlyAmount": 30000.0, "tag": "tuition"}],
+        "employees": [{"expenseName": f"Aide {n}", "monthlyAmount": 100.0 + n, "type": "staff"} for n in range(line_items)],
+        "facilities": [{"expenseName": "Rent", "monthlyAmount": 5000.0, "type": "fixed"}],
+        "administrative": [],
+        "supplies": [],
+        "classrooms": [{"name": "Infants", "capacity": 10, "ratio": 4.0, "avgStudents": 8}],
+        "operatingHours": 10.0,
+        "operatingDays": 22.0,
+        "goals": [{"goal": "Grow enrollment", "targetPercentage": 10.0}],
+    }
+
+def build(data):
+    return InsightPromptService.build(data, KpiService.compute(data), KpiService.totals(data))
+
+class TestPrompt:
+    @pytest.mark.simple
+    def test_template_compiles_fields_and_rejects_expressions(self):
+        template = PromptTemplate("t", "Hi {name}, {{literal}} {count}")
+        assert template.fields == {"name", "count"}
+        assert template.render(name="A", count=2) == "Hi A, {literal} 2"
+        with pytest.raises(KeyError):
+            template.render(name="A")
+        with pytest.raises(ValueError):
+            PromptTemplate("t", "{data.businessName}")
+
+    @pytest.mark.operation
+    def test_registry_reloads_when_the_file_changes(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(logger_settings, "PROMPT_DIR", str(tmp_path))
+        path = tmp_path / "greeting.txt"
+        path.write_text("Hello {name}")
+        first = PromptRegistry.get("greeting")
+        assert PromptRegistry.get("greeting") is first
+
+        path.write_text("Goodbye {name}")
+        os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 1_000_000))
+        assert PromptRegistry.render("greeting", name="Ann") == "Goodbye Ann"
+
+    @pytest.mark.simple
+    def test_top_items_keeps_the_total(self):
+        rows = [["a", 5], ["b", 1], ["c", 3], ["d", 2]]
+        assert top_items(rows, 2) == [["a", 5], ["c", 3], ["2 other items", 3]]
+        assert top_items(rows, None) == [["a", 5], ["c", 3], ["d", 2], ["b", 1]]
+
+    @pytest.mark.operation
+    def test_long_expense_lists_are_aggregated_to_fit_the_budget(self, monkeypatch):
+        monkeypatch.setattr(logger_settings, "PROMPT_TOKEN_BUDGET", 1200)
+        small_messages, small_tokens = build(center(3))
+        large_messages, large_tokens = build(center(400))
+
+        assert '"Aide 2"' in small_messages[1]["content"] and ", " not in small_messages[1]["content"].split("KEY METRICS")[0]
+        assert large_tokens <= 1200 < small_tokens + 400 * 5
+        expenses = json.loads(large_messages[1]["content"].split("largest first:\n")[2].split("\n")[0])
+        employees = expenses["Employees"]
+        assert employees[0] == ["Aide 399", 499] and employees[-1][0].endswith("other items")
+        assert sum(row[1] for row in employees) == pytest.approx(sum(100.0 + n for n in range(400)))
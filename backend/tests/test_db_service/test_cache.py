@@ -0,0 +1,68 @@
+import asyncio
+import pytest
+from app.services.cache_service import CacheService, LocalTTLCache
+from app.services.redis_service import RedisService, InMemoryRedis
+
+'''
+    to run specific file: pytest -v tests/test_db_service/test_cache.py
+'''
+
+@pytest.fixture(autouse=True)
+def memory_redis():
+    """Run every test against the in-memory Redis stand-in with a cold cache."""
+    RedisService._client = InMemoryRedis()
+    CacheService._local.clear()
+    yield
+    RedisService._client = None
+    CacheService._local.clear()
+
+class TestCache:
+    @pytest.mark.simple
+    def test_lru_evicts_oldest(self):
+        cache = LocalTTLCache(max_entries=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("a") == (True, 1)
+        assert cache.get("b") == (False, None)
+        assert len(cache) == 2
+
+    @pytest.mark.operation
+    def test_cold_key_loads_once(self):
+        calls = []
+
+        async def loader():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"value": 42}
+
+        async def run():
+            return await asyncio.gather(*[
+                CacheService.get_or_load("input", "stampede@example.com", loader) for _ in range(20)
+            ])
+
+        results = asyncio.run(run())
+
+        assert len(calls) == 1
+        assert all(result == {"value": 42} for result in results)
+
+    @pytest.mark.operation
+    def test_invalidate_reaches_every_tier(self):
+        values = iter([{"version": 1}, {"version": 2}])
+
+        async def loader():
+            return next(values)
+
+        async def run():
+            first = await CacheService.get_or_load("insight", "writer@example.com", loader)
+            cached = await CacheService.get_or_load("insight", "writer@example.com", loader)
+            await CacheService.invalidate("writer@example.com", "insight")
+            fresh = await CacheService.get_or_load("insight", "writer@example.com", loader)
+            return first, cached, fresh
+
+        first, cached, fresh = asyncio.run(run())
+
+        assert first == cached == {"version": 1}
+        assert fresh == {"version": 2}
@@ -0,0 +1,55 @@
+import json
+import pytest
+from app.core.codec import StorageCodec, CodecError
+from app.services.storage_service import StorageService
+
+'''
+    to run specific file: pytest -v tests/test_db_service/test_codec.py
+'''
+
+SNAPSHOT = {
+    "center_name": "Sunny Days",
+    "rooms": [{"name": f"Room {i}", "capacity": 12, "ratio": "1:4", "tuition": 1450.0} for i in range(20)],
+}
+
+class TestStorageCodec:
+    @pytest.mark.simple
+    def test_round_trip_and_legacy_rows(self):
+        blob = StorageCodec.encode(SNAPSHOT, "zlib", 0)
+
+        assert StorageCodec.header(blob) == (1, "zlib", 0)
+        assert len(blob) < len(json.dumps(SNAPSHOT))
+        assert StorageCodec.decode_row(None, blob) == SNAPSHOT
+        # Rows written before the codec keep their plain JSON in `data`
+        assert StorageCodec.decode_row(json.dumps(SNAPSHOT), None) == SNAPSHOT
+
+    @pytest.mark.operation
+    def test_dictionary_is_required_to_decode(self):
+        samples = [json.dumps({**SNAPSHOT, "center_name": f"Center {i}"}).encode() for i in range(50)]
+        StorageCodec.register_dictionary(7, "zlib", StorageCodec.train_dictionary(samples, "zlib"))
+        try:
+            with_dictionary = StorageCodec.encode(SNAPSHOT, "zlib", 7)
+            without = StorageCodec.encode(SNAPSHOT, "zlib", 0)
+            assert len(with_dictionary) < len(without)
+            assert StorageCodec.decode(with_dictionary) == SNAPSHOT
+        finally:
+            StorageCodec._dictionaries.pop(7, None)
+
+        with pytest.raises(KeyError):
+            StorageCodec.decode(with_dictionary)
+
+    @pytest.mark.simple
+    def test_unknown_format_version_is_rejected(self):
+        blob = StorageCodec.encode(SNAPSHOT, "zlib", 0)
+
+        with pytest.raises(CodecError):
+            StorageCodec.decode(b"\x09" + blob[1:])
+
+    @pytest.mark.simple
+    def test_benchmark_reports_every_codec(self):
+        payloads = [json.dumps(SNAPSHOT).encode()] * 5
+
+        results = {result["codec"]: result for result in StorageService.benchmark(payloads, repeat=1)}
+
+        assert {"json", "zlib", "zlib+dict"} <= set(results)
+        assert results["zlib"]["ratio"] > 1
@@ -0,0 +1,112 @@
+import asyncio
+import time
+import pytest
+from fastapi import HTTPException
+from app.core.config import logger_settings
+from app.services.idempotency_service import IdempotencyService
+from app.services import redis_service
+from app.services.redis_service import InMemoryRedis, RedisService
+
+'''
+    to run specific file: pytest -v tests/test_db_service/test_idempotency.py
+'''
+
+class Counter:
+    def __init__(self, fail: bool = False):
+        self.calls = 0
+        self.fail = fail
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        if self.fail:
+            raise RuntimeError("save failed")
+        return {"call": self.calls}
+
+BODY = {"businessName": "Sunny Days"}
+
+class TestIdempotency:
+    @pytest.fixture(autouse=True)
+    def local_store(self, monkeypatch):
+        monkeypatch.setattr(RedisService, "_client", None)
+        monkeypatch.setattr(IdempotencyService, "_local", InMemoryRedis())
+
+    @pytest.mark.operation
+    def test_retries_and_concurrent_duplicates_run_once(self):
+        call = Counter()
+
+        async def run():
+            concurrent = await asyncio.gather(
+                *[IdempotencyService.run("a@example.com", "save-inputs", "key-1", BODY, call) for _ in range(3)]
+            )
+            retried = await IdempotencyService.run("a@example.com", "save-inputs", "key-1", BODY, call)
+            other_user = await IdempotencyService.run("b@example.com", "save-inputs", "key-1", BODY, call)
+            return concurrent, retried, other_user
+
+        concurrent, retried, other_user = asyncio.run(run())
+        assert [result for result, _ in concurrent] == [{"call": 1}] * 3
+        assert sorted(replayed for _, replayed in concurrent) == [False, True, True]
+        assert retried == ({"call": 1}, True)
+        assert other_user == ({"call": 2}, False)
+        assert call.calls == 2 and IdempotencyService._inflight == {}
+
+    @pytest.mark.operation
+    def test_reused_key_with_another_body_is_rejected(self):
+        call = Counter()
+
+        async def run():
+            await IdempotencyService.run("a@example.com", "save-inputs", "key-1", BODY, call)
+            await IdempotencyService.run("a@example.com", "save-inputs", "key-1", {"businessName": "Other"}, call)
+
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(run())
+        assert error.value.status_code == 422 and call.calls == 1
+
+    @pytest.mark.operation
+    def test_failures_are_not_recorded(self):
+        failing, working = Counter(fail=True), Counter()
+
+        async def run():
+            with pytest.raises(RuntimeError):
+                await IdempotencyService.run("a@example.com", "save-inputs", "key-1", BODY, failing)
+            return await IdempotencyService.run("a@example.com", "save-inputs", "key-1", BODY, working)
+
+        assert asyncio.run(run()) == ({"call": 1}, False)
+
+    @pytest.mark.operation
+    def test_processes_wait_for_the_first_through_redis(self, monkeypatch):
+        monkeypatch.setattr(RedisService, "_client", InMemoryRedis())
+        monkeypatch.setattr(logger_settings, "IDEMPOTENCY_POLL_INTERVAL", 0.01)
+        call = Counter()
+
+        async def run():
+            # Calling _claim directly skips the in-process map, like two separate processes
+            return await asyncio.gather(*[
+                IdempotencyService._claim("caresim:idempotency:key", "digest", "save-inputs", call) for _ in range(2)
+            ])
+
+        results = asyncio.run(run())
+        assert call.calls == 1
+        assert sorted(results, key=lambda result: result[1]) == [({"call": 1}, False), ({"call": 1}, True)]
+
+    @pytest.mark.operation
+    def test_local_records_are_bounded_and_swept(self, monkeypatch):
+        store = InMemoryRedis(max_entries=2)
+        monkeypatch.setattr(IdempotencyService, "_local", store)
+        monkeypatch.setattr(redis_service, "SWEEP_INTERVAL", 0.0)
+        call = Counter()
+
+        async def run(*keys):
+            return [await IdempotencyService.run("a@example.com", "save-inputs", key, BODY, call) for key in keys]
+
+        asyncio.run(run("key-1", "key-2", "key-3"))
+        # The least recently used record was evicted, so its retry runs again
+        assert len(store._data) == 2
+        assert asyncio.run(run("key-1"))[0] == ({"call": 4}, False)
+
+        monkeypatch.setattr(logger_settings, "IDEMPOTENCY_TTL_HOURS", 0.01 / 3600)
+        asyncio.run(run("key-4"))
+        time.sleep(0.05)
+        # Expired records go on the next write, even though nobody read them
+        asyncio.run(run("key-5"))
+        assert sorted(key.rsplit(":", 1)[1] for key in store._data) == ["key-1", "key-5"]
@@ -0,0 +1,57 @@
+import asyncio
+import pytest
+from app.core.config import logger_settings
+from app.services.insight_cache_service import InsightCacheService, input_hash
+from utils.vapor.engine.scheduler import start_maintenance_scheduler
+
+'''
+    to run specific file: pytest -v tests/test_db_service/test_insight_cache.py
+'''
+
+def payload(revenue, classrooms):
+    return {"businessName": "Little Oaks ", "revenueSources": revenue, "classrooms": classrooms, "operatingHours": 10.0}
+
+TUITION = {"id": "a1", "sourceName": "Tuition", "monthlyAmount": 12000.0, "tag": "core"}
+GRANT = {"id": "b2", "sourceName": "Grant", "monthlyAmount": 800.0, "tag": "other"}
+ROOM = {"id": "r1", "name": "Toddlers", "capacity": 12, "ratio": 4.0, "avgStudents": 10}
+
+class TestInsightCacheKey:
+    @pytest.mark.simple
+    def test_ids_and_list_order_do_not_change_the_key(self):
+        first = input_hash(payload([TUITION, GRANT], [ROOM]), "gpt-4-turbo", "1")
+        reordered = input_hash(
+            payload([{**GRANT, "id": "x9"}, {**TUITION, "id": None}], [{**ROOM, "id": "r7"}]),
+            "gpt-4-turbo", "1"
+        )
+
+        assert first == reordered
+
+    @pytest.mark.simple
+    def test_content_model_and_prompt_version_change_the_key(self):
+        base = input_hash(payload([TUITION], [ROOM]), "gpt-4-turbo", "1")
+
+        assert base != input_hash(payload([{**TUITION, "monthlyAmount": 12500.0}], [ROOM]), "gpt-4-turbo", "1")
+        assert base != input_hash(payload([TUITION], [ROOM]), "gpt-4o", "1")
+        assert base != input_hash(payload([TUITION], [ROOM]), "gpt-4-turbo", "2")
+
+class TestInsightCachePurge:
+    @pytest.mark.operation
+    def test_purge_is_scheduled_without_retention(self, monkeypatch):
+        monkeypatch.setattr(logger_settings, "SNAPSHOT_RETENTION_ENABLED", False)
+
+        async def run():
+            scheduler = start_maintenance_scheduler()
+            try:
+                return [job.func for job in scheduler.get_jobs()]
+            finally:
+                scheduler.shutdown(wait=False)
+
+        assert InsightCacheService.purge in asyncio.run(run())
+
+    @pytest.mark.operation
+    def test_purge_survives_an_unavailable_database(self, monkeypatch):
+        async def unavailable():
+            raise ConnectionError("no database")
+
+        monkeypatch.setattr(InsightCacheService, "purge_expired", unavailable)
+        assert asyncio.run(InsightCacheService.purge()) is None
@@ -0,0 +1,92 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from app.core.config import logger_settings
+from app.services.job_service import JobService, SUCCEEDED, DEAD
+
+'''
+    to run specific file: pytest -v tests/test_db_service/test_jobs.py
+'''
+
+async def wait_for(job_id, states=(SUCCEEDED, DEAD)):
+    for _ in range(500):
+        job = await JobService.get(job_id)
+        if job["status"] in states:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+@pytest.fixture
+def jobs(monkeypatch):
+    monkeypatch.setattr(logger_settings, "JOB_BACKEND", "memory")
+    monkeypatch.setattr(logger_settings, "JOB_WORKERS", 3)
+    monkeypatch.setattr(logger_settings, "JOB_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(logger_settings, "JOB_RETRY_BASE_DELAY", 0.02)
+    monkeypatch.setattr(logger_settings, "JOB_MAX_ACTIVE_PER_USER", 1)
+    monkeypatch.setattr(logger_settings, "JOB_MAX_QUEUED_PER_USER", 2)
+    yield JobService
+    JobService._handlers.pop("test", None)
+
+class TestJobs:
+    @pytest.mark.operation
+    def test_retries_then_succeeds_or_dead_letters(self, jobs):
+        calls = {}
+
+        async def handler(payload, user_email):
+            calls[payload["name"]] = calls.get(payload["name"], 0) + 1
+            if payload["name"] == "bad-input":
+                raise HTTPException(status_code=422, detail="invalid")
+            if calls[payload["name"]] < payload["fail_times"] + 1:
+                raise RuntimeError("upstream timeout")
+            return {"ok": payload["name"]}
+
+        async def run():
+            jobs.register("test", handler)
+            await jobs.startup()
+            try:
+                flaky = await jobs.submit("test", "a@example.com", {"name": "flaky", "fail_times": 2})
+                broken = await jobs.submit("test", "b@example.com", {"name": "broken", "fail_times": 99})
+                invalid = await jobs.submit("test", "c@example.com", {"name": "bad-input", "fail_times": 0})
+                return await wait_for(flaky["id"]), await wait_for(broken["id"]), await wait_for(invalid["id"]), jobs.backend()
+            finally:
+                await jobs.shutdown()
+
+        flaky, broken, invalid, backend = asyncio.run(run())
+        assert flaky["status"] == SUCCEEDED and flaky["attempts"] == 3 and flaky["result"] == {"ok": "flaky"}
+        assert broken["status"] == DEAD and broken["attempts"] == 3 and broken["error"] == "upstream timeout"
+        # Client errors are not retried
+        assert invalid["status"] == DEAD and invalid["attempts"] == 1
+        assert set(backend.dead_letters) == {broken["id"], invalid["id"]}
+
+    @pytest.mark.operation
+    def test_per_user_caps(self, jobs):
+        running = {"now": 0, "peak": 0}
+
+        async def handler(payload, user_email):
+            running["now"] += 1
+            running["peak"] = max(running["peak"], running["now"])
+            await asyncio.sleep(0.03)
+            running["now"] -= 1
+            return payload
+
+        async def run():
+            jobs.register("test", handler)
+            await jobs.startup()
+            try:
+                first = await jobs.submit("test", "a@example.com", {"n": 1})
+                second = await jobs.submit("test", "a@example.com", {"n": 2})
+                with pytest.raises(HTTPException) as rejected:
+                    await jobs.submit("test", "a@example.com", {"n": 3})
+                results = [await wait_for(first["id"]), await wait_for(second["id"])]
+                # Finished jobs free up the user's queue slots
+                third = await jobs.submit("test", "a@example.com", {"n": 3})
+                results.append(await wait_for(third["id"]))
+                return rejected.value.status_code, results
+            finally:
+                await jobs.shutdown()
+
+        status_code, results = asyncio.run(run())
+        assert status_code == 429
+        assert [job["result"]["n"] for job in results] == [1, 2, 3]
+        # Three workers, but only one job of the user ran at a time
+        assert running["peak"] == 1
@@ -0,0 +1,40 @@
+import asyncio
+import pytest
+from app.sql.main import SqlQuery
+
+'''
+    to run specific file: pytest -v tests/test_db_service/test_migrations.py
+'''
+
+class TestMigrations:
+    @pytest.mark.simple
+    def test_migrations_are_ordered_and_unique(self):
+        migrations = SqlQuery.list_migrations()
+        versions = [version for version, _ in migrations]
+
+        assert versions, "expected at least one migration"
+        assert versions == sorted(versions)
+        assert len(versions) == len(set(versions))
+        assert all(name.startswith("migrations/") for _, name in migrations)
+
+    @pytest.mark.simple
+    def test_split_statements_drops_comments(self):
+        sql_text = """
+        -- first statement
+        CREATE TABLE IF NOT EXISTS a (id INT);
+
+        -- second statement
+        ALTER TABLE a ADD INDEX idx_a (id);
+        """
+        statements = SqlQuery.split_statements(sql_text)
+
+        assert statements == [
+            "CREATE TABLE IF NOT EXISTS a (id INT)",
+            "ALTER TABLE a ADD INDEX idx_a (id)",
+        ]
+
+    @pytest.mark.simple
+    def test_every_migration_is_readable(self):
+        for _, sql_name in SqlQuery.list_migrations():
+            sql_text = asyncio.run(SqlQuery.read_sql(sql_name))
+            assert SqlQuery.split_statements(sql_text)
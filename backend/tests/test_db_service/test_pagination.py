@@ -0,0 +1,19 @@
+from datetime import datetime
+import pytest
+from app.services.insight_service import encode_cursor, decode_cursor
+
+'''
+    to run specific file: pytest -v tests/test_db_service/test_pagination.py
+'''
+
+class TestKeysetCursor:
+    @pytest.mark.simple
+    def test_cursor_round_trip(self):
+        created_at = datetime(2026, 3, 14, 15, 9, 26, 535000)
+
+        assert decode_cursor(encode_cursor(created_at, 4217)) == (created_at, 4217)
+
+    @pytest.mark.simple
+    def test_tampered_cursor_is_rejected(self):
+        with pytest.raises(ValueError):
+            decode_cursor("not-a-cursor")
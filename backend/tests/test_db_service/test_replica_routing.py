@@ -0,0 +1,97 @@
+import asyncio
+import pytest
+from app.core.config import logger_settings
+from app.services.auth_service import AuthDatabaseService, Replica, parse_dsn
+
+'''
+    to run specific file: pytest -v tests/test_db_service/test_replica_routing.py
+'''
+
+class FakeConnection:
+    closed = False
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def get_transaction_status(self):
+        return False
+
+class FakePool:
+    """Just enough of `aiomysql.Pool` to tell which server a connection came from."""
+    def __init__(self, name, fail=False):
+        self.name = name
+        self.fail = fail
+
+    async def acquire(self):
+        if self.fail:
+            raise ConnectionError(f"{self.name} is down")
+        return FakeConnection(self)
+
+    def release(self, connection):
+        pass
+
+def make_replica(name, **kwargs):
+    replica = Replica(parse_dsn(f"mysql://{name}:3306/care"))
+    replica.pool = FakePool(name, **kwargs)
+    replica.healthy = True
+    return replica
+
+@pytest.fixture(autouse=True)
+def fake_pools():
+    AuthDatabaseService._pool = FakePool("primary")
+    AuthDatabaseService._next_index = 0
+    AuthDatabaseService._recent_writes.clear()
+    yield
+    AuthDatabaseService._pool = None
+    AuthDatabaseService._replicas = []
+    AuthDatabaseService._recent_writes.clear()
+
+async def read_targets(count, user_email=None):
+    targets = []
+    for _ in range(count):
+        async with AuthDatabaseService.acquire_read(user_email) as connection:
+            targets.append(connection.pool.name)
+    return targets
+
+class TestReplicaRouting:
+    @pytest.mark.operation
+    def test_reads_round_robin_and_writes_stay_on_primary(self):
+        AuthDatabaseService._replicas = [make_replica("replica-a"), make_replica("replica-b")]
+
+        async def run():
+            async with AuthDatabaseService.acquire_write() as connection:
+                written_to = connection.pool.name
+            return written_to, await read_targets(4)
+
+        written_to, targets = asyncio.run(run())
+
+        assert written_to == "primary"
+        assert targets == ["replica-a", "replica-b", "replica-a", "replica-b"]
+
+    @pytest.mark.operation
+    def test_lagging_and_failing_replicas_fall_back_to_primary(self):
+        lagging = make_replica("replica-a")
+        lagging.lag = logger_settings.AUTH_DB_REPLICA_MAX_LAG + 1
+        down = make_replica("replica-b", fail=True)
+        AuthDatabaseService._replicas = [lagging, down]
+
+        targets = asyncio.run(read_targets(3))
+
+        assert targets == ["primary"] * 3
+        assert down.healthy is False
+
+    @pytest.mark.operation
+    def test_reads_after_a_write_are_pinned_to_primary(self):
+        AuthDatabaseService._replicas = [make_replica("replica-a")]
+
+        async def run():
+            await AuthDatabaseService.mark_written("writer@example.com")
+            return (
+                await read_targets(2, "writer@example.com"),
+                await read_targets(1, "reader@example.com"),
+            )
+
+        writer, reader = asyncio.run(run())
+
+        assert writer == ["primary", "primary"]
+        assert reader == ["replica-a"]
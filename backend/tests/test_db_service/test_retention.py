@@ -0,0 +1,82 @@
+import json
+import os
+from datetime import datetime
+import pandas as pd
+import pytest
+from app.core.config import logger_settings
+from app.services.retention_service import (
+    RetentionService, add_months, archive_files, archive_path, epoch_month, monthly_partitions, partition_clause
+)
+
+'''
+    to run specific file: pytest -v tests/test_db_service/test_retention.py
+'''
+
+def records(user_email, ids):
+    return [{
+        "id": i,
+        "user_email": user_email,
+        "created_at": datetime(2026, 1, 1 + i % 28),
+        "data": json.dumps({"version": i}),
+    } for i in ids]
+
+class TestRetention:
+    @pytest.mark.simple
+    def test_add_months_wraps_years(self):
+        assert add_months(2026, 11, 3) == (2027, 2)
+        assert add_months(2026, 1, -1) == (2025, 12)
+
+    @pytest.mark.simple
+    def test_monthly_partitions_end_on_month_boundaries(self):
+        history = monthly_partitions(epoch_month(1785000000), add_months(*epoch_month(1790812800), -1))
+        assert history == [("p202607", 1785542400), ("p202608", 1788220800), ("p202609", 1790812800)]
+        assert monthly_partitions((2026, 12), (2027, 1)) == [("p202612", 1798761600), ("p202701", 1801440000)]
+        assert monthly_partitions((2027, 2), (2027, 1)) == []
+
+    @pytest.mark.simple
+    def test_partition_clause_starts_at_the_given_month(self):
+        clause = partition_clause(2026, 12, 1)
+        assert "PARTITION p_history VALUES LESS THAN (1796083200)" in clause
+        assert "PARTITION p202612 VALUES LESS THAN (1798761600)" in clause
+        assert "PARTITION p202701 VALUES LESS THAN (1801440000)" in clause
+        assert clause.endswith("PARTITION p_future VALUES LESS THAN MAXVALUE)")
+
+    @pytest.mark.operation
+    def test_archive_round_trip_pages_newest_first(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(logger_settings, "ARCHIVE_DIR", str(tmp_path))
+        RetentionService._write_parquet("input_data", "old@example.com", records("old@example.com", range(1, 6)))
+        # A retried batch after a crash before its DELETE rewrites the same rows
+        RetentionService._write_parquet("input_data", "old@example.com", records("old@example.com", range(4, 9)))
+
+        first = RetentionService.read_archive("input_data", "old@example.com", None, 3)
+        rest = RetentionService.read_archive("input_data", "old@example.com", first[-1]["id"], 10)
+
+        assert [item["id"] for item in first] == [8, 7, 6]
+        assert [item["id"] for item in rest] == [5, 4, 3, 2, 1]
+        assert first[0]["data"] == {"version": 8} and first[0]["archived"] is True
+        assert not any(name.startswith(".") for name in os.listdir(archive_path("input_data", "old@example.com")))
+        assert RetentionService.read_archive("input_data", "nobody@example.com", None, 5) == []
+
+    @pytest.mark.operation
+    def test_archive_reads_only_the_needed_files_and_compacts(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(logger_settings, "ARCHIVE_DIR", str(tmp_path))
+        monkeypatch.setattr(logger_settings, "ARCHIVE_COMPACT_FILES", 3)
+        for first in (1, 11, 21):
+            RetentionService._write_parquet("input_data", "old@example.com", records("old@example.com", range(first, first + 10)))
+        RetentionService._write_parquet("input_data", "other@example.com", records("other@example.com", [100]))
+        read = []
+        original = pd.read_parquet
+        monkeypatch.setattr(pd, "read_parquet", lambda path, **kwargs: read.append(os.path.basename(path)) or original(path, **kwargs))
+
+        page = RetentionService.read_archive("input_data", "old@example.com", 25, 3)
+        assert [item["id"] for item in page] == [24, 23, 22]
+        assert read == ["input_data-21-30.parquet"]
+        assert archive_path("input_data", "old@example.com") != archive_path("input_data", "other@example.com")
+
+        assert not RetentionService.compact_archive("input_data", "old@example.com")
+        RetentionService._write_parquet("input_data", "old@example.com", records("old@example.com", range(28, 36)))
+        assert RetentionService.compact_archive("input_data", "old@example.com")
+        assert [path for _, _, path in archive_files(archive_path("input_data", "old@example.com"))] == [
+            os.path.join(archive_path("input_data", "old@example.com"), "input_data-1-35.parquet")
+        ]
+        assert [item["id"] for item in RetentionService.read_archive("input_data", "old@example.com", None, 40)] == list(range(35, 0, -1))
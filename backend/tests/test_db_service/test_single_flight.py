@@ -0,0 +1,67 @@
+import asyncio
+import pytest
+from app.core.config import logger_settings
+from app.services.redis_service import InMemoryRedis, RedisService
+from app.services.single_flight_service import SingleFlight
+
+'''
+    to run specific file: pytest -v tests/test_db_service/test_single_flight.py
+'''
+
+class Counter:
+    def __init__(self, fail: bool = False):
+        self.calls = 0
+        self.fail = fail
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        if self.fail:
+            raise RuntimeError("generation failed")
+        return {"call": self.calls}
+
+class TestSingleFlight:
+    @pytest.mark.operation
+    def test_concurrent_duplicates_share_one_call(self):
+        same, other = Counter(), Counter()
+
+        async def run():
+            return await asyncio.gather(
+                *[SingleFlight.do("same", same) for _ in range(5)],
+                SingleFlight.do("other", other),
+            )
+
+        results = asyncio.run(run())
+        assert same.calls == 1 and other.calls == 1
+        assert [result for result, _ in results[:5]] == [{"call": 1}] * 5
+        assert sorted(shared for _, shared in results[:5]) == [False, True, True, True, True]
+        assert SingleFlight._calls == {}
+
+    @pytest.mark.operation
+    def test_failures_reach_every_caller_and_are_not_cached(self):
+        failing, working = Counter(fail=True), Counter()
+
+        async def run():
+            outcomes = await asyncio.gather(*[SingleFlight.do("key", failing) for _ in range(3)], return_exceptions=True)
+            return outcomes, await SingleFlight.do("key", working)
+
+        outcomes, retried = asyncio.run(run())
+        assert failing.calls == 1 and all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+        assert retried == ({"call": 1}, False)
+
+    @pytest.mark.operation
+    def test_processes_coalesce_through_redis(self, monkeypatch):
+        monkeypatch.setattr(RedisService, "_client", InMemoryRedis())
+        monkeypatch.setattr(RedisService, "is_shared", staticmethod(lambda: True))
+        monkeypatch.setattr(logger_settings, "SINGLE_FLIGHT_POLL_INTERVAL", 0.01)
+        call = Counter()
+
+        async def run():
+            # Calling _run_shared directly skips the in-process map, like two separate processes
+            return await asyncio.gather(SingleFlight._run_shared("key", call), SingleFlight._run_shared("key", call))
+
+        results = asyncio.run(run())
+        assert call.calls == 1
+        assert sorted(results, key=lambda result: result[1]) == [({"call": 1}, False), ({"call": 1}, True)]
+        # The lock is released once the leader is done
+        assert asyncio.run(RedisService._client.get("caresim:singleflight:lock:key")) is None
@@ -0,0 +1,125 @@
+import asyncio
+import json
+import pytest
+from fastapi import HTTPException
+from app.core.config import logger_settings
+from app.services.auth_service import AuthDatabaseService
+from app.services.cache_service import CacheService
+from app.services.insight_service import InsightDataService
+from app.services.redis_service import RedisService, InMemoryRedis
+from app.services.write_behind_service import WriteBehindQueue
+
+'''
+    to run specific file: pytest -v tests/test_db_service/test_write_behind.py
+'''
+
+@pytest.fixture(autouse=True)
+def queued_without_flusher(monkeypatch, tmp_path):
+    """Hold saves in a two-slot queue that nothing drains, with a cold in-memory cache."""
+    monkeypatch.setattr(logger_settings, "WRITE_BEHIND_ENQUEUE_TIMEOUT", 0.05)
+    monkeypatch.setattr(logger_settings, "WRITE_BEHIND_DEAD_LETTER_DIR", str(tmp_path / "dead_letter"))
+    RedisService._client = InMemoryRedis()
+    CacheService._local.clear()
+    WriteBehindQueue._pending.clear()
+    yield
+    WriteBehindQueue._queue = None
+    WriteBehindQueue._pending.clear()
+    RedisService._client = None
+    CacheService._local.clear()
+
+class TestWriteBehind:
+    @pytest.mark.operation
+    def test_queued_save_is_readable_before_flush(self):
+        async def run():
+            WriteBehindQueue._queue = asyncio.Queue(maxsize=2)
+            await InsightDataService.save_input(None, "queued@example.com", {"version": 1})
+            await InsightDataService.save_input(None, "queued@example.com", {"version": 2})
+            # db=None: the read must be served without touching MySQL
+            return await InsightDataService.latest_input_data(None, "queued@example.com")
+
+        assert asyncio.run(run()) == {"version": 2}
+
+    @pytest.mark.operation
+    def test_full_queue_rejects_with_503(self):
+        async def run():
+            WriteBehindQueue._queue = asyncio.Queue(maxsize=1)
+            await WriteBehindQueue.enqueue("input_data", "busy@example.com", {"version": 1})
+            await WriteBehindQueue.enqueue("input_data", "busy@example.com", {"version": 2})
+
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(run())
+
+        assert error.value.status_code == 503
+        assert WriteBehindQueue.pending("input_data", "busy@example.com") == {"version": 1}
+
+    @pytest.mark.operation
+    def test_degraded_insight_is_replaced_only_while_current(self):
+        degraded = {"executive_summary": {"recommendations": ["a"]}, "degraded": True}
+
+        async def run():
+            WriteBehindQueue._queue = asyncio.Queue(maxsize=4)
+            await InsightDataService.save_insight(None, "late@example.com", degraded)
+            upgraded = await InsightDataService.replace_insight(None, "late@example.com", dict(degraded), {"version": "model"})
+            await InsightDataService.save_insight(None, "late@example.com", {"version": "newer"})
+            # A late upgrade of the first degraded insight must not replace the newer one
+            stale = await InsightDataService.replace_insight(None, "late@example.com", degraded, {"version": "stale"})
+            return upgraded, stale, await InsightDataService.latest_insight_data(None, "late@example.com")
+
+        assert asyncio.run(run()) == (True, False, {"version": "newer"})
+
+    @pytest.mark.operation
+    def test_shutdown_flushes_the_batch_being_gathered(self, monkeypatch):
+        monkeypatch.setattr(logger_settings, "WRITE_BEHIND_ENABLED", True)
+        monkeypatch.setattr(logger_settings, "WRITE_BEHIND_FLUSH_INTERVAL", 0.01)
+        flushed = []
+
+        async def flush(batch):
+            if not flushed:
+                flushed.append(None)
+                raise RuntimeError("unexpected")
+            flushed.extend(data["version"] for _, _, _, data, _ in batch)
+
+        monkeypatch.setattr(WriteBehindQueue, "_flush", staticmethod(flush))
+
+        async def run():
+            await WriteBehindQueue.startup()
+            await WriteBehindQueue.enqueue("input_data", "lost@example.com", {"version": 0})
+            # The first flush fails; the flusher keeps running
+            await asyncio.sleep(0.05)
+            monkeypatch.setattr(logger_settings, "WRITE_BEHIND_FLUSH_INTERVAL", 30.0)
+            await WriteBehindQueue.enqueue("input_data", "held@example.com", {"version": 1})
+            await WriteBehindQueue.enqueue("input_data", "held@example.com", {"version": 2})
+            await asyncio.sleep(0.01)
+            # Both saves are off the queue, waiting in the flusher's batch
+            await WriteBehindQueue.shutdown()
+
+        asyncio.run(run())
+        assert flushed == [None, 1, 2]
+
+    @pytest.mark.operation
+    def test_failed_batch_is_dead_lettered(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(logger_settings, "WRITE_BEHIND_MAX_RETRIES", 1)
+
+        def unavailable():
+            raise ConnectionError("database unavailable")
+
+        monkeypatch.setattr(AuthDatabaseService, "acquire", staticmethod(unavailable))
+
+        async def run():
+            WriteBehindQueue._queue = asyncio.Queue(maxsize=4)
+            await WriteBehindQueue.enqueue("input_data", "kept@example.com", {"version": 1})
+            await WriteBehindQueue.enqueue("insights_data", "kept@example.com", {"version": 2})
+            batch = [WriteBehindQueue._queue.get_nowait() for _ in range(2)]
+            await WriteBehindQueue._flush(batch)
+
+        asyncio.run(run())
+        files = list((tmp_path / "dead_letter").glob("*.jsonl"))
+        records = [json.loads(line) for path in files for line in path.read_text().splitlines()]
+        assert len(files) == 2
+        assert sorted((r["table"], r["user_email"], r["data"]["version"]) for r in records) == [
+            ("input_data", "kept@example.com", 1),
+            ("insights_data", "kept@example.com", 2),
+        ]
+        assert all("database unavailable" in r["error"] and r["queued_at"] > 0 for r in records)
+        # Nothing is left pending for reads once the batch has been given up on
+        assert WriteBehindQueue.pending("input_data", "kept@example.com") is None
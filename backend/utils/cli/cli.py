@@ -1,9 +1,12 @@
 import os
+import asyncio
 import click
 import uvicorn
 from utils.docker.util import is_docker
 from app.core.config import logger_settings
 logger = logger_settings.get_logger(__name__)
+from app.services.auth_service import AuthDatabaseService
+from app.services.storage_service import StorageService, SNAPSHOT_TABLES
 
 @click.group()
 @click.version_option(version="0.0.1")  # Specify the version of your application here
@@ -29,3 +32,174 @@ def start(uvreload: bool):
     else:
         logger.warning(f"uvicorn reloading: {uvreload}")   
     uvicorn.run("app.app:app", host="0.0.0.0", port=8000)
+
+async def _with_database(job):
+    """
+    Runs `job()` against the shared pool, outside of the web app.
+    """
+    await AuthDatabaseService.init_pool()
+    try:
+        await StorageService.load_dictionaries()
+        return await job()
+    finally:
+        await AuthDatabaseService.auth_shutdown()
+
+@cli.command("train-dictionary")
+@click.option("--table", type=click.Choice(["input_data", "insights_data"]), default="input_data")
+@click.option("--algorithm", type=click.Choice(["zlib", "zstd"]), default="zlib")
+@click.option("--samples", default=2000, help="Newest rows to train on.")
+def train_dictionary(table: str, algorithm: str, samples: int):
+    """
+    Train and store a shared compression dictionary for snapshot rows.
+    """
+    dictionary_id = asyncio.run(_with_database(
+        lambda: StorageService.train_dictionary(table, algorithm, samples)
+    ))
+    click.echo(f"Stored dictionary {dictionary_id}; set STORAGE_CODEC_USE_DICTIONARY=True to write with it.")
+
+@cli.command("reencode-snapshots")
+@click.option("--table", type=click.Choice(["input_data", "insights_data", "all"]), default="all")
+@click.option("--batch-size", default=500, help="Rows per transaction.")
+@click.option("--recompress", is_flag=True, help="Also rewrite blobs stored with another algorithm or dictionary.")
+def reencode_snapshots(table: str, batch_size: int, recompress: bool):
+    """
+    Convert stored snapshots to the configured STORAGE_CODEC in small batches.
+    """
+    tables = SNAPSHOT_TABLES if table == "all" else (table,)
+
+    async def job():
+        return {name: await StorageService.reencode(name, batch_size, recompress) for name in tables}
+
+    for name, count in asyncio.run(_with_database(job)).items():
+        click.echo(f"{name}: {count} row(s) re-encoded")
+
+@cli.command("partition-snapshots")
+@click.option("--table", type=click.Choice(["input_data", "insights_data", "all"]), default="all")
+@click.option("--months-ahead", default=logger_settings.SNAPSHOT_PARTITION_MONTHS_AHEAD, help="Empty monthly partitions to create ahead.")
+@click.option("--apply", is_flag=True, help="Run a plain ALTER here instead of printing pt-online-schema-change commands.")
+def partition_snapshots(table: str, months_ahead: int, apply: bool):
+    """
+    Partition snapshot tables by month, an operator step kept out of startup migrations.
+    Rows before the current month go to p_history, which archival drains; the
+    scheduled upkeep keeps adding months ahead. Repartitioning copies the table, so
+    by default this prints pt-online-schema-change commands that copy it online in
+    chunks. --apply runs the ALTER directly and blocks writes to the table until it
+    finishes, which is only fine for small tables or a maintenance window.
+    """
+    from datetime import datetime, timezone
+    from app.services.retention_service import RetentionService, partition_alter
+    tables = SNAPSHOT_TABLES if table == "all" else (table,)
+    if apply:
+        async def job():
+            return {name: await RetentionService.partition_table(name, months_ahead) for name in tables}
+
+        for name, partitioned in asyncio.run(_with_database(job)).items():
+            click.echo(f"{name}: {'partitioned' if partitioned else 'already partitioned, unchanged'}")
+        return
+    now = datetime.now(timezone.utc)
+    alter = partition_alter(now.year, now.month, months_ahead).replace("\n", " ")
+    for name in tables:
+        # DROP PRIMARY KEY needs --no-check-alter; the new (id, created_at) key stays unique
+        click.echo(
+            f'pt-online-schema-change --alter "{alter}" --no-check-alter --chunk-time 0.5 '
+            f'--max-load Threads_running=25 --critical-load Threads_running=100 '
+            f'--user {logger_settings.AUTH_DB_USER} --ask-pass '
+            f'D={logger_settings.AUTH_DB},t={name},h={logger_settings.AUTH_DB_HOST},P={logger_settings.AUTH_DB_PORT} --execute\n'
+        )
+
+@cli.command("replay-write-behind")
+def replay_write_behind():
+    """
+    Save snapshots that write-behind could not flush, from WRITE_BEHIND_DEAD_LETTER_DIR.
+    """
+    from app.services.redis_service import RedisService
+    from app.services.write_behind_service import WriteBehindQueue
+
+    async def job():
+        # Shared so the app's processes drop their cached copies of replayed users
+        await RedisService.startup()
+        try:
+            return await WriteBehindQueue.replay_dead_letters()
+        finally:
+            await RedisService.shutdown()
+
+    count = asyncio.run(_with_database(job))
+    click.echo(f"Replayed {count} snapshot(s) from {logger_settings.WRITE_BEHIND_DEAD_LETTER_DIR}")
+
+@cli.command("codec-benchmark")
+@click.option("--table", type=click.Choice(["input_data", "insights_data"]), default="input_data")
+@click.option("--samples", default=500, help="Newest rows to benchmark on.")
+def codec_benchmark(table: str, samples: int):
+    """
+    Report bytes per row and encode/decode time of each storage codec on real rows.
+    """
+    payloads = asyncio.run(_with_database(lambda: StorageService.sample_payloads(table, samples)))
+    if not payloads:
+        click.echo(f"No rows in {table}.")
+        return
+    click.echo(f"{'codec':<10}{'rows':>7}{'avg bytes':>12}{'ratio':>8}{'encode us':>12}{'decode us':>12}")
+    for result in StorageService.benchmark(payloads):
+        click.echo(
+            f"{result['codec']:<10}{result['rows']:>7}{result['avg_bytes']:>12}{result['ratio']:>8}"
+            f"{result['encode_us_per_row']:>12}{result['decode_us_per_row']:>12}"
+        )
+
+@cli.command("llm-usage")
+@click.option("--days", default=7, help="Days to include, counting back from today (UTC).")
+@click.option("--user", "user_email", default=None, help="Only this user's calls.")
+def llm_usage(days: int, user_email: str):
+    """
+    Report LLM calls, tokens, latency and estimated cost per day, user and model.
+    """
+    from app.services.llm_usage_service import LlmUsageService
+    rows = asyncio.run(_with_database(lambda: LlmUsageService.daily(days, user_email)))
+    if not rows:
+        click.echo("No LLM calls recorded.")
+        return
+    click.echo(f"{'day':<12}{'user':<32}{'model':<16}{'calls':>7}{'failed':>8}{'prompt':>10}{'completion':>12}{'cached':>9}{'wait ms':>9}{'net ms':>9}{'cost $':>10}")
+    for row in rows:
+        click.echo(
+            f"{str(row['day']):<12}{str(row['user_email'])[:31]:<32}{row['model'][:15]:<16}{row['calls']:>7}{int(row['failures']):>8}"
+            f"{int(row['prompt_tokens']):>10}{int(row['completion_tokens']):>12}{int(row['cached_tokens']):>9}"
+            f"{float(row['avg_wait_ms']):>9.0f}{float(row['avg_network_ms']):>9.0f}{float(row['cost_usd']):>10.4f}"
+        )
+
+@cli.command("fake-openai")
+@click.option("--port", default=8100, help="Port to listen on; point LLM_BASE_URL at http://127.0.0.1:PORT/v1.")
+@click.option("--latency", default=None, help="Latency distribution, e.g. lognormal:2.0:0.5 (default: FAKE_LLM_LATENCY).")
+@click.option("--error-rate", type=float, default=None, help="Fraction of calls answered with 500.")
+@click.option("--rate-limit-rate", type=float, default=None, help="Fraction of calls answered with 429.")
+@click.option("--response-file", default=None, help="Canned JSON answer.")
+def fake_openai(port: int, latency: str, error_rate: float, rate_limit_rate: float, response_file: str):
+    """
+    Run an offline OpenAI-compatible server with synthetic latency and errors.
+    """
+    from utils.loadtest.fake_openai import create_fake_openai_app
+    app = create_fake_openai_app(latency, error_rate, rate_limit_rate, response_file)
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+@cli.command("load-test")
+@click.option("--users", default=20, help="Concurrent simulated users.")
+@click.option("--requests", "requests_per_user", default=5, help="Requests per user.")
+@click.option("--url", default=None, help="Running server to target; drives app/app.py in-process when omitted.")
+@click.option("--fake-llm/--real-llm", default=True, help="In-process runs answer LLM calls from the fake server.")
+@click.option("--same-input", is_flag=True, help="Send one identical input (exercises the cache and single-flight).")
+@click.option("--think-time", default=0.0, help="Seconds each user waits between requests.")
+@click.option("--output", default=None, help="Also write the JSON report to this file.")
+def load_test(users: int, requests_per_user: int, url: str, fake_llm: bool, same_input: bool,
+              think_time: float, output: str):
+    """
+    Load-test /insight/generate-insights and report throughput, latency percentiles,
+    DB connections and event-loop lag.
+    """
+    from utils.loadtest.harness import format_report, run_load
+    if url is None:
+        logger_settings.LLM_FAKE = fake_llm
+    report = format_report(run_load(
+        users=users, requests_per_user=requests_per_user, base_url=url,
+        distinct_inputs=not same_input, think_time=think_time
+    ))
+    click.echo(report)
+    if output:
+        with open(output, "w", encoding="utf-8") as file:
+            file.write(report)
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import random
+import time
+import uuid
+from typing import Any, Dict, Optional
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from app.core.config import logger_settings
+logger = logger_settings.get_logger(__name__)
+
+# Returned unless FAKE_LLM_RESPONSE_FILE points at another canned body
+DEFAULT_RESPONSE: Dict[str, Any] = {
+    "executive_summary": {
+        "financial_overview": "Revenue covers expenses with a healthy margin.",
+        "profitability_status": "Profitable.",
+        "enrollment_status": "Most classrooms are close to capacity.",
+        "recommendations": [
+            "Open a waitlist for the fullest classrooms.",
+            "Review supply contracts before renewal.",
+            "Track staff hours against ratios weekly.",
+            "Set a tuition review for next quarter.",
+        ],
+    }
+}
+
+def sample_latency(spec: str, rng: random.Random) -> float:
+    """
+    Seconds drawn from a latency spec: `fixed:S`, `uniform:LOW:HIGH`,
+    `lognormal:MEDIAN:SIGMA` or `exponential:MEAN`.
+    """
+    kind, *params = spec.split(":")
+    values = [float(param) for param in params]
+    if kind == "fixed":
+        return values[0]
+    if kind == "uniform":
+        return rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        return values[0] * rng.lognormvariate(0, values[1])
+    if kind == "exponential":
+        return rng.expovariate(1 / values[0])
+    raise ValueError(f"Unknown latency distribution '{spec}'")
+
+def load_response(path: str) -> str:
+    if not path:
+        return json.dumps(DEFAULT_RESPONSE)
+    with open(path, "r", encoding="utf-8") as file:
+        # Validate once at startup rather than on every request
+        return json.dumps(json.load(file))
+
+def create_fake_openai_app(latency: Optional[str] = None, error_rate: Optional[float] = None,
+                           rate_limit_rate: Optional[float] = None, response_file: Optional[str] = None,
+                           seed: Optional[int] = None) -> FastAPI:
+    """
+    OpenAI-compatible `/v1/chat/completions` stand-in (plain and streamed) for
+    offline load tests. Unset arguments come from the `FAKE_LLM_*` settings.
+    """
+    latency = latency or logger_settings.FAKE_LLM_LATENCY
+    error_rate = logger_settings.FAKE_LLM_ERROR_RATE if error_rate is None else error_rate
+    rate_limit_rate = logger_settings.FAKE_LLM_RATE_LIMIT_RATE if rate_limit_rate is None else rate_limit_rate
+    content = load_response(logger_settings.FAKE_LLM_RESPONSE_FILE if response_file is None else response_file)
+    rng = random.Random(seed)
+    sample_latency(latency, rng)
+
+    app = FastAPI(title="fake-openai")
+
+    def error(status_code: int, kind: str, message: str) -> JSONResponse:
+        headers = {"retry-after-ms": "200"} if status_code == 429 else None
+        return JSONResponse(
+            status_code=status_code,
+            content={"error": {"message": message, "type": kind, "code": None, "param": None}},
+            headers=headers,
+        )
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "gpt-4-turbo", "object": "model", "owned_by": "fake-openai"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        await asyncio.sleep(sample_latency(latency, rng))
+        roll = rng.random()
+        if roll < rate_limit_rate:
+            return error(429, "rate_limit_error", "Rate limit reached (fake)")
+        if roll < rate_limit_rate + error_rate:
+            return error(500, "server_error", "The server had an error (fake)")
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        model = body.get("model", "gpt-4-turbo")
+        if body.get("stream"):
+            size = max(logger_settings.FAKE_LLM_STREAM_CHUNK, 1)
+
+            async def chunks():
+                for start in range(0, len(content), size):
+                    chunk = {
+                        "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                        "choices": [{"index": 0, "delta": {"content": content[start:start + size]}, "finish_reason": None}],
+                    }
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                    await asyncio.sleep(0)
+                done = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                }
+                yield f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n"
+            return StreamingResponse(chunks(), media_type="text/event-stream")
+
+        prompt_tokens = sum(len(message.get("content") or "") for message in body.get("messages", [])) // 4
+        completion_tokens = len(content) // 4
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    return app
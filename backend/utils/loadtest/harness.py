@@ -0,0 +1,173 @@
+import asyncio
+import copy
+import json
+import math
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+import httpx
+from app.core.config import logger_settings
+logger = logger_settings.get_logger(__name__)
+from app.core.security import _create_access_token
+
+INSIGHT_PATH = f"{logger_settings.API_V1_STR}/insight/generate-insights"
+
+SAMPLE_INPUT: Dict[str, Any] = {
+    "businessName": "Load Test Daycare",
+    "revenueSources": [
+        {"sourceName": "Tuition", "monthlyAmount": 42000.0, "tag": "tuition"},
+        {"sourceName": "Meal Program", "monthlyAmount": 1800.0, "tag": "other"},
+    ],
+    "employees": [
+        {"expenseName": "Lead Teachers", "monthlyAmount": 18000.0, "type": "salary"},
+        {"expenseName": "Assistants", "monthlyAmount": 9000.0, "type": "hourly", "hoursPerMonth": 640},
+    ],
+    "facilities": [{"expenseName": "Rent", "monthlyAmount": 6500.0, "type": "fixed"}],
+    "administrative": [{"expenseName": "Software", "monthlyAmount": 300.0, "type": "fixed"}],
+    "supplies": [{"expenseName": "Food", "monthlyAmount": 2100.0, "type": "variable"}],
+    "classrooms": [
+        {"name": "Infants", "capacity": 12, "ratio": 4.0, "avgStudents": 10},
+        {"name": "Toddlers", "capacity": 18, "ratio": 6.0, "avgStudents": 15},
+        {"name": "Preschool", "capacity": 24, "ratio": 10.0, "avgStudents": 19},
+    ],
+    "operatingHours": 11.0,
+    "operatingDays": 22.0,
+    "goals": [{"goal": "Increase enrollment", "targetPercentage": 10.0}],
+}
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        "p50": round(percentile(values, 50), 2),
+        "p90": round(percentile(values, 90), 2),
+        "p99": round(percentile(values, 99), 2),
+        "max": round(max(values), 2) if values else 0.0,
+    }
+
+class LoadHarness:
+    """
+    Drives the insight endpoint with `users` concurrent simulated users, either
+    in-process against the app from `app/app.py` or against a running server at
+    `base_url`, and reports throughput, latency percentiles, DB pool usage and
+    event-loop lag.
+    """
+    def __init__(self, users: int, requests_per_user: int, base_url: Optional[str] = None,
+                 path: str = INSIGHT_PATH, payload: Optional[Dict[str, Any]] = None,
+                 distinct_inputs: bool = True, think_time: float = 0.0, sample_interval: float = 0.25):
+        self.users = users
+        self.requests_per_user = requests_per_user
+        self.base_url = base_url
+        self.path = path
+        self.payload = payload or SAMPLE_INPUT
+        self.distinct_inputs = distinct_inputs
+        self.think_time = think_time
+        self.sample_interval = sample_interval
+        self.latencies: List[float] = []
+        self.statuses: Counter = Counter()
+        self.db_in_use: List[int] = []
+        self.loop_lag: List[float] = []
+
+    def body(self, user: int, request: int) -> Dict[str, Any]:
+        body = copy.deepcopy(self.payload)
+        if self.distinct_inputs:
+            # Distinct inputs miss the insight cache and single-flight, like real traffic
+            body["businessName"] = f"{body.get('businessName', 'Daycare')} #{user}-{request}"
+        return body
+
+    @staticmethod
+    def token(user: int) -> str:
+        # Identity claims keep authentication off the database, as for real logins
+        return _create_access_token(
+            f"loadtest-{user}", claims={"email": f"loadtest-{user}@example.com", "username": f"loadtest-{user}"}
+        )
+
+    async def _user(self, client: httpx.AsyncClient, user: int) -> None:
+        headers = {"Authorization": f"Bearer {self.token(user)}"}
+        for request in range(self.requests_per_user):
+            started = time.perf_counter()
+            try:
+                response = await client.post(self.path, json=self.body(user, request), headers=headers)
+                self.statuses[str(response.status_code)] += 1
+            except httpx.HTTPError as e:
+                self.statuses[type(e).__name__] += 1
+            self.latencies.append((time.perf_counter() - started) * 1000)
+            if self.think_time:
+                await asyncio.sleep(self.think_time)
+
+    async def _sample(self, client: httpx.AsyncClient) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.sample_interval)
+            self.loop_lag.append(max(loop.time() - started - self.sample_interval, 0) * 1000)
+            try:
+                metrics = (await client.get("/metrics")).json()
+                self.db_in_use.append(metrics.get("db_pool", {}).get("in_use", 0))
+            except Exception as e:
+                logger.debug(f"Metrics sample failed: {e}")
+
+    async def run(self) -> Dict[str, Any]:
+        app = None
+        if self.base_url:
+            transport, base_url = None, self.base_url
+        else:
+            from app.app import app
+            await app.router.startup()
+            transport, base_url = httpx.ASGITransport(app=app), "http://care-sim"
+
+        timeout = httpx.Timeout(logger_settings.LLM_TIMEOUT * 3)
+        limits = httpx.Limits(max_connections=self.users + 2)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=timeout, limits=limits) as client:
+                sampler = asyncio.create_task(self._sample(client))
+                started = time.perf_counter()
+                await asyncio.gather(*[self._user(client, user) for user in range(self.users)])
+                elapsed = time.perf_counter() - started
+                sampler.cancel()
+                server_metrics = (await client.get("/metrics")).json()
+        finally:
+            if app is not None:
+                await app.router.shutdown()
+        return self.report(elapsed, server_metrics)
+
+    def report(self, elapsed: float, server_metrics: Dict[str, Any]) -> Dict[str, Any]:
+        ok = sum(count for status, count in self.statuses.items() if status.startswith("2"))
+        histograms = server_metrics.get("histograms", {})
+        server_lag = histograms.get("event_loop.lag_ms", {})
+        return {
+            "users": self.users,
+            "requests": len(self.latencies),
+            "statuses": dict(self.statuses),
+            "duration_seconds": round(elapsed, 2),
+            "throughput_rps": round(ok / elapsed, 2) if elapsed else 0.0,
+            "latency_ms": summarize(self.latencies),
+            "db_connections": {
+                "peak_in_use": max(self.db_in_use, default=0),
+                "pool_max": server_metrics.get("db_pool", {}).get("max", 0),
+            },
+            "event_loop_lag_ms": {
+                "client": summarize(self.loop_lag),
+                "server": {key: server_lag.get(key, 0.0) for key in ("p50", "p99")},
+            },
+            "llm": {
+                "wait_ms": {key: histograms.get("llm.wait_ms", {}).get(key, 0.0) for key in ("p50", "p99")},
+                "rate_limited": sum(
+                    value for key, value in server_metrics.get("counters", {}).items()
+                    if key.startswith("llm.calls{") and "outcome=rate_limited" in key
+                ),
+                "cost_usd": round(sum(
+                    value for key, value in server_metrics.get("counters", {}).items() if key.startswith("llm.cost_usd")
+                ), 4),
+            },
+        }
+
+def run_load(**options: Any) -> Dict[str, Any]:
+    return asyncio.run(LoadHarness(**options).run())
+
+def format_report(report: Dict[str, Any]) -> str:
+    return json.dumps(report, indent=2)
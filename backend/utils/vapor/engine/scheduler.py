@@ -3,6 +3,10 @@ from utils.vapor.engine.cleanup import cleanup_workspace_and_docker, fetch_data
 import time, logging
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 import asyncio
+from datetime import datetime, timedelta
+from app.core.config import logger_settings
+from app.services.insight_cache_service import InsightCacheService
+from app.services.retention_service import RetentionService
 
 async def async_cleanup_workspace_and_docker():
     """Wrap cleanup_workspace_and_docker in an async function."""
@@ -25,4 +29,49 @@ async def start_scheduler():
         except (KeyboardInterrupt, SystemExit):
             scheduler.shutdown()
     else:
-        pass
\ No newline at end of file
+        pass
+
+def start_maintenance_scheduler() -> AsyncIOScheduler:
+    """
+    Starts the jobs every deployment needs, whether or not archival is enabled:
+    adding monthly snapshot partitions while `p_future` is still empty, and
+    deleting expired insight cache entries.
+    """
+    scheduler = AsyncIOScheduler()
+    scheduler.add_job(
+        InsightCacheService.purge,
+        'interval',
+        hours=logger_settings.INSIGHT_CACHE_PURGE_INTERVAL_HOURS,
+        next_run_time=datetime.now() + timedelta(minutes=2),
+        max_instances=1,
+        coalesce=True,
+    )
+    scheduler.add_job(
+        RetentionService.maintain_partitions,
+        'interval',
+        hours=logger_settings.SNAPSHOT_PARTITION_INTERVAL_HOURS,
+        next_run_time=datetime.now() + timedelta(minutes=1),
+        max_instances=1,
+        coalesce=True,
+    )
+    scheduler.start()
+    return scheduler
+
+def start_retention_scheduler() -> AsyncIOScheduler:
+    """
+    Starts the snapshot retention job (Parquet archival)
+    on the running event loop. The first pass runs shortly after startup.
+    Raises RuntimeError when `ARCHIVE_DIR` is not configured.
+    """
+    RetentionService.check_archive_dir()
+    scheduler = AsyncIOScheduler()
+    scheduler.add_job(
+        RetentionService.run,
+        'interval',
+        hours=logger_settings.SNAPSHOT_ARCHIVE_INTERVAL_HOURS,
+        next_run_time=datetime.now() + timedelta(minutes=5),
+        max_instances=1,
+        coalesce=True,
+    )
+    scheduler.start()
+    return scheduler